@@ -1,5 +1,8 @@
 from flask import Flask
 from .extensions import db, login_manager
+from .cache import response_cache
+from .passwords import password_hasher
+from .replica import engine_options, install_read_your_writes
 from dotenv import load_dotenv
 import os
 
@@ -11,21 +14,155 @@ def create_app():
     app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL')
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+    # Пул соединений (DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PRE_PING)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+
+    # Реплика для чтения и сколько секунд после записи пользователь читает с основной базы
+    replica_url = os.getenv('DATABASE_REPLICA_URL')
+    app.config['SQLALCHEMY_BINDS'] = {'replica': {'url': replica_url, **engine_options(replica_url)}} if replica_url else {}
+    app.config['REPLICA_READ_YOUR_WRITES'] = int(os.getenv('REPLICA_READ_YOUR_WRITES', 10))
+
     app.config['WTF_CSRF_ENABLED'] = False
 
+    # Сколько обратных прокси (nginx, балансировщик) стоит перед приложением: адрес клиента
+    # берётся из X-Forwarded-For (ProxyFix). 0 - приложение принимает соединения напрямую
+    app.config['PROXY_FIX_X_FOR'] = int(os.getenv('PROXY_FIX_X_FOR', 0))
+
+    # Размер страницы ленты идей и верхняя граница для ?limit= в API
+    app.config['IDEAS_PER_PAGE'] = int(os.getenv('IDEAS_PER_PAGE', 20))
+    app.config['COMMENTS_PER_PAGE'] = int(os.getenv('COMMENTS_PER_PAGE', 20))
+    app.config['API_MAX_PAGE_SIZE'] = int(os.getenv('API_MAX_PAGE_SIZE', 100))
+
+    # Период полураспада активности в ленте «популярные» (в часах; после смены - flask rank-ideas)
+    app.config['RANKING_HALF_LIFE_HOURS'] = float(os.getenv('RANKING_HALF_LIFE_HOURS', 48))
+
+    # Размер пачки строк при потоковой выгрузке /api/v1/export
+    app.config['EXPORT_BATCH_SIZE'] = int(os.getenv('EXPORT_BATCH_SIZE', 1000))
+
+    # Кэш ответов публичных страниц для анонимных посетителей (memory | redis | none);
+    # с RESPONSE_CACHE_URL по умолчанию redis - так его сбрасывают все процессы (веб, воркер, бот)
+    app.config['RESPONSE_CACHE_URL'] = os.getenv('RESPONSE_CACHE_URL')
+    app.config['RESPONSE_CACHE_BACKEND'] = os.getenv('RESPONSE_CACHE_BACKEND',
+                                                     'redis' if app.config['RESPONSE_CACHE_URL'] else 'memory')
+    app.config['RESPONSE_CACHE_TTL'] = int(os.getenv('RESPONSE_CACHE_TTL', 60))
+    app.config['RESPONSE_CACHE_MAX_ENTRIES'] = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', 1000))
+
+    # Кэш снимков пользователей для load_user (TTL в секундах, 0 - без кэша); в памяти процесса
+    # правки из других процессов до него не доходят, поэтому TTL по умолчанию короткий
+    app.config['IDENTITY_CACHE_TTL'] = int(os.getenv(
+        'IDENTITY_CACHE_TTL', 300 if app.config['RESPONSE_CACHE_BACKEND'] == 'redis' else 10
+    ))
+    app.config['IDENTITY_CACHE_MAX_ENTRIES'] = int(os.getenv('IDENTITY_CACHE_MAX_ENTRIES', 10000))
+
+    # JWT для API: срок жизни access- и refresh-токенов (в секундах) и размер кэша проверенных токенов
+    app.config['JWT_ACCESS_TOKEN_TTL'] = int(os.getenv('JWT_ACCESS_TOKEN_TTL', 3600))
+    app.config['JWT_REFRESH_TOKEN_TTL'] = int(os.getenv('JWT_REFRESH_TOKEN_TTL', 30 * 24 * 3600))
+    app.config['TOKEN_CACHE_MAX_ENTRIES'] = int(os.getenv('TOKEN_CACHE_MAX_ENTRIES', 10000))
+
+    # Хэширование паролей: метод Werkzeug, процессы пула (0 - в потоке запроса),
+    # максимум задач в пуле и сколько секунд ждать места до ответа 503
+    app.config['PASSWORD_HASH_METHOD'] = os.getenv('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+    app.config['PASSWORD_HASH_WORKERS'] = int(os.getenv('PASSWORD_HASH_WORKERS', os.cpu_count() or 1))
+    app.config['PASSWORD_HASH_MAX_PENDING'] = int(os.getenv('PASSWORD_HASH_MAX_PENDING', 0))
+    app.config['PASSWORD_HASH_TIMEOUT'] = float(os.getenv('PASSWORD_HASH_TIMEOUT', 5))
+
+    # Метрики запросов на /metrics и в Server-Timing; SQL дольше SLOW_QUERY_MS пишется в лог
+    app.config['METRICS_ENABLED'] = os.getenv('METRICS_ENABLED') == '1'
+    app.config['SLOW_QUERY_MS'] = int(os.getenv('SLOW_QUERY_MS', 200))
+
+    # Проверка ссылок реализаций (app/linkcheck.py): таймаут запроса, соединений в пуле процесса,
+    # одновременных запросов к одному хосту, сколько секунд результат по URL считается свежим
+    # и разрешены ли адреса внутренних сетей (для проверки на локальном сервере)
+    app.config['LINK_CHECK_TIMEOUT'] = float(os.getenv('LINK_CHECK_TIMEOUT', 10))
+    app.config['LINK_CHECK_MAX_CONNECTIONS'] = int(os.getenv('LINK_CHECK_MAX_CONNECTIONS', 20))
+    app.config['LINK_CHECK_PER_HOST'] = int(os.getenv('LINK_CHECK_PER_HOST', 2))
+    app.config['LINK_CHECK_TTL'] = int(os.getenv('LINK_CHECK_TTL', 6 * 3600))
+    app.config['LINK_CHECK_ALLOW_PRIVATE'] = os.getenv('LINK_CHECK_ALLOW_PRIVATE') == '1'
+
+    # Уведомления пользователей бота (app/notifications.py): бэкенд (telegram | fake | none),
+    # окно накопления событий в один дайджест (в секундах), событий в одном сообщении
+    # и сообщений в секунду на процесс воркера (у Bot API общий лимит около 30)
+    app.config['TELEGRAM_BOT_TOKEN'] = os.getenv('TELEGRAM_BOT_TOKEN')
+    app.config['TELEGRAM_API_URL'] = os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org')
+    app.config['NOTIFY_BACKEND'] = os.getenv('NOTIFY_BACKEND',
+                                             'telegram' if app.config['TELEGRAM_BOT_TOKEN'] else 'none')
+    app.config['NOTIFY_DIGEST_SECONDS'] = int(os.getenv('NOTIFY_DIGEST_SECONDS', 60))
+    app.config['NOTIFY_DIGEST_MAX_EVENTS'] = int(os.getenv('NOTIFY_DIGEST_MAX_EVENTS', 10))
+    app.config['NOTIFY_RATE_PER_SECOND'] = float(os.getenv('NOTIFY_RATE_PER_SECOND', 20))
+
+    # Живые обновления страниц идей по SSE (app/live.py): потоков на процесс (0 - выключены)
+    # и с одного клиента (каждый занимает поток воркера), событий в очереди подписчика, пауза
+    # между пингами и сколько секунд держится один поток; LIVE_REDIS_URL - события между процессами
+    app.config['LIVE_MAX_CONNECTIONS'] = int(os.getenv('LIVE_MAX_CONNECTIONS', 100))
+    app.config['LIVE_MAX_PER_CLIENT'] = int(os.getenv('LIVE_MAX_PER_CLIENT', 4))
+    app.config['LIVE_QUEUE_SIZE'] = int(os.getenv('LIVE_QUEUE_SIZE', 100))
+    app.config['LIVE_HEARTBEAT_SECONDS'] = float(os.getenv('LIVE_HEARTBEAT_SECONDS', 15))
+    app.config['LIVE_MAX_SECONDS'] = int(os.getenv('LIVE_MAX_SECONDS', 300))
+    app.config['LIVE_REDIS_URL'] = os.getenv('LIVE_REDIS_URL')
+
+    # Очередь фоновых задач (app/jobs.py): пауза опроса пустой очереди и время, после которого
+    # задачу пропавшего воркера забирает другой (в секундах)
+    app.config['JOBS_POLL_INTERVAL'] = float(os.getenv('JOBS_POLL_INTERVAL', 1))
+    app.config['JOBS_LOCK_TIMEOUT'] = int(os.getenv('JOBS_LOCK_TIMEOUT', 300))
+    # Попыток на задачу и отсрочка повтора: JOBS_RETRY_BASE_SECONDS * 2^(попытка-1), не больше максимума
+    app.config['JOBS_MAX_ATTEMPTS'] = int(os.getenv('JOBS_MAX_ATTEMPTS', 5))
+    app.config['JOBS_RETRY_BASE_SECONDS'] = float(os.getenv('JOBS_RETRY_BASE_SECONDS', 10))
+    app.config['JOBS_RETRY_MAX_SECONDS'] = float(os.getenv('JOBS_RETRY_MAX_SECONDS', 3600))
+    # Сколько дней хранятся выполненные задачи (и действуют их ключи идемпотентности)
+    app.config['JOBS_RETENTION_DAYS'] = int(os.getenv('JOBS_RETENTION_DAYS', 7))
+    # Потоки воркера внутри веб-процесса (0 - задачи выполняет только python run_worker.py)
+    app.config['JOBS_IN_PROCESS_THREADS'] = int(os.getenv('JOBS_IN_PROCESS_THREADS', 0))
+
+    # Лимит SQL-запросов на один HTTP-запрос (0 - без проверки), для тестов и отладки
+    app.config['MAX_QUERIES_PER_REQUEST'] = int(os.getenv('MAX_QUERIES_PER_REQUEST', 0))
+
+    if app.config['PROXY_FIX_X_FOR']:
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_FIX_X_FOR'])
+
     # Инициализируем расширения с приложением
     db.init_app(app)
     login_manager.init_app(app)
     login_manager.login_view = 'main.login'
+    response_cache.init_app(app)
+    password_hasher.init_app(app)
+
+    from app.identity import identity_cache
+    identity_cache.init_app(app)
+
+    from app.tokens import token_verifier
+    token_verifier.init_app(app)
+
+    from app.linkcheck import link_checker
+    link_checker.init_app(app)
+
+    from app.notifications import notifier
+    notifier.init_app(app)
+
+    from app.live import broker
+    broker.init_app(app)
 
     # Импортируем и регистрируем blueprint ВНУТРИ функции
     from app.routers import bp
     app.register_blueprint(bp)
 
+    from app.queries import install_query_guard
+    install_query_guard(app)
+    install_read_your_writes(app)
+
+    from app.metrics import metrics
+    metrics.init_app(app)
+
+    # Обработчики фоновых задач регистрируются при импорте
+    from app import tasks  # noqa: F401
+
+    from app.commands import register_commands
+    register_commands(app)
+
     return app
 
 @login_manager.user_loader
 def load_user(user_id):
-    """Загрузчик пользователя для Flask-Login"""
-    from .models import User  # Импорт ВНУТРИ функции!
-    return User.query.get(int(user_id))
+    """Загрузчик пользователя для Flask-Login (снимок из кэша, без запроса к БД)"""
+    from .identity import identity_cache  # Импорт ВНУТРИ функции!
+    return identity_cache.get(int(user_id))
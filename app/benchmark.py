@@ -0,0 +1,232 @@
+"""
+Нагрузочные замеры веб-маршрутов и обработчиков Telegram-бота.
+
+Синтетический набор данных генерируется детерминированно (seed) и загружается
+через BulkImporter. Каждый сценарий выполняется заданное число раз подряд;
+в результат попадают пропускная способность и перцентили задержки p50/p95/p99.
+Результаты сохраняются в JSON, чтобы сравнивать их между коммитами
+(см. run_benchmarks.py).
+
+HTTP-запросы идут через тестовый клиент Flask (без сети и WSGI-сервера), так
+что замеры показывают стоимость самого приложения: SQL, шаблоны, кэши.
+"""
+import asyncio
+import platform
+import random
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from app.extensions import db
+from app.importer import BulkImporter
+from app.models import Idea, User
+
+BENCH_EMAIL = 'bench@example.com'
+BENCH_PASSWORD = 'bench-password'
+
+
+# ============ НАБОР ДАННЫХ ============
+
+def synthetic_records(users, ideas, implementations, comments, seed=1):
+    """Записи в формате импорта: (номер, dict) - пользователи, идеи, реализации, комментарии"""
+    rng = random.Random(seed)
+    started = datetime(2024, 1, 1)
+    words = ['сервис', 'бот', 'трекер', 'каталог', 'поиск', 'карта', 'отчёт', 'учёт', 'заявки', 'ремонт',
+             'library', 'parser', 'dashboard', 'scheduler', 'storage', 'metrics']
+    number = 0
+
+    def text(n):
+        return ' '.join(rng.choice(words) for _ in range(n))
+
+    def record(**fields):
+        nonlocal number
+        number += 1
+        return number, fields
+
+    for i in range(users):
+        yield record(type='user', username=f'user{i}', display_name=f'User {i}', bio=text(12),
+                     created_at=(started + timedelta(minutes=i)).isoformat())
+    for i in range(ideas):
+        yield record(type='idea', id=i + 1, author=f'user{rng.randrange(users)}', title=text(4).capitalize(),
+                     description=text(40), status='active' if rng.random() < 0.9 else 'archived',
+                     created_at=(started + timedelta(minutes=i)).isoformat())
+    for i in range(implementations):
+        yield record(type='implementation', id=i + 1, idea_id=rng.randrange(ideas) + 1,
+                     author=f'user{rng.randrange(users)}', title=text(3).capitalize(), description=text(30),
+                     external_url=f'https://example.com/impl/{i}',
+                     status=rng.choice(['pending', 'verified', 'verified']),
+                     created_at=(started + timedelta(minutes=i)).isoformat())
+    for i in range(comments):
+        on_idea = not implementations or rng.random() < 0.8
+        yield record(type='comment', author=f'user{rng.randrange(users)}', content=text(15),
+                     parent_type='idea' if on_idea else 'implementation',
+                     parent_id=rng.randrange(ideas if on_idea else implementations) + 1,
+                     created_at=(started + timedelta(seconds=i)).isoformat())
+
+
+def seed_dataset(users, ideas, implementations, comments, seed=1):
+    """Загружает набор данных и пользователя с паролем для сценариев входа"""
+    counts = BulkImporter(batch_size=5000).run(synthetic_records(users, ideas, implementations, comments, seed))
+    user = User(email=BENCH_EMAIL, username='bench', display_name='Bench')
+    user.set_password(BENCH_PASSWORD)
+    db.session.add(user)
+    db.session.commit()
+    return counts
+
+
+# ============ ИЗМЕРЕНИЯ ============
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies, elapsed, errors):
+    values = sorted(latencies)
+    return {
+        'requests': len(values),
+        'errors': errors,
+        'throughput_rps': round(len(values) / elapsed, 1) if elapsed else 0.0,
+        'mean_ms': round(sum(values) / len(values) * 1000, 3) if values else 0.0,
+        'p50_ms': round(percentile(values, 50) * 1000, 3),
+        'p95_ms': round(percentile(values, 95) * 1000, 3),
+        'p99_ms': round(percentile(values, 99) * 1000, 3),
+    }
+
+
+def measure(run, requests, warmup=5):
+    """Выполняет run(i) requests раз; run возвращает False при ошибке"""
+    for i in range(warmup):
+        run(i)
+    latencies, errors = [], 0
+    started = time.perf_counter()
+    for i in range(requests):
+        call_started = time.perf_counter()
+        ok = run(i)
+        latencies.append(time.perf_counter() - call_started)
+        errors += ok is False
+    return summarize(latencies, time.perf_counter() - started, errors)
+
+
+# ============ СЦЕНАРИИ ============
+
+def web_scenarios(app, rng):
+    """{название: (функция запроса, во сколько раз меньше повторов)}"""
+    with app.app_context():
+        idea_ids = db.session.scalars(db.select(Idea.id).where(Idea.status == 'active')).all()
+        usernames = db.session.scalars(db.select(User.username).limit(1000)).all()
+
+    anonymous = app.test_client()
+    member = app.test_client()
+    member.post('/login', data={'email': BENCH_EMAIL, 'password': BENCH_PASSWORD})
+    token = anonymous.post('/api/v1/auth/login', json={'email': BENCH_EMAIL, 'password': BENCH_PASSWORD}).json['token']
+
+    def get(client, url):
+        return lambda i: client.get(url(i)).status_code == 200
+
+    # Вход проверяет пароль (сотни миллисекунд) - повторов в 20 раз меньше
+    return {
+        'index': (get(anonymous, lambda i: '/'), 1),
+        'index_trending': (get(anonymous, lambda i: '/?sort=trending'), 1),
+        'idea_detail': (get(anonymous, lambda i: f'/ideas/{rng.choice(idea_ids)}'), 1),
+        'profile': (get(anonymous, lambda i: f'/@{rng.choice(usernames)}'), 1),
+        'api_ideas': (get(anonymous, lambda i: '/api/v1/ideas'), 1),
+        'api_login': (lambda i: anonymous.post('/api/v1/auth/login', json={
+            'email': BENCH_EMAIL, 'password': BENCH_PASSWORD}).status_code == 200, 20),
+        'comment_post': (lambda i: member.post(f'/ideas/{rng.choice(idea_ids)}/comment', data={
+            'content': f'Комментарий {i}'}).status_code == 302, 1),
+        'api_comment_post': (lambda i: anonymous.post(f'/api/v1/ideas/{rng.choice(idea_ids)}/comments', json={
+            'content': f'Комментарий {i}'}, headers={'Authorization': f'Bearer {token}'}).status_code == 201, 1),
+    }
+
+
+class FakeMessage:
+    """Минимальная замена telegram.Message: текст, отправитель и собранные ответы"""
+
+    def __init__(self, text, user_id):
+        self.text = text
+        self.from_user = SimpleNamespace(id=user_id, first_name=f'Bench {user_id}')
+        self.replies = []
+
+    async def reply_text(self, text, **kwargs):
+        self.replies.append(text)
+
+
+def fake_update(text, user_id):
+    """Минимальная замена telegram.Update с обычным сообщением"""
+    return SimpleNamespace(message=FakeMessage(text, user_id), effective_user=None)
+
+
+def bot_scenarios(app):
+    """Сценарии обработчиков бота; обработчик без ответа или с ответом '❌' - ошибка"""
+    from app import telegram_bot
+
+    telegram_bot.flask_app = app
+    telegram_bot.db_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='bench-bot-db')
+    loop = asyncio.new_event_loop()
+    # Без кэша ответов (--no-cache) замеряется и обработчик бота, а не поиск готового сообщения
+    cache = app.config['RESPONSE_CACHE_BACKEND'] != 'none'
+
+    def handler(func, text):
+        def run(i):
+            if not cache:
+                telegram_bot.message_cache.clear()
+            update = fake_update(text(i), 1_000_000 + i % 50)
+            # Аргументы команды, как их разбирает CommandHandler
+            context = SimpleNamespace(args=update.message.text.split()[1:])
+            loop.run_until_complete(func(update, context))
+            replies = update.message.replies
+            return bool(replies) and not replies[-1].startswith('❌')
+        return run
+
+    scenarios = {
+        'bot_ideas': (handler(telegram_bot.ideas, lambda i: '/ideas'), 1),
+        'bot_ideas_page': (handler(telegram_bot.ideas, lambda i: f'/ideas {i % 5 + 2}'), 1),
+        'bot_search': (handler(telegram_bot.search_ideas, lambda i: '/search идея'), 1),
+        'bot_create_idea': (handler(telegram_bot.handle_text, lambda i: f'Идея {i}|Описание идеи из бота {i}'), 1),
+    }
+
+    def close():
+        loop.close()
+        telegram_bot.db_executor.shutdown(wait=True)
+    return scenarios, close
+
+
+def run(app, requests=200, only=None, seed_value=1):
+    """Выполняет все сценарии (или только перечисленные в only) и возвращает результаты"""
+    rng = random.Random(seed_value)
+    results = {}
+    scenarios = web_scenarios(app, rng)
+    bot, close_bot = bot_scenarios(app)
+    scenarios.update(bot)
+    try:
+        for name, (scenario, divisor) in scenarios.items():
+            if only and name not in only:
+                continue
+            results[name] = measure(scenario, max(1, requests // divisor), warmup=1 if divisor > 1 else 5)
+    finally:
+        close_bot()
+    return results
+
+
+def environment(app):
+    """Сведения о запуске для сравнения результатов"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    with app.app_context():
+        database = db.engine.dialect.name
+    return {
+        'commit': commit,
+        'timestamp': datetime.utcnow().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'database': database,
+        'response_cache': app.config['RESPONSE_CACHE_BACKEND'],
+    }
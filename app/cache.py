@@ -0,0 +1,278 @@
+"""
+Кэш готовых ответов публичных страниц для анонимных посетителей.
+
+Ключ ответа = view + параметры + версии его тегов ('feed', 'idea:<id>',
+'user:<username>' ...). Маршруты записи перед commit вызывают invalidate_*();
+после успешного commit версии тегов увеличиваются - все ответы с этими тегами
+перестают находиться и со временем вытесняются по LRU/TTL.
+
+Бэкенды (RESPONSE_CACHE_BACKEND):
+  * memory - LRU в памяти процесса с TTL и ограничением размера (по умолчанию);
+  * redis  - общий кэш для нескольких процессов (нужен пакет redis и RESPONSE_CACHE_URL;
+             если адрес задан, redis выбирается по умолчанию);
+  * none   - кэш выключен.
+
+memory годится только для одного веб-процесса: invalidate_*() сбрасывает
+версии тегов в памяти того процесса, где прошла запись. Записи других
+процессов - пересчёт оценок в воркере очереди (run_worker.py), идеи из бота,
+flask import-data, а также соседние воркеры gunicorn - его не сбрасывают,
+и страницы остаются устаревшими до RESPONSE_CACHE_TTL. Поэтому gunicorn.conf.py
+с несколькими воркерами без RESPONSE_CACHE_URL выключает кэш.
+"""
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, current_app, g, make_response, request, session
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+
+class MemoryBackend:
+    """Потокобезопасный LRU-словарь с TTL"""
+
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def add(self, key, value, ttl=None):
+        """Записывает value, только если ключа нет; возвращает значение, которое осталось в кэше"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and (entry[1] is None or entry[1] >= time.monotonic()):
+                self._data.move_to_end(key)
+                return entry[0]
+            self._data[key] = (value, time.monotonic() + ttl if ttl else None)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+            return value
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class RedisBackend:
+    """Общий кэш в Redis; значения сериализуются pickle"""
+
+    def __init__(self, url, prefix='reqimple:cache:'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('Для RESPONSE_CACHE_BACKEND=redis установите пакет redis')
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return pickle.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl=None):
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=ttl)
+
+    def add(self, key, value, ttl=None):
+        """SET NX: записывает value, только если ключа нет; возвращает значение, которое осталось в кэше"""
+        if self.client.set(self.prefix + key, pickle.dumps(value), ex=ttl, nx=True):
+            return value
+        current = self.get(key)
+        # Ключ мог истечь между SET NX и GET - тогда годится и своё значение
+        return current if current is not None else value
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + '*'):
+            self.client.delete(key)
+
+
+# Версии тегов живут дольше ответов (во столько раз больше RESPONSE_CACHE_TTL): истёкшая
+# версия только заменяется новой, а ключи тегов в Redis не копятся бесконечно
+TAG_TTL_FACTOR = 10
+
+
+class ResponseCache:
+    """Кэш ответов с версионированными тегами и счётчиками попаданий"""
+
+    def __init__(self):
+        self.backend = None
+        self.ttl = 60
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        backend = app.config['RESPONSE_CACHE_BACKEND']
+        self.ttl = app.config['RESPONSE_CACHE_TTL']
+        if backend == 'memory':
+            self.backend = MemoryBackend(app.config['RESPONSE_CACHE_MAX_ENTRIES'])
+        elif backend == 'redis':
+            self.backend = RedisBackend(app.config['RESPONSE_CACHE_URL'])
+        else:
+            self.backend = None
+
+    @property
+    def enabled(self):
+        return self.backend is not None
+
+    @property
+    def tag_ttl(self):
+        return self.ttl * TAG_TTL_FACTOR or None
+
+    def tag_version(self, tag):
+        """
+        Текущая версия тега; для нового тега - уникальная метка времени.
+
+        Новая версия записывается только если тега всё ещё нет (add): иначе
+        одновременный invalidate() был бы перезаписан более старой меткой, и
+        устаревший ответ попал бы в кэш под актуальной версией.
+        """
+        version = self.backend.get('tag:' + tag)
+        if version is None:
+            version = self.backend.add('tag:' + tag, time.time_ns(), self.tag_ttl)
+        return version
+
+    def invalidate(self, *tags):
+        """Сбрасывает все ответы с указанными тегами"""
+        if not self.enabled:
+            return
+        for tag in tags:
+            self.backend.set('tag:' + tag, time.time_ns(), self.tag_ttl)
+
+    def make_key(self, tags):
+        versions = ','.join(f'{tag}={self.tag_version(tag)}' for tag in tags)
+        args = '&'.join(f'{k}={v}' for k, v in sorted(request.args.items(multi=True)))
+        return f'view:{request.endpoint}?{args}#{versions}'
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+response_cache = ResponseCache()
+
+
+def is_cacheable_request():
+    """Кэшируем только GET анонимных посетителей без ожидающих flash-сообщений"""
+    return (
+        request.method == 'GET'
+        and not current_user.is_authenticated
+        and '_flashes' not in session
+    )
+
+
+def cached(tags):
+    """
+    Кэширует ответ view для анонимных посетителей.
+
+    tags - функция от аргументов view, возвращающая список тегов ответа.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**kwargs):
+            if not response_cache.enabled or not is_cacheable_request():
+                return view(**kwargs)
+
+            key = response_cache.make_key(tags(**kwargs))
+            entry = response_cache.backend.get(key)
+            if entry is not None:
+                response_cache.hits += 1
+                body, mimetype = entry
+                response = Response(body, mimetype=mimetype)
+                response.headers['X-Cache'] = 'HIT'
+                return response
+
+            response_cache.misses += 1
+            response = make_response(view(**kwargs))
+            if response.status_code == 200 and not response.is_streamed:
+                ttl = response_cache.ttl
+                if g.get('use_replica'):
+                    # Реплика может отставать: её ответ живёт не дольше окна read-your-writes
+                    ttl = min(ttl, current_app.config['REPLICA_READ_YOUR_WRITES'])
+                response_cache.backend.set(key, (response.get_data(), response.mimetype), ttl)
+            response.headers['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
+
+
+# ============ ИНВАЛИДАЦИЯ ============
+
+def invalidate_on_commit(session, *tags):
+    """Откладывает сброс тегов до успешного commit сессии"""
+    session.info.setdefault('invalidate_tags', set()).update(tags)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed(session):
+    tags = session.info.pop('invalidate_tags', None)
+    if tags:
+        response_cache.invalidate(*tags)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_invalidations(session):
+    session.info.pop('invalidate_tags', None)
+
+
+def invalidate_idea(idea):
+    """Идея изменилась: её страница, лента, профиль автора и страницы её реализаций"""
+    session = Session.object_session(idea)
+    invalidate_on_commit(session, 'feed', f'idea:{idea.id}', f'user:{idea.author.username}')
+    invalidate_on_commit(session, *(f'implementation:{i.id}' for i in idea.implementations))
+
+
+def invalidate_implementation(implementation):
+    """Реализация изменилась: её страница, страница идеи, профиль автора и рейтинги в ленте"""
+    invalidate_on_commit(
+        Session.object_session(implementation),
+        'feed',
+        f'implementation:{implementation.id}',
+        f'idea:{implementation.idea_source_id}',
+        f'user:{implementation.author.username}'
+    )
+
+
+def invalidate_comment(comment):
+    """Комментарий добавлен или удалён: страница родителя, счётчики и рейтинги в ленте, профиль"""
+    invalidate_on_commit(
+        Session.object_session(comment),
+        'feed',
+        f'{comment.parent_type}:{comment.parent_id}',
+        f'user:{comment.author.username}'
+    )
+
+
+def invalidate_user(user):
+    """Профиль пользователя изменился"""
+    invalidate_on_commit(Session.object_session(user), f'user:{user.username}')
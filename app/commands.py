@@ -0,0 +1,255 @@
+"""
+CLI-команды приложения (flask <команда>).
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app, request
+from sqlalchemy import event, or_, select, text
+from werkzeug.exceptions import NotFound
+
+from app import counters, jobs, linkcheck, queries, ranking, search
+from app.importer import BulkImporter, ImportDataError, read_csv, read_ndjson
+from app.extensions import db
+from app.pagination import keyset_page
+from app.models import Idea, Implementation, User
+
+
+def register_commands(app):
+    """Регистрирует команды в app.cli"""
+
+    @app.cli.command('recount-counters')
+    def recount_counters():
+        """Пересчитать денормализованные счётчики идей и пользователей"""
+        counters.recount_all()
+        click.echo('✅ Счётчики пересчитаны')
+
+    @app.cli.command('reindex-search')
+    def reindex_search():
+        """Пересобрать индекс полнотекстового поиска"""
+        search.rebuild()
+        click.echo('✅ Поисковый индекс пересобран')
+
+    @app.cli.command('rank-ideas')
+    def rank_ideas():
+        """Пересчитать оценки ранжированных лент (после смены RANKING_HALF_LIFE_HOURS)"""
+        count = ranking.rebuild()
+        click.echo(f'✅ Оценки пересчитаны: идей - {count}')
+
+    @app.cli.command('jobs-stats')
+    def jobs_stats():
+        """Показать незавершённые и упавшие фоновые задачи"""
+        counts, oldest = jobs.queue_stats()
+        for (name, status), count in sorted(counts.items()):
+            click.echo(f'{name:30} {status:10} {count}')
+        if oldest:
+            click.echo(f'Самая старая готовая задача ждёт с {oldest:%Y-%m-%d %H:%M:%S}')
+        elif not counts:
+            click.echo('✅ Очередь пуста')
+
+    @app.cli.command('jobs-retry')
+    @click.option('--name', help='Только задачи этого вида')
+    def jobs_retry(name):
+        """Вернуть упавшие фоновые задачи в очередь"""
+        count = jobs.retry_failed(name)
+        click.echo(f'✅ Возвращено в очередь: {count}')
+
+    @app.cli.command('check-links')
+    @click.option('--all', 'all_statuses', is_flag=True, help='Реализации в любом статусе, а не только на модерации')
+    @click.option('--now', is_flag=True, help='Проверить в этом процессе, не ставя задачи в очередь')
+    @click.option('--batch-size', default=100, show_default=True, help='Реализаций в одной задаче')
+    def check_links(all_statuses, now, batch_size):
+        """Перепроверить ссылки реализаций, не проверявшиеся дольше LINK_CHECK_TTL"""
+        stale_before = datetime.utcnow() - timedelta(seconds=current_app.config['LINK_CHECK_TTL'])
+        query = select(Implementation.id).where(
+            or_(Implementation.link_checked_at.is_(None), Implementation.link_checked_at < stale_before)
+        )
+        if not all_statuses:
+            query = query.where(Implementation.status == 'pending')
+        ids = db.session.scalars(query.order_by(Implementation.id)).all()
+
+        broken = 0
+        for start in range(0, len(ids), batch_size):
+            batch = ids[start:start + batch_size]
+            if now:
+                results = linkcheck.check_implementations(batch)
+                broken += sum(1 for result in results.values() if result.status is None or result.status >= 400)
+            else:
+                jobs.enqueue('links.check', implementation_ids=batch)
+            db.session.commit()
+
+        if now:
+            click.echo(f'✅ Проверено ссылок: {len(ids)}, недоступны: {broken}')
+        else:
+            click.echo(f'✅ Поставлено в очередь ссылок: {len(ids)}')
+
+    @app.cli.command('import-data')
+    @click.argument('source', type=click.File('r', encoding='utf-8'))
+    @click.option('--format', 'file_format', type=click.Choice(['ndjson', 'csv']),
+                  help='Формат файла (по умолчанию - по расширению)')
+    @click.option('--type', 'record_type', type=click.Choice(['user', 'idea', 'implementation', 'comment']),
+                  help='Тип записей в CSV-файле')
+    @click.option('--batch-size', default=5000, show_default=True, help='Записей в одной пачке INSERT')
+    def import_data(source, file_format, record_type, batch_size):
+        """Импортировать записи из NDJSON (формат /api/v1/export) или CSV"""
+        file_format = file_format or ('csv' if source.name.endswith('.csv') else 'ndjson')
+        if file_format == 'csv':
+            if not record_type:
+                raise click.UsageError('Для CSV укажите --type')
+            records = read_csv(source, record_type)
+        else:
+            records = read_ndjson(source)
+
+        importer = BulkImporter(batch_size=batch_size, progress=click.echo)
+        try:
+            imported = importer.run(records)
+        except ImportDataError as e:
+            raise click.ClickException(str(e))
+        click.echo('✅ Импортировано: ' + ', '.join(f'{kind} - {count}' for kind, count in imported.items()))
+
+    @app.cli.command('explain-queries')
+    def explain_queries():
+        """Проверить через EXPLAIN, что запросы страниц используют индексы"""
+        full_scans = 0
+        for view, statement, parameters in capture_view_queries():
+            plan = explain(statement, parameters)
+            bad = [line for line in plan if is_full_scan(line)]
+            full_scans += len(bad)
+            click.echo(f"{'❌' if bad else '✅'} {view}: {statement.splitlines()[0][:80]}")
+            for line in plan:
+                click.echo(f'      {line}')
+        if full_scans:
+            raise click.ClickException(f'Полных сканирований таблиц: {full_scans}')
+
+    @app.cli.command('bench-auth')
+    @click.option('--iterations', default=2000, show_default=True, help='Повторов каждого замера')
+    def bench_auth(iterations):
+        """Сравнить стоимость аутентификации запроса: JWT, JWT из кэша, сессионная cookie"""
+        user = User.query.first()
+        if user is None:
+            raise click.ClickException('В базе нет пользователей')
+        for name, seconds in bench_auth_paths(app, user, iterations):
+            click.echo(f'{name:<32} {seconds * 1e6:>10.1f} мкс/запрос')
+
+    @app.cli.command('bench-passwords')
+    @click.option('--logins', default=200, show_default=True, help='Сколько проверок пароля выполнить')
+    @click.option('--concurrency', default=16, show_default=True, help='Потоков, имитирующих запросы входа')
+    def bench_passwords(logins, concurrency):
+        """Пропускная способность входа: проверок пароля в секунду всего и на ядро"""
+        from app.passwords import password_hasher
+
+        password_hash = password_hasher.hash('bench')
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(lambda _: password_hasher.verify(password_hash, 'bench'), range(logins)))
+        elapsed = time.perf_counter() - started
+        assert all(results)
+
+        cores = password_hasher.workers or 1
+        click.echo(f'Метод: {password_hasher.method}, процессов: {password_hasher.workers} '
+                   f'(ядер в системе: {os.cpu_count()}), потоков: {concurrency}')
+        click.echo(f'{logins / elapsed:.1f} входов/с, {logins / elapsed / cores:.1f} входов/с на ядро')
+
+
+# Запросы, которые выполняют публичные страницы, в том же виде, что и во view
+VIEW_QUERIES = {
+    'index': lambda: keyset_page(queries.feed_query(), Idea, limit=20),
+    'index.trending': lambda: keyset_page(
+        queries.feed_query('trending'), Idea, limit=20, key=ranking.SCORE_KEY),
+    'index.needs_implementation': lambda: keyset_page(
+        queries.feed_query('needs_implementation'), Idea, limit=20, key=ranking.SCORE_KEY),
+    'idea_detail': lambda: queries.idea_detail_or_404(1),
+    'idea_detail.comments': lambda: queries.comment_threads('idea', 1),
+    'implementation_detail': lambda: queries.implementation_detail_or_404(1),
+    'implementation_detail.comments': lambda: queries.comment_threads('implementation', 1),
+    'profile.ideas': lambda: queries.profile_ideas(1),
+    'profile.implementations': lambda: queries.profile_implementations(1),
+    'admin_moderation': lambda: keyset_page(queries.moderation_queue(), Implementation, limit=20, oldest_first=True),
+}
+
+
+def capture_view_queries():
+    """Выполняет запросы страниц и возвращает (view, SQL, параметры) каждого из них"""
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        captured.append((current_view, statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', capture)
+    try:
+        for current_view, run in VIEW_QUERIES.items():
+            try:
+                run()
+            except NotFound:
+                pass
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', capture)
+    return captured
+
+
+def explain(statement, parameters):
+    """План запроса в виде списка строк"""
+    connection = db.session.connection()
+    if connection.dialect.name == 'sqlite':
+        rows = connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters)
+        return [row[-1] for row in rows]
+    # На маленьких таблицах Postgres предпочтёт Seq Scan даже при наличии индекса
+    connection.execute(text('SET LOCAL enable_seqscan = off'))
+    rows = connection.exec_driver_sql(f'EXPLAIN {statement}', parameters)
+    return [row[0] for row in rows]
+
+
+def is_full_scan(line):
+    """Строка плана описывает чтение всей таблицы без индекса"""
+    line = line.strip()
+    if 'Seq Scan' in line:
+        return True
+    return line.startswith('SCAN ') and 'USING' not in line
+
+
+def bench_auth_paths(app, user, iterations):
+    """[(название, секунд на одну операцию), ...] для путей аутентификации"""
+    from app.identity import identity_cache
+    from app.tokens import bearer_token, generate_refresh_token, generate_token, token_verifier
+
+    def measure(run, repeat=iterations):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            run()
+        return (time.perf_counter() - started) / repeat
+
+    access_token = generate_token(user.id)
+    refresh_token = generate_refresh_token(user.id)
+    session_cookie = app.session_interface.get_signing_serializer(app).dumps(
+        {'_user_id': str(user.id), '_fresh': True}
+    )
+    identity_cache.get(user.id)  # В обоих путях пользователь берётся из кэша снимков
+
+    def token_request(max_entries):
+        def run():
+            token_verifier.backend.max_entries = max_entries
+            with app.test_request_context(headers={'Authorization': f'Bearer {access_token}'}):
+                assert token_verifier.verify(bearer_token()) is not None
+        return run
+
+    def session_request():
+        with app.test_request_context(headers={'Cookie': f'{app.config["SESSION_COOKIE_NAME"]}={session_cookie}'}):
+            session = app.session_interface.open_session(app, request)
+            assert identity_cache.get(int(session['_user_id'])) is not None
+
+    probe = User(username=user.username)
+    probe.set_password('bench')
+    cache_size = token_verifier.backend.max_entries
+    try:
+        return [
+            ('JWT без кэша', measure(token_request(0))),
+            ('JWT из кэша проверенных', measure(token_request(cache_size or 1))),
+            ('Сессионная cookie', measure(session_request)),
+            ('Проверка пароля (login)', measure(lambda: probe.check_password('bench'), max(1, iterations // 100))),
+            ('Обмен refresh-токена', measure(lambda: generate_token(token_verifier.verify(refresh_token, 'refresh').id))),
+        ]
+    finally:
+        token_verifier.backend.max_entries = cache_size
@@ -0,0 +1,53 @@
+"""
+Ветки комментариев к идеям и реализациям.
+
+Родитель комментария задаётся одной парой (parent_type, parent_id). Ответы
+ссылаются на комментарий через reply_to_id, а материализованный путь
+Comment.path (id предков через '/') превращает всю ветку в диапазон строк:
+ответы на страницу веток загружаются одним запросом (queries.comment_threads),
+удаление комментария вместе с ответами - одним DELETE.
+"""
+from sqlalchemy import delete, or_, select
+from sqlalchemy.orm import Session
+
+from app import counters, live
+from app.cache import invalidate_comment, invalidate_on_commit
+from app.extensions import db
+from app.models import COMMENT_MAX_DEPTH, Comment, User
+
+
+def reply_target_id(parent_type, parent_id, reply_to_id):
+    """
+    id комментария, к которому прикрепляется ответ на reply_to_id, или None,
+    если у этого родителя такого комментария нет.
+
+    Ответ на комментарий глубже COMMENT_MAX_DEPTH становится ему соседом.
+    """
+    target = db.session.execute(
+        select(Comment.id, Comment.reply_to_id, Comment.path).where(
+            Comment.id == reply_to_id,
+            Comment.parent_type == parent_type,
+            Comment.parent_id == parent_id
+        )
+    ).first()
+    if target is None:
+        return None
+    if target.path.count('/') >= COMMENT_MAX_DEPTH:
+        return target.reply_to_id
+    return target.id
+
+
+def remove_thread(comment):
+    """Удаляет комментарий со всеми ответами, обновляя счётчики и кэш"""
+    thread = or_(Comment.id == comment.id, comment.subtree_filter())
+    authors = db.session.execute(
+        select(Comment.author_id, User.username).join(User, Comment.author_id == User.id).where(thread)
+    ).all()
+
+    invalidate_comment(comment)
+    invalidate_on_commit(Session.object_session(comment), *{f'user:{row.username}' for row in authors})
+    live.comments_removed(comment)
+    db.session.execute(delete(Comment).where(thread).execution_options(synchronize_session=False))
+    # Счётчики и рейтинг идеи пересчитываются уже без удалённых комментариев
+    counters.comments_removed(comment.parent_type, comment.parent_id, [row.author_id for row in authors])
+    return len(authors)
@@ -0,0 +1,69 @@
+"""
+Условные GET-запросы (ETag / Last-Modified).
+
+Перед выполнением view вызывается дешёвая функция версии (обычно один SELECT
+updated_at). Если версия совпадает с присланной клиентом в If-None-Match или
+страница не менялась с If-Modified-Since, сразу отдаётся 304 без запросов
+страницы и рендеринга шаблона.
+"""
+import hashlib
+from functools import wraps
+
+from flask import make_response, request, session
+from flask_login import current_user
+
+
+def make_etag(parts):
+    """Строгий ETag из версии данных и личности посетителя (страницы зависят от current_user)"""
+    viewer = current_user.get_id() if current_user.is_authenticated else 'anon'
+    raw = repr((request.endpoint, parts, viewer)).encode()
+    return hashlib.sha1(raw).hexdigest()
+
+
+def conditional(version):
+    """
+    Поддержка 304 Not Modified для view.
+
+    version - функция от аргументов view, возвращающая (last_modified, parts)
+    или None, если объекта нет (тогда view сама ответит 404). Для списков
+    last_modified = None: исчезновение строки из списка не меняет max(updated_at),
+    поэтому для них проверяется только ETag.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**kwargs):
+            # Ожидающие flash-сообщения выводятся на странице - её нельзя считать неизменной
+            if request.method != 'GET' or '_flashes' in session:
+                return view(**kwargs)
+
+            current = version(**kwargs)
+            if current is None:
+                return view(**kwargs)
+
+            last_modified, parts = current
+            etag = make_etag(parts)
+
+            if request.if_none_match:
+                not_modified = etag in request.if_none_match
+            else:
+                since = request.if_modified_since
+                not_modified = bool(
+                    since and last_modified
+                    and last_modified.replace(microsecond=0) <= since.replace(tzinfo=None)
+                )
+
+            if not_modified:
+                response = make_response('', 304)
+            else:
+                response = make_response(view(**kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag)
+            if last_modified:
+                response.last_modified = last_modified
+            response.headers['Cache-Control'] = 'no-cache'
+            response.vary.add('Cookie')
+            return response
+        return wrapper
+    return decorator
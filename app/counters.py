@@ -0,0 +1,153 @@
+"""
+Денормализованные счётчики идей, комментариев и реализаций.
+
+Счётчики меняются атомарным UPDATE col = col + n в той же транзакции, что и
+сама запись, поэтому страницы читают готовые числа вместо COUNT по коллекциям.
+recount_all() пересчитывает всё с нуля, если счётчики разошлись с данными;
+recount() с набором id - после пакетного импорта.
+
+UPDATE строк Idea и Implementation заодно обновляет их updated_at (onupdate),
+который служит версией строки для ETag (app/conditional.py).
+
+Те же события ставят в очередь пересчёт оценок ранжированных лент (задача
+ranking.refresh, app/tasks.py): он не нужен для ответа на запрос.
+"""
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy import func, select
+
+from app import jobs
+from app.extensions import db
+from app.models import User, Idea, Implementation, Comment
+
+
+def bump(model, id, **deltas):
+    """Атомарно изменяет счётчики строки: bump(Idea, 1, comment_count=1)"""
+    values = {getattr(model, name): getattr(model, name) + delta for name, delta in deltas.items() if delta}
+    if values:
+        db.session.query(model).filter(model.id == id).update(values, synchronize_session=False)
+
+
+def touch(model, id):
+    """Обновляет версию строки (updated_at) без изменения данных"""
+    db.session.query(model).filter(model.id == id).update(
+        {model.updated_at: datetime.utcnow()}, synchronize_session=False
+    )
+
+
+def comment_added(comment):
+    """Новый комментарий к идее или реализации"""
+    db.session.flush()  # author_id заполняется только при flush, если задан author=
+    bump(User, comment.author_id, comment_count=1)
+    _comment_parent_changed(comment.parent_type, comment.parent_id, 1)
+
+
+def comments_removed(parent_type, parent_id, author_ids):
+    """Удаление комментария вместе с ответами; author_ids - авторы всех удалённых комментариев"""
+    for author_id, removed in Counter(author_ids).items():
+        bump(User, author_id, comment_count=-removed)
+    _comment_parent_changed(parent_type, parent_id, -len(author_ids))
+
+
+def _comment_parent_changed(parent_type, parent_id, delta):
+    if parent_type == 'idea':
+        bump(Idea, parent_id, comment_count=delta)
+        rank_later([parent_id])
+    elif parent_type == 'implementation':
+        touch(Implementation, parent_id)
+        rank_later(db.session.scalars(select(Implementation.idea_source_id).where(Implementation.id == parent_id)))
+
+
+def rank_later(idea_ids):
+    """Ставит пересчёт оценок идей в очередь фоновых задач"""
+    idea_ids = sorted(set(idea_ids))
+    if idea_ids:
+        jobs.enqueue('ranking.refresh', idea_ids=idea_ids)
+
+
+def implementation_added(implementation):
+    """Новая реализация идеи"""
+    db.session.flush()  # id и author_id нужны задачам, которые ставит маршрут
+    bump(Idea, implementation.idea_source_id, implementation_count=1)
+    if implementation.status == 'verified':
+        bump(User, implementation.author_id, verified_implementation_count=1)
+    rank_later([implementation.idea_source_id])
+
+
+def implementation_status_changed(implementation, old_status):
+    """Смена статуса реализации (верификация и её отмена)"""
+    delta = (implementation.status == 'verified') - (old_status == 'verified')
+    bump(User, implementation.author_id, verified_implementation_count=delta)
+    touch(Idea, implementation.idea_source_id)  # статус реализации виден на странице идеи
+    rank_later([implementation.idea_source_id])
+
+
+def implementations_moderated(rows, status):
+    """
+    Пакетная модерация реализаций из статуса pending.
+
+    rows - строки (id, author_id, idea_source_id) изменённых реализаций.
+    """
+    if status == 'verified':
+        recount(user_ids={row.author_id for row in rows})
+    idea_ids = {row.idea_source_id for row in rows}
+    db.session.query(Idea).filter(Idea.id.in_(idea_ids)).update(
+        {Idea.updated_at: datetime.utcnow()}, synchronize_session=False
+    )
+    rank_later(idea_ids)
+
+
+def idea_added(idea):
+    """Новая идея"""
+    db.session.flush()
+    if idea.status == 'active':
+        bump(User, idea.author_id, idea_count=1)
+        rank_later([idea.id])
+
+
+def idea_status_changed(idea, old_status):
+    """Смена статуса идеи (публикация, архивирование)"""
+    delta = (idea.status == 'active') - (old_status == 'active')
+    bump(User, idea.author_id, idea_count=delta)
+    if delta:
+        rank_later([idea.id])
+
+
+def recount(idea_ids=None, user_ids=None):
+    """
+    Пересчитывает счётчики коррелированными подзапросами (по одному UPDATE на таблицу).
+
+    Без аргументов - все строки; иначе только указанные идеи и пользователи.
+    """
+    def count(column, *criteria):
+        return select(func.count(column)).where(*criteria).scalar_subquery()
+
+    if idea_ids is None or idea_ids:
+        statement = Idea.__table__.update().values(
+            comment_count=count(Comment.id, Comment.parent_type == 'idea', Comment.parent_id == Idea.id),
+            implementation_count=count(Implementation.id, Implementation.idea_source_id == Idea.id)
+        )
+        if idea_ids is not None:
+            statement = statement.where(Idea.id.in_(idea_ids))
+        db.session.execute(statement)
+
+    if user_ids is None or user_ids:
+        statement = User.__table__.update().values(
+            idea_count=count(Idea.id, Idea.author_id == User.id, Idea.status == 'active'),
+            comment_count=count(Comment.id, Comment.author_id == User.id),
+            verified_implementation_count=count(
+                Implementation.id,
+                Implementation.author_id == User.id,
+                Implementation.status == 'verified'
+            )
+        )
+        if user_ids is not None:
+            statement = statement.where(User.id.in_(user_ids))
+        db.session.execute(statement)
+
+
+def recount_all():
+    """Пересчитывает все счётчики"""
+    recount()
+    db.session.commit()
@@ -0,0 +1,57 @@
+"""
+Потоковая выгрузка каталога в NDJSON (одна JSON-запись на строку).
+
+Строки читаются серверным курсором пачками по EXPORT_BATCH_SIZE (yield_per)
+и сразу отправляются клиенту, поэтому память не зависит от размера каталога.
+Выбираются только нужные колонки, автор подтягивается JOIN'ом - без ORM-объектов
+и ленивых загрузок.
+"""
+import json
+from datetime import datetime
+
+from sqlalchemy import select
+
+from app.extensions import db
+from app.models import User, Idea, Implementation, Comment
+
+# Что выгружаем: тип записи -> запрос (только публичные поля, без email и хэшей паролей).
+# Поле type занято типом записи, поэтому тип реализации - implementation_type
+EXPORTS = {
+    'users': lambda: select(
+        User.id, User.username, User.display_name, User.bio, User.created_at
+    ).order_by(User.id),
+    'ideas': lambda: select(
+        Idea.id, Idea.title, Idea.description, Idea.status, Idea.created_at, Idea.updated_at,
+        Idea.author_id, User.username.label('author')
+    ).join(User, Idea.author_id == User.id).order_by(Idea.id),
+    'implementations': lambda: select(
+        Implementation.id, Implementation.title, Implementation.description, Implementation.external_url,
+        Implementation.type.label('implementation_type'), Implementation.status, Implementation.idea_source_id.label('idea_id'),
+        Implementation.created_at, Implementation.author_id, User.username.label('author')
+    ).join(User, Implementation.author_id == User.id).order_by(Implementation.id),
+    'comments': lambda: select(
+        Comment.id, Comment.content, Comment.parent_type, Comment.parent_id, Comment.reply_to_id, Comment.created_at,
+        Comment.author_id, User.username.label('author')
+    ).join(User, Comment.author_id == User.id).order_by(Comment.id),
+}
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} не сериализуется в JSON')
+
+
+def export_lines(kinds, batch_size=1000):
+    """Генератор строк NDJSON для указанных типов записей"""
+    for kind in kinds:
+        statement = EXPORTS[kind]().execution_options(yield_per=batch_size)
+        result = db.session.execute(statement)
+        try:
+            for partition in result.partitions():
+                yield ''.join(
+                    json.dumps({**row._asdict(), 'type': kind[:-1]}, ensure_ascii=False, default=_default) + '\n'
+                    for row in partition
+                )
+        finally:
+            result.close()
@@ -1,6 +1,7 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, PasswordField, TextAreaField, SubmitField, SelectField
+from wtforms import StringField, PasswordField, TextAreaField, SubmitField, SelectField, IntegerField
 from wtforms.validators import DataRequired, Email, Length, URL, Optional
+from wtforms.widgets import HiddenInput
 
 
 class RegistrationForm(FlaskForm):
@@ -36,6 +37,7 @@ class EditIdeaForm(FlaskForm):
 
 class CommentForm(FlaskForm):
     content = TextAreaField('Comment', validators=[DataRequired()])
+    reply_to = IntegerField(widget=HiddenInput(), validators=[Optional()])  # id комментария, на который отвечают
     submit = SubmitField('Post Comment')
 
 
@@ -52,6 +54,7 @@ class ImplementationForm(FlaskForm):
 
     external_url = StringField('Ссылка', validators=[
         DataRequired(),
+        URL(message="Укажите полную ссылку, например https://github.com/username/repo"),
         Length(max=500, message="Ссылка слишком длинная")
     ])
 
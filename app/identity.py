@@ -0,0 +1,108 @@
+"""
+Кэш личности пользователя для Flask-Login.
+
+load_user вызывается на каждый запрос с сессией. Вместо SELECT по user.id он
+берёт из ограниченного LRU-кэша с TTL неизменяемый снимок UserIdentity - без
+привязки к сессии SQLAlchemy, поэтому его безопасно делить между потоками.
+Внутри одного запроса Flask-Login и так запоминает current_user в g.
+
+Любое ORM-изменение строки User (правка профиля, смена is_admin) после commit
+сбрасывает снимок; изменения в обход ORM доживут в кэше не дольше TTL.
+
+С RESPONSE_CACHE_BACKEND=redis снимки хранятся в том же Redis и сброс виден
+всем процессам. В памяти процесса сброс действует только в процессе, где
+прошла запись, поэтому по умолчанию TTL там короткий. Права администратора
+проверяются по базе (is_admin()), а не по снимку: отозванные права не
+должны доживать в кэше другого воркера.
+"""
+from dataclasses import dataclass
+
+from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.cache import MemoryBackend, RedisBackend
+from app.extensions import db
+from app.models import User
+
+
+@dataclass(frozen=True, eq=False)
+class UserIdentity(UserMixin):
+    """Снимок полей пользователя, нужных шаблонам и проверкам прав"""
+    id: int
+    username: str
+    email: str
+    display_name: str
+    bio: str
+    is_admin: bool
+
+    @classmethod
+    def from_user(cls, user):
+        return cls(
+            id=user.id,
+            username=user.username,
+            email=user.email,
+            display_name=user.display_name,
+            bio=user.bio,
+            is_admin=bool(user.is_admin)
+        )
+
+
+class IdentityCache:
+    def __init__(self):
+        self.backend = MemoryBackend()
+        self.ttl = 300
+
+    def init_app(self, app):
+        if app.config['RESPONSE_CACHE_BACKEND'] == 'redis':
+            self.backend = RedisBackend(app.config['RESPONSE_CACHE_URL'], prefix='reqimple:identity:')
+        else:
+            self.backend = MemoryBackend(app.config['IDENTITY_CACHE_MAX_ENTRIES'])
+        self.ttl = app.config['IDENTITY_CACHE_TTL']
+
+    def get(self, user_id, fresh=False):
+        """Снимок пользователя из кэша или из базы (None, если пользователя нет); fresh - только из базы"""
+        identity = None if fresh else self.backend.get(str(user_id))
+        if identity is None:
+            user = db.session.get(User, user_id)
+            if user is None:
+                return None
+            identity = UserIdentity.from_user(user)
+            if self.ttl:
+                self.backend.set(str(user_id), identity, self.ttl)
+        return identity
+
+    def invalidate(self, *user_ids):
+        for user_id in user_ids:
+            self.backend.delete(str(user_id))
+
+
+identity_cache = IdentityCache()
+
+
+def is_admin(identity):
+    """Администратор ли пользователь - по текущей строке в базе, а не по снимку из кэша"""
+    if not getattr(identity, 'is_admin', False):
+        return False
+    user = identity_cache.get(identity.id, fresh=True)
+    return user is not None and user.is_admin
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _schedule_invalidation(mapper, connection, user):
+    session = Session.object_session(user)
+    if session is not None:
+        session.info.setdefault('identity_invalidate', set()).add(user.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed(session):
+    user_ids = session.info.pop('identity_invalidate', None)
+    if user_ids:
+        identity_cache.invalidate(*user_ids)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_invalidations(session):
+    session.info.pop('identity_invalidate', None)
@@ -0,0 +1,296 @@
+"""
+Пакетный импорт пользователей, идей, реализаций и комментариев.
+
+Формат записей совпадает с выгрузкой /api/v1/export: NDJSON, у каждой записи
+поле type (user | idea | implementation | comment), тип самой реализации - в поле
+implementation_type. CSV содержит записи одного типа, который задаётся
+параметром команды.
+
+Записи одного типа, идущие подряд, собираются в пачки и вставляются одним
+executemany (INSERT ... RETURNING id). Авторы ищутся по username в словаре в
+памяти; отсутствующие пользователи создаются пачкой. Счётчики и поисковый
+индекс обновляются один раз на пачку, оценки ранжированных лент - один раз
+в конце импорта для всех затронутых идей.
+
+Поле id в файле - идентификатор в исходной системе: ссылки idea_id/parent_id/
+reply_to_id на записи из этого же файла переводятся в новые id, остальные
+считаются id уже существующих в базе записей. Ответ должен идти в файле после
+комментария, на который отвечает (выгрузка упорядочена по id, так и есть).
+"""
+import csv
+import json
+import time
+from datetime import datetime
+from itertools import groupby, islice
+
+from sqlalchemy import bindparam, insert, select, update
+
+from app import counters, ranking, search
+from app.cache import response_cache
+from app.extensions import db
+from app.models import COMMENT_MAX_DEPTH, HIDDEN_IMPLEMENTATION_STATUSES, User, Idea, Implementation, Comment
+
+
+class ImportDataError(ValueError):
+    """Некорректная запись во входном файле"""
+
+
+def read_ndjson(stream):
+    for line_number, line in enumerate(stream, 1):
+        if line.strip():
+            try:
+                yield line_number, json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ImportDataError(f'строка {line_number}: {e}')
+
+
+def read_csv(stream, record_type):
+    for line_number, row in enumerate(csv.DictReader(stream), 2):
+        yield line_number, {**{k: v for k, v in row.items() if v != ''}, 'type': record_type}
+
+
+def parse_datetime(value):
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+
+def returning_ids(model):
+    """
+    INSERT в таблицу модели, возвращающий id в порядке строк.
+
+    Используется Core-вставка, а не ORM: ORM разбивает executemany на группы по
+    набору NULL-колонок, и чередующиеся строки вставлялись бы по одной.
+    """
+    table = model.__table__
+    return insert(table).returning(table.c.id, sort_by_parameter_order=True)
+
+
+def required(record, field, line_number):
+    value = record.get(field)
+    if value in (None, ''):
+        raise ImportDataError(f"строка {line_number}: не заполнено поле '{field}'")
+    return value
+
+
+class BulkImporter:
+    """Импорт потока записей пачками с отчётом о прогрессе"""
+
+    def __init__(self, batch_size=5000, progress=None):
+        self.batch_size = batch_size
+        self.progress = progress or (lambda message: None)
+        self.user_ids = {}  # username -> id
+        self.idea_ids = {}  # id в исходной системе -> новый id
+        self.implementation_ids = {}
+        self.comment_ids = {}
+        self.comment_places = {}  # новый id комментария -> (path, parent_type, parent_id)
+        self.ranked_idea_ids = set()  # идеи, оценки которых нужно пересчитать
+        self.counts = {'user': 0, 'idea': 0, 'implementation': 0, 'comment': 0}
+
+    def run(self, records):
+        """records - итератор (номер строки, dict); возвращает число записей по типам"""
+        self.user_ids = dict(db.session.execute(select(User.username, User.id)).all())
+        started = time.monotonic()
+
+        for record_type, group in groupby(records, key=lambda item: item[1].get('type')):
+            handler = getattr(self, f'_insert_{record_type}s', None)
+            if handler is None:
+                line_number = next(group)[0]
+                raise ImportDataError(f"строка {line_number}: неизвестный тип записи '{record_type}'")
+
+            while True:
+                batch = list(islice(group, self.batch_size))
+                if not batch:
+                    break
+                handler(batch)
+                db.session.commit()
+                self.counts[record_type] += len(batch)
+
+                total = sum(self.counts.values())
+                rate = total / max(time.monotonic() - started, 1e-6)
+                self.progress(f'{record_type}: {self.counts[record_type]} (всего {total}, {rate:.0f} записей/с)')
+
+        ranking.refresh(self.ranked_idea_ids)
+        db.session.commit()
+        response_cache.invalidate('feed')
+        return self.counts
+
+    # ============ ПОЛЬЗОВАТЕЛИ ============
+
+    def _create_users(self, rows):
+        """Вставляет пользователей, которых ещё нет в словаре, и дополняет словарь"""
+        rows = [row for row in rows if row['username'] not in self.user_ids]
+        rows = list({row['username']: row for row in rows}.values())
+        if not rows:
+            return
+        ids = db.session.scalars(returning_ids(User), rows).all()
+        self.user_ids.update(zip((row['username'] for row in rows), ids))
+
+    def _insert_users(self, batch):
+        rows = []
+        for line_number, record in batch:
+            username = required(record, 'username', line_number)
+            rows.append({
+                'username': username,
+                'email': record.get('email') or f'{username}@import',
+                'display_name': record.get('display_name') or username,
+                'bio': record.get('bio'),
+                'created_at': parse_datetime(record.get('created_at')) or datetime.utcnow(),
+            })
+        self._create_users(rows)
+
+    def _author_ids(self, batch):
+        """Id авторов пачки; неизвестные авторы создаются одним INSERT"""
+        missing = {required(record, 'author', n) for n, record in batch} - self.user_ids.keys()
+        self._create_users([
+            {'username': username, 'email': f'{username}@import', 'display_name': username}
+            for username in missing
+        ])
+        return [self.user_ids[record['author']] for _, record in batch]
+
+    # ============ ИДЕИ И РЕАЛИЗАЦИИ ============
+
+    def _insert_ideas(self, batch):
+        rows = [{
+            'title': required(record, 'title', n),
+            'description': required(record, 'description', n),
+            'status': record.get('status', 'active'),
+            'author_id': author_id,
+            'created_at': parse_datetime(record.get('created_at')) or datetime.utcnow(),
+        } for (n, record), author_id in zip(batch, self._author_ids(batch))]
+
+        ids = db.session.scalars(returning_ids(Idea), rows).all()
+        for (_, record), new_id in zip(batch, ids):
+            if 'id' in record:
+                self.idea_ids[int(record['id'])] = new_id
+
+        search.index_many('idea', [
+            (new_id, row['title'], row['description'])
+            for row, new_id in zip(rows, ids) if row['status'] == 'active'
+        ])
+        self.ranked_idea_ids.update(ids)
+        counters.recount(user_ids={row['author_id'] for row in rows})
+
+    def _insert_implementations(self, batch):
+        rows = []
+        for (n, record), author_id in zip(batch, self._author_ids(batch)):
+            idea_id = int(required(record, 'idea_id', n))
+            rows.append({
+                'title': required(record, 'title', n),
+                'description': required(record, 'description', n),
+                'external_url': required(record, 'external_url', n),
+                'type': record.get('implementation_type', 'other'),
+                'status': record.get('status', 'pending'),
+                'idea_source_id': self.idea_ids.get(idea_id, idea_id),
+                'author_id': author_id,
+                'created_at': parse_datetime(record.get('created_at')) or datetime.utcnow(),
+            })
+
+        ids = db.session.scalars(returning_ids(Implementation), rows).all()
+        for (_, record), new_id in zip(batch, ids):
+            if 'id' in record:
+                self.implementation_ids[int(record['id'])] = new_id
+
+        search.index_many('implementation', [
+            (new_id, row['title'], row['description'])
+            for row, new_id in zip(rows, ids) if row['status'] not in HIDDEN_IMPLEMENTATION_STATUSES
+        ])
+        self.ranked_idea_ids.update(row['idea_source_id'] for row in rows)
+        counters.recount(
+            idea_ids={row['idea_source_id'] for row in rows},
+            user_ids={row['author_id'] for row in rows}
+        )
+
+    # ============ КОММЕНТАРИИ ============
+
+    def _insert_comments(self, batch):
+        rows, targets = [], []
+        for (n, record), author_id in zip(batch, self._author_ids(batch)):
+            parent_type = required(record, 'parent_type', n)
+            parent_id = int(required(record, 'parent_id', n))
+            if parent_type == 'idea':
+                parent_id = self.idea_ids.get(parent_id, parent_id)
+            elif parent_type == 'implementation':
+                parent_id = self.implementation_ids.get(parent_id, parent_id)
+            else:
+                raise ImportDataError(f"строка {n}: неизвестный parent_type '{parent_type}'")
+            rows.append({
+                'content': required(record, 'content', n),
+                'parent_type': parent_type,
+                'parent_id': parent_id,
+                'author_id': author_id,
+                'created_at': parse_datetime(record.get('created_at')) or datetime.utcnow(),
+            })
+            reply_to = record.get('reply_to_id')
+            targets.append(int(reply_to) if reply_to not in (None, '') else None)
+
+        # Комментарии вставляются без reply_to_id (ответ может ссылаться на комментарий из этой же
+        # пачки), место в дереве - reply_to_id и path - проставляется следующим executemany
+        ids = db.session.scalars(returning_ids(Comment), rows).all()
+        for (_, record), new_id in zip(batch, ids):
+            if 'id' in record:
+                self.comment_ids[int(record['id'])] = new_id
+        db.session.execute(
+            update(Comment.__table__).where(Comment.__table__.c.id == bindparam('comment_id')),
+            [{'comment_id': new_id, 'reply_to_id': reply_to_id, 'path': path}
+             for new_id, (reply_to_id, path) in zip(ids, self._place_comments(batch, rows, ids, targets))]
+        )
+
+        idea_ids = {row['parent_id'] for row in rows if row['parent_type'] == 'idea'}
+        implementation_ids = {row['parent_id'] for row in rows if row['parent_type'] == 'implementation'}
+        if implementation_ids:
+            db.session.query(Implementation).filter(Implementation.id.in_(implementation_ids)).update(
+                {Implementation.updated_at: datetime.utcnow()}, synchronize_session=False
+            )
+            self.ranked_idea_ids.update(db.session.scalars(
+                select(Implementation.idea_source_id).where(Implementation.id.in_(implementation_ids))))
+        self.ranked_idea_ids.update(idea_ids)
+        counters.recount(idea_ids=idea_ids, user_ids={row['author_id'] for row in rows})
+
+    def _place_comments(self, batch, rows, ids, targets):
+        """
+        (reply_to_id, path) для каждого комментария пачки.
+
+        targets - reply_to_id из файла (id исходной системы или уже существующего
+        комментария). Как и в форме ответа, ответ глубже COMMENT_MAX_DEPTH
+        становится соседом комментария, на который отвечает.
+        """
+        existing = {t for t in targets if t is not None and t not in self.comment_ids}
+        if existing:
+            self.comment_places.update(
+                (row.id, (row.path, row.parent_type, row.parent_id)) for row in db.session.execute(
+                    select(Comment.id, Comment.path, Comment.parent_type, Comment.parent_id)
+                    .where(Comment.id.in_(existing))
+                )
+            )
+
+        places = [None] * len(rows)
+        pending = list(range(len(rows)))
+        while pending:
+            waiting = []
+            for i in pending:
+                row, new_id, target = rows[i], ids[i], targets[i]
+                if target is None:
+                    places[i] = (None, Comment.path_segment(new_id))
+                    self.comment_places[new_id] = (places[i][1], row['parent_type'], row['parent_id'])
+                    continue
+
+                target_id = self.comment_ids.get(target, target)
+                if target_id not in self.comment_places:
+                    waiting.append(i)  # комментарий, на который отвечают, ниже в этой же пачке
+                    continue
+                target_path, parent_type, parent_id = self.comment_places[target_id]
+                if (parent_type, parent_id) != (row['parent_type'], row['parent_id']):
+                    raise ImportDataError(f'строка {batch[i][0]}: ответ на комментарий {target} другой записи')
+                if target_path.count('/') >= COMMENT_MAX_DEPTH:
+                    target_path = target_path.rsplit('/', 1)[0]
+                path = f'{target_path}/{Comment.path_segment(new_id)}'
+                places[i] = (int(target_path.rsplit('/', 1)[-1]), path)
+                self.comment_places[new_id] = (path, row['parent_type'], row['parent_id'])
+
+            if len(waiting) == len(pending):
+                raise ImportDataError(
+                    f'строка {batch[waiting[0]][0]}: комментарий {targets[waiting[0]]}, на который отвечают, не найден'
+                )
+            pending = waiting
+        return places
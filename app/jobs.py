@@ -0,0 +1,324 @@
+"""
+Очередь фоновых задач в таблице job (без внешнего брокера).
+
+Маршрут ставит задачу через enqueue() в своей транзакции: задача появляется
+в очереди только вместе с записью, которая её породила, а откат запроса
+отменяет и её. Так из запроса уходит работа, ответ на которую пользователю не
+нужен (индексация для поиска, пересчёт оценок лент). Выполняет задачи Worker:
+
+  * python run_worker.py --processes 2 --threads 4 - отдельные процессы;
+  * JOBS_IN_PROCESS_THREADS > 0 - потоки внутри веб-процесса (run.py,
+    воркеры gunicorn) для разработки и небольших установок.
+
+Воркер забирает задачу условным UPDATE (статус и число попыток не изменились
+с момента выборки), поэтому несколько воркеров не выполнят её дважды.
+Изменения обработчика и отметка done фиксируются одной транзакцией; при
+ошибке они откатываются, задача повторяется с экспоненциальной отсрочкой, а
+после max_attempts попыток получает статус failed (flask jobs-retry вернёт
+её в очередь). Задачу воркера, который пропал, не завершив её за
+JOBS_LOCK_TIMEOUT, выполняет другой.
+
+Обработчики регистрируются декоратором @task (app/tasks.py); concurrency
+ограничивает число одновременно выполняемых задач одного вида во всех воркерах.
+Захваты таких задач идут по очереди: в PostgreSQL - под рекомендательной
+блокировкой вида задачи, SQLite и так выполняет записи по одной; в других СУБД
+ограничение приблизительное.
+"""
+import logging
+import os
+import random
+import signal
+import socket
+import threading
+import time
+import traceback
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import and_, delete, func, insert, select, text, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.extensions import db
+from app.models import Job
+
+logger = logging.getLogger(__name__)
+
+# Задач в одной выборке кандидатов и пауза между обслуживанием очереди (в секундах)
+CLAIM_BATCH = 20
+MAINTENANCE_INTERVAL = 60
+
+# Пространство ключей рекомендательных блокировок PostgreSQL для захвата задач ('job')
+CLAIM_LOCK_SPACE = 0x6a6f62
+
+Task = namedtuple('Task', ['name', 'handler', 'max_attempts', 'concurrency'])
+
+TASKS = {}
+
+
+def task(name, max_attempts=None, concurrency=None):
+    """Регистрирует обработчик задачи: @task('search.index', concurrency=2)"""
+    def decorator(handler):
+        TASKS[name] = Task(name, handler, max_attempts, concurrency)
+        return handler
+    return decorator
+
+
+# ============ ПОСТАНОВКА ============
+
+def enqueue(name, key=None, delay=0, **payload):
+    """
+    Ставит задачу в очередь в текущей транзакции; payload - аргументы обработчика (JSON).
+
+    key - ключ идемпотентности: пока задача с таким ключом хранится в таблице
+    (выполненные - JOBS_RETENTION_DAYS), повторная постановка ничего не делает.
+    delay - отсрочка в секундах. Возвращает False, если задача с ключом уже есть.
+    """
+    now = datetime.utcnow()
+    registered = TASKS.get(name)
+    values = {
+        'name': name,
+        'payload': payload,
+        'idempotency_key': key,
+        'status': 'queued',
+        'attempts': 0,
+        'max_attempts': (registered and registered.max_attempts) or current_app.config['JOBS_MAX_ATTEMPTS'],
+        'run_at': now + timedelta(seconds=delay),
+        'created_at': now,
+    }
+    if key is None:
+        db.session.execute(insert(Job).values(values))
+        return True
+
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        insert_job = (sqlite if dialect == 'sqlite' else postgresql).insert(Job).values(values)
+        return db.session.execute(insert_job.on_conflict_do_nothing(index_elements=['idempotency_key'])).rowcount > 0
+    if db.session.scalar(select(Job.id).where(Job.idempotency_key == key)) is not None:
+        return False
+    db.session.execute(insert(Job).values(values))
+    return True
+
+
+def retry_delay(attempts):
+    """Отсрочка перед повтором (в секундах): удваивается с каждой попыткой, со случайным разбросом"""
+    config = current_app.config
+    delay = min(config['JOBS_RETRY_BASE_SECONDS'] * 2 ** (attempts - 1), config['JOBS_RETRY_MAX_SECONDS'])
+    return delay * random.uniform(0.5, 1.0)
+
+
+def serialize_claims(name):
+    """
+    Захваты задач вида name по одному до конца транзакции.
+
+    Без этого в PostgreSQL (READ COMMITTED) два воркера одновременно видят в
+    подзапросе concurrency одни и те же running-задачи и забирают по задаче сверх лимита.
+    """
+    if db.session.get_bind().dialect.name == 'postgresql':
+        db.session.execute(text('SELECT pg_advisory_xact_lock(:space, hashtext(:name))'),
+                           {'space': CLAIM_LOCK_SPACE, 'name': name})
+
+
+# ============ ВОРКЕР ============
+
+class Worker:
+    """Выполняет задачи из очереди в threads потоках текущего процесса (names - только эти виды)"""
+
+    def __init__(self, app, threads=1, names=None):
+        self.app = app
+        self.threads = threads
+        self.names = tuple(names) if names else None
+        self.id = f'{socket.gethostname()}:{os.getpid()}'
+        self.stopping = threading.Event()
+        self._threads = []
+        self._maintenance_lock = threading.Lock()
+        self._next_maintenance = 0.0
+
+    def start(self):
+        """Запускает потоки-обработчики (фоновые, не мешают завершению процесса)"""
+        for n in range(self.threads):
+            thread = threading.Thread(target=self.run, name=f'jobs-{n}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self, timeout=None):
+        """Останавливает потоки, дождавшись завершения текущих задач"""
+        self.stopping.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def run_forever(self):
+        """Работает до SIGTERM или Ctrl+C (для run_worker.py)"""
+        signal.signal(signal.SIGTERM, lambda signum, frame: self.stopping.set())
+        self.start()
+        try:
+            while not self.stopping.wait(1):
+                pass
+        except KeyboardInterrupt:
+            pass
+        logger.info('Воркер %s останавливается', self.id)
+        self.stop()
+
+    def run(self):
+        """Цикл потока: задача за задачей, при пустой очереди - пауза JOBS_POLL_INTERVAL"""
+        interval = self.app.config['JOBS_POLL_INTERVAL']
+        while not self.stopping.is_set():
+            try:
+                with self.app.app_context():
+                    self.maybe_maintain()
+                    busy = self.run_one()
+            except Exception:
+                logger.exception('Ошибка воркера очереди задач')
+                busy = False
+            if not busy:
+                self.stopping.wait(interval)
+
+    def run_pending(self, limit=None):
+        """Выполняет готовые задачи в текущем потоке, пока они есть (нужен контекст приложения)"""
+        count = 0
+        while (limit is None or count < limit) and self.run_one():
+            count += 1
+        return count
+
+    def run_one(self):
+        """Забирает и выполняет одну задачу; False - готовых задач нет"""
+        job = self.claim()
+        if job is None:
+            return False
+        self.execute(job)
+        return True
+
+    def lock_name(self):
+        return f'{self.id}:{threading.current_thread().name}'[:100]
+
+    def claim(self):
+        """Забирает готовую задачу (status='running') и возвращает её строку или None"""
+        now = datetime.utcnow()
+        candidates = select(Job.id, Job.name, Job.attempts).where(Job.status == 'queued', Job.run_at <= now)
+        if self.names:
+            candidates = candidates.where(Job.name.in_(self.names))
+        rows = db.session.execute(candidates.order_by(Job.run_at, Job.id).limit(CLAIM_BATCH)).all()
+        db.session.rollback()
+
+        for row in rows:
+            registered = TASKS.get(row.name)
+            conditions = [Job.id == row.id, Job.status == 'queued', Job.attempts == row.attempts]
+            if registered is None:
+                self._update(conditions, status='failed', finished_at=now, last_error=f'Неизвестная задача {row.name}')
+                db.session.commit()
+                continue
+            if registered.concurrency:
+                serialize_claims(row.name)
+                running = Job.__table__.alias('running_job')
+                conditions.append(select(func.count()).select_from(running).where(
+                    running.c.name == row.name, running.c.status == 'running'
+                ).scalar_subquery() < registered.concurrency)
+
+            lock = self.lock_name()
+            claimed = self._update(conditions, status='running', attempts=Job.attempts + 1, locked_by=lock,
+                                   locked_at=now)
+            db.session.commit()
+            if claimed:
+                return db.session.execute(
+                    select(Job.id, Job.name, Job.payload, Job.attempts, Job.max_attempts, Job.locked_by)
+                    .where(Job.id == row.id)
+                ).one()
+        return None
+
+    def execute(self, job):
+        """Выполняет обработчик и фиксирует его изменения вместе с отметкой done"""
+        started_at = time.perf_counter()
+        owned = [Job.id == job.id, Job.status == 'running', Job.locked_by == job.locked_by]
+        try:
+            TASKS[job.name].handler(**job.payload)
+            if not self._update(owned, status='done', finished_at=datetime.utcnow(), locked_by=None, last_error=None):
+                # Задачу уже отдали другому воркеру (истёк JOBS_LOCK_TIMEOUT) - его результат главнее
+                db.session.rollback()
+                logger.warning('Задача %s #%s выполнялась дольше JOBS_LOCK_TIMEOUT, результат отброшен',
+                               job.name, job.id)
+                return
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            now = datetime.utcnow()
+            values = {'locked_by': None, 'last_error': traceback.format_exc()[-2000:]}
+            if job.attempts >= job.max_attempts:
+                values.update(status='failed', finished_at=now)
+            else:
+                values.update(status='queued', run_at=now + timedelta(seconds=retry_delay(job.attempts)))
+            self._update(owned, **values)
+            db.session.commit()
+            logger.warning('Задача %s #%s завершилась ошибкой (попытка %s из %s)',
+                           job.name, job.id, job.attempts, job.max_attempts, exc_info=True)
+            return
+        logger.info('Задача %s #%s выполнена за %.1f мс', job.name, job.id, (time.perf_counter() - started_at) * 1000)
+
+    def maybe_maintain(self):
+        """Раз в MAINTENANCE_INTERVAL одним из потоков - maintain()"""
+        if time.monotonic() < self._next_maintenance or not self._maintenance_lock.acquire(blocking=False):
+            return
+        try:
+            self._next_maintenance = time.monotonic() + MAINTENANCE_INTERVAL
+            maintain()
+        finally:
+            self._maintenance_lock.release()
+
+    @staticmethod
+    def _update(conditions, **values):
+        return db.session.execute(
+            update(Job).where(*conditions).values(**values).execution_options(synchronize_session=False)
+        ).rowcount
+
+
+def maintain():
+    """Возвращает в очередь задачи пропавших воркеров и удаляет старые выполненные задачи"""
+    config = current_app.config
+    now = datetime.utcnow()
+    stale = and_(Job.status == 'running', Job.locked_at < now - timedelta(seconds=config['JOBS_LOCK_TIMEOUT']))
+    lost = {'locked_by': None, 'last_error': 'Воркер не завершил задачу за JOBS_LOCK_TIMEOUT'}
+    db.session.execute(update(Job).where(stale, Job.attempts < Job.max_attempts).values(
+        status='queued', run_at=now, **lost
+    ).execution_options(synchronize_session=False))
+    db.session.execute(update(Job).where(stale, Job.attempts >= Job.max_attempts).values(
+        status='failed', finished_at=now, **lost
+    ).execution_options(synchronize_session=False))
+    db.session.execute(delete(Job).where(
+        Job.status == 'done', Job.finished_at < now - timedelta(days=config['JOBS_RETENTION_DAYS'])
+    ))
+    db.session.commit()
+
+
+def start_in_process(app):
+    """Запускает воркер в потоках веб-процесса, если задан JOBS_IN_PROCESS_THREADS"""
+    threads = app.config['JOBS_IN_PROCESS_THREADS']
+    return Worker(app, threads=threads).start() if threads else None
+
+
+# ============ СОСТОЯНИЕ ОЧЕРЕДИ ============
+
+def queue_stats():
+    """Число незавершённых и упавших задач {(name, status): n} и run_at самой старой готовой задачи"""
+    counts = {
+        (row.name, row.status): row.count for row in db.session.execute(
+            select(Job.name, Job.status, func.count().label('count'))
+            .where(Job.status.in_(('queued', 'running', 'failed')))
+            .group_by(Job.name, Job.status)
+        )
+    }
+    oldest = db.session.scalar(select(func.min(Job.run_at)).where(
+        Job.status == 'queued', Job.run_at <= datetime.utcnow()
+    ))
+    return counts, oldest
+
+
+def retry_failed(name=None):
+    """Возвращает упавшие задачи в очередь с новым запасом попыток; возвращает их число"""
+    statement = update(Job).where(Job.status == 'failed')
+    if name:
+        statement = statement.where(Job.name == name)
+    count = db.session.execute(statement.values(
+        status='queued', attempts=0, run_at=datetime.utcnow(), finished_at=None
+    ).execution_options(synchronize_session=False)).rowcount
+    db.session.commit()
+    return count
@@ -0,0 +1,254 @@
+"""
+Проверка внешних ссылок реализаций: доступность, код ответа и <title> страницы.
+
+Проверку выполняет фоновая задача links.check (app/tasks.py), которую ставит
+создание реализации; flask check-links ставит перепроверку устаревших.
+Результат хранится в самой реализации (link_status, link_title, link_error,
+link_checked_at) и показывается в очереди модерации.
+
+Все проверки процесса идут через один httpx.AsyncClient с пулом соединений,
+работающий в отдельном потоке со своим event loop, - задачи из разных
+потоков воркера делят пул и ограничения:
+  * к одному хосту не больше LINK_CHECK_PER_HOST запросов одновременно;
+  * сначала HEAD, GET - если HEAD вернул ошибку (многие сайты его не
+    поддерживают) или пришла HTML-страница, у которой нужен заголовок;
+    тело читается не дальше TITLE_MAX_BYTES;
+  * результат по URL кэшируется на LINK_CHECK_TTL секунд, поэтому одна и
+    та же ссылка нескольких реализаций проверяется один раз.
+Адреса во внутренних сетях (в том числе после перенаправлений) не
+запрашиваются, если не задан LINK_CHECK_ALLOW_PRIVATE - он нужен для
+проверки на локальном тестовом сервере. Хост проверяется до соединения, а
+адрес, с которым соединение фактически установлено, - до чтения ответа:
+httpx разрешает имя заново, и хост с коротким TTL (DNS rebinding) мог бы
+подменить публичный адрес внутренним.
+"""
+import asyncio
+import contextlib
+import html
+import ipaddress
+import re
+import socket
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+from urllib.parse import urlsplit
+
+import httpx
+from sqlalchemy import bindparam, select
+
+from app.extensions import db
+from app.models import Implementation
+
+LinkResult = namedtuple('LinkResult', ['status', 'title', 'error', 'checked_at'])
+
+USER_AGENT = 'ReqImple-LinkChecker/1.0'
+TITLE_MAX_BYTES = 64 * 1024
+TITLE_MAX_LENGTH = 300
+TITLE_RE = re.compile(rb'<title[^>]*>(.*?)</title', re.IGNORECASE | re.DOTALL)
+
+
+class BlockedAddress(Exception):
+    """Хост ссылки разрешается в адрес внутренней сети"""
+
+
+def is_public(address):
+    return ipaddress.ip_address(address.split('%')[0]).is_global
+
+
+def is_html(response):
+    content_type = response.headers.get('content-type', '').split(';')[0].strip().lower()
+    return content_type in ('text/html', 'application/xhtml+xml')
+
+
+def extract_title(body, encoding=None):
+    """Текст <title> из начала HTML-страницы или None"""
+    match = TITLE_RE.search(body)
+    if match is None:
+        return None
+    title = html.unescape(match.group(1).decode(encoding or 'utf-8', errors='replace'))
+    return ' '.join(title.split())[:TITLE_MAX_LENGTH] or None
+
+
+class LinkChecker:
+    def __init__(self):
+        self.timeout = 10.0
+        self.max_connections = 20
+        self.per_host = 2
+        self.ttl = 3600
+        self.max_entries = 10000
+        self.allow_private = False
+        self._cache = {}  # url -> (истекает, LinkResult), в порядке добавления
+        self._lock = threading.Lock()
+        self._loop = None
+        self._client = None
+        self._hosts = {}  # хост -> [семафор, число ожидающих и выполняющихся проверок]
+
+    def init_app(self, app):
+        self.timeout = app.config['LINK_CHECK_TIMEOUT']
+        self.max_connections = app.config['LINK_CHECK_MAX_CONNECTIONS']
+        self.per_host = app.config['LINK_CHECK_PER_HOST']
+        self.ttl = app.config['LINK_CHECK_TTL']
+        self.allow_private = app.config['LINK_CHECK_ALLOW_PRIVATE']
+
+    # ============ КЭШ ============
+
+    def check_many(self, urls):
+        """{url: LinkResult} для набора ссылок; блокирует вызывающий поток до конца проверок"""
+        results, pending = {}, []
+        now = time.monotonic()
+        with self._lock:
+            for url in set(urls):
+                cached = self._cache.get(url)
+                if cached and cached[0] > now:
+                    results[url] = cached[1]
+                else:
+                    pending.append(url)
+        if not pending:
+            return results
+
+        checked = asyncio.run_coroutine_threadsafe(self._check_all(pending), self._event_loop()).result()
+        results.update(checked)
+        with self._lock:
+            expires_at = time.monotonic() + self.ttl
+            for url, result in checked.items():
+                self._cache.pop(url, None)
+                self._cache[url] = (expires_at, result)
+            self._evict()
+        return results
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def _evict(self):
+        if len(self._cache) <= self.max_entries:
+            return
+        now = time.monotonic()
+        for url in [url for url, (expires_at, _) in self._cache.items() if expires_at <= now]:
+            del self._cache[url]
+        while len(self._cache) > self.max_entries:
+            del self._cache[next(iter(self._cache))]
+
+    # ============ ЗАПРОСЫ ============
+
+    def _event_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name='linkcheck', daemon=True).start()
+            return self._loop
+
+    async def _check_all(self, urls):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                follow_redirects=True,
+                max_redirects=5,
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections),
+                headers={'User-Agent': USER_AGENT},
+                event_hooks={'request': [self._guard], 'response': [self._guard_peer]}
+            )
+        results = await asyncio.gather(*(self._check(url) for url in urls))
+        return dict(zip(urls, results))
+
+    async def _check(self, url):
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            return self._result(error='Ссылка не http(s)')
+        try:
+            async with self._host_slot(parts.hostname.lower()):
+                response = await self._client.head(url)
+                if response.status_code < 400 and not is_html(response):
+                    return self._result(status=response.status_code)
+                return await self._get(url)
+        except BlockedAddress:
+            return self._result(error='Адрес во внутренней сети')
+        except httpx.TimeoutException:
+            return self._result(error='Превышено время ожидания')
+        except httpx.TooManyRedirects:
+            return self._result(error='Слишком много перенаправлений')
+        except (httpx.HTTPError, OSError) as e:
+            return self._result(error=f'Ошибка соединения: {type(e).__name__}')
+
+    async def _get(self, url):
+        async with self._client.stream('GET', url) as response:
+            title = None
+            if response.status_code < 400 and is_html(response):
+                body = b''
+                async for chunk in response.aiter_bytes():
+                    body += chunk
+                    if len(body) >= TITLE_MAX_BYTES or b'</title' in body.lower():
+                        break
+                title = extract_title(body[:TITLE_MAX_BYTES], response.charset_encoding)
+            return self._result(status=response.status_code, title=title)
+
+    @staticmethod
+    def _result(status=None, title=None, error=None):
+        return LinkResult(status, title, error, datetime.utcnow())
+
+    @contextlib.asynccontextmanager
+    async def _host_slot(self, host):
+        """Не больше per_host одновременных проверок хоста; семафоры простаивающих хостов не хранятся"""
+        slot = self._hosts.get(host)
+        if slot is None:
+            slot = self._hosts[host] = [asyncio.Semaphore(self.per_host), 0]
+        slot[1] += 1
+        try:
+            async with slot[0]:
+                yield
+        finally:
+            slot[1] -= 1
+            if not slot[1]:
+                del self._hosts[host]
+
+    async def _guard(self, request):
+        """Хук каждого запроса (включая перенаправления): только публичные адреса"""
+        if self.allow_private:
+            return
+        host = request.url.host
+        port = request.url.port or (443 if request.url.scheme == 'https' else 80)
+        for *_, sockaddr in await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM):
+            if not is_public(sockaddr[0]):
+                raise BlockedAddress(host)
+
+    async def _guard_peer(self, response):
+        """Хук каждого ответа: соединение установлено с публичным адресом (тело ещё не прочитано)"""
+        if self.allow_private:
+            return
+        stream = response.extensions.get('network_stream')
+        peer = stream.get_extra_info('server_addr') if stream is not None else None
+        if peer is None or not is_public(peer[0]):
+            raise BlockedAddress(response.request.url.host)
+
+
+link_checker = LinkChecker()
+
+
+def check_implementations(implementation_ids):
+    """Проверяет ссылки реализаций и сохраняет результат; возвращает {id: LinkResult}"""
+    rows = db.session.execute(
+        select(Implementation.id, Implementation.external_url).where(Implementation.id.in_(implementation_ids))
+    ).all()
+    # Транзакция не держится открытой на время сетевых запросов
+    db.session.rollback()
+    if not rows:
+        return {}
+
+    results = link_checker.check_many(row.external_url for row in rows)
+    table = Implementation.__table__
+    # Core UPDATE: не меняет version (на неё опирается пакетная модерация) и updated_at страницы
+    db.session.execute(
+        table.update().where(table.c.id == bindparam('implementation_id')).values(
+            link_status=bindparam('result_status'),
+            link_title=bindparam('result_title'),
+            link_error=bindparam('result_error'),
+            link_checked_at=bindparam('result_checked_at'),
+            updated_at=table.c.updated_at
+        ),
+        [{'implementation_id': row.id, 'result_status': results[row.external_url].status,
+          'result_title': results[row.external_url].title, 'result_error': results[row.external_url].error,
+          'result_checked_at': results[row.external_url].checked_at} for row in rows]
+    )
+    return {row.id: results[row.external_url] for row in rows}
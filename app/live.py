@@ -0,0 +1,280 @@
+"""
+Живые обновления страниц идеи и её реализаций через Server-Sent Events.
+
+GET /ideas/<id>/events держит соединение открытым и присылает события идеи
+по мере того, как записи фиксируются в базе:
+  * comment         - новый комментарий к идее или к её реализации;
+  * comment_deleted - удалена ветка комментариев;
+  * implementation  - новая реализация;
+  * status          - сменился статус реализации.
+Страница показывает, что изменилось, вместо того чтобы её перезагружали
+наугад. Маршруты записи перед commit вызывают comment_added() и т.п.:
+события копятся в session.info и уходят подписчикам после успешного commit
+(откат их отбрасывает) - так же, как сброс кэша в app/cache.py.
+
+Брокер живёт в памяти процесса, у каждого подписчика своя очередь на
+LIVE_QUEUE_SIZE событий; подписчик, который не успевает их читать,
+отключается и переподключается заново. Если процессов несколько (воркеры
+gunicorn), события между ними передаёт Redis pub/sub (LIVE_REDIS_URL, нужен
+пакет redis). Без него подписчик видит только записи своего процесса.
+
+Поток событий занимает поток воркера на всё время соединения, поэтому
+соединений не больше LIVE_MAX_CONNECTIONS на процесс и LIVE_MAX_PER_CLIENT
+на одного клиента (вошедший пользователь, иначе адрес); сверх лимита - ответ
+503 с Retry-After. За обратным прокси адрес клиента берётся из X-Forwarded-For
+только при PROXY_FIX_X_FOR > 0, иначе все анонимные посетители - один клиент. Раз в
+LIVE_HEARTBEAT_SECONDS уходит пинг: прокси не закрывают простаивающее
+соединение, а отключившийся клиент обнаруживается на записи. Через
+LIVE_MAX_SECONDS поток закрывается, и браузер переподключается сам.
+"""
+import json
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict
+
+from flask import request
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.extensions import db
+from app.models import Implementation
+
+logger = logging.getLogger(__name__)
+
+# Через сколько миллисекунд браузер переподключается после обрыва
+RETRY_MS = 5000
+
+
+class TooManyConnections(Exception):
+    """Достигнут лимит потоков событий процесса или клиента"""
+
+
+class Subscription:
+    """Подписка одного потока событий на канал"""
+
+    def __init__(self, broker, channel, client, queue_size):
+        self.broker = broker
+        self.channel = channel
+        self.client = client
+        self.queue = queue.Queue(queue_size)
+        self.dropped = False
+
+    def put(self, payload):
+        try:
+            self.queue.put_nowait(payload)
+        except queue.Full:
+            # Клиент не успевает читать: поток закроется, браузер переподключится
+            self.dropped = True
+
+    def get(self, timeout):
+        """Следующее событие или None, если за timeout секунд событий не было"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class RedisRelay:
+    """Передаёт события между процессами через один канал Redis pub/sub"""
+
+    CHANNEL = 'reqimple:live'
+
+    def __init__(self, url, dispatch):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('Для LIVE_REDIS_URL установите пакет redis')
+        self.client = redis.Redis.from_url(url)
+        self.errors = redis.RedisError
+        self.dispatch = dispatch
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def publish(self, channel, payload):
+        self.client.publish(self.CHANNEL, json.dumps([channel, payload]))
+
+    def start(self):
+        """Запускает приём событий (в процессе, где появился первый подписчик)"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._listen, name='live-relay', daemon=True)
+                self._thread.start()
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.CHANNEL)
+                for message in pubsub.listen():
+                    channel, payload = json.loads(message['data'])
+                    self.dispatch(channel, payload)
+            except self.errors:
+                logger.exception('Потеряно соединение с Redis для живых обновлений')
+                time.sleep(1)
+
+
+class Broker:
+    """Подписчики каналов процесса и их лимиты"""
+
+    def __init__(self):
+        self.max_connections = 100
+        self.max_per_client = 4
+        self.queue_size = 100
+        self.heartbeat = 15
+        self.max_seconds = 300
+        self.relay = None
+        self._channels = defaultdict(set)
+        self._clients = defaultdict(int)
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.max_connections = app.config['LIVE_MAX_CONNECTIONS']
+        self.max_per_client = app.config['LIVE_MAX_PER_CLIENT']
+        self.queue_size = app.config['LIVE_QUEUE_SIZE']
+        self.heartbeat = app.config['LIVE_HEARTBEAT_SECONDS']
+        self.max_seconds = app.config['LIVE_MAX_SECONDS']
+        url = app.config['LIVE_REDIS_URL']
+        self.relay = RedisRelay(url, self.dispatch) if url else None
+
+    @property
+    def connections(self):
+        return self._count
+
+    def subscribe(self, channel, client):
+        """Новая подписка; TooManyConnections, если лимиты исчерпаны"""
+        with self._lock:
+            if self._count >= self.max_connections or self._clients[client] >= self.max_per_client:
+                raise TooManyConnections()
+            subscription = Subscription(self, channel, client, self.queue_size)
+            self._channels[channel].add(subscription)
+            self._clients[client] += 1
+            self._count += 1
+        if self.relay is not None:
+            self.relay.start()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """Снимает подписку (повторный вызов ничего не делает)"""
+        with self._lock:
+            subscribers = self._channels.get(subscription.channel)
+            if subscribers is None or subscription not in subscribers:
+                return
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._channels[subscription.channel]
+            self._clients[subscription.client] -= 1
+            if not self._clients[subscription.client]:
+                del self._clients[subscription.client]
+            self._count -= 1
+
+    def publish(self, channel, payload):
+        """Отправляет событие подписчикам канала во всех процессах (через relay) или в этом"""
+        if self.relay is not None:
+            self.relay.publish(channel, payload)
+        else:
+            self.dispatch(channel, payload)
+
+    def dispatch(self, channel, payload):
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+        for subscription in subscribers:
+            subscription.put(payload)
+
+
+broker = Broker()
+
+
+def client_key():
+    """Клиент для лимита LIVE_MAX_PER_CLIENT: вошедший пользователь или адрес анонимного посетителя"""
+    if current_user.is_authenticated:
+        return f'user:{current_user.id}'
+    return f'addr:{request.remote_addr}'
+
+
+def stream(subscription):
+    """Тело ответа text/event-stream: события подписки, пинги и закрытие через max_seconds"""
+    deadline = time.monotonic() + broker.max_seconds
+    try:
+        yield f'retry: {RETRY_MS}\n\n'
+        while not subscription.dropped:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            payload = subscription.get(timeout=min(broker.heartbeat, remaining))
+            if payload is None:
+                yield ': ping\n\n'
+            else:
+                yield f"event: {payload['type']}\ndata: {json.dumps(payload)}\n\n"
+    finally:
+        subscription.close()
+
+
+# ============ СОБЫТИЯ (вызываются маршрутами в транзакции записи) ============
+
+def publish_on_commit(session, idea_id, **payload):
+    """Откладывает событие идеи до успешного commit сессии"""
+    session.info.setdefault('live_events', []).append((f'idea:{idea_id}', payload))
+
+
+@event.listens_for(Session, 'after_commit')
+def _publish_committed(session):
+    for channel, payload in session.info.pop('live_events', ()):
+        try:
+            broker.publish(channel, payload)
+        except Exception:
+            # Запись уже зафиксирована: без живого обновления страница просто устареет
+            logger.exception('Не удалось отправить событие %s', channel)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_events(session):
+    session.info.pop('live_events', None)
+
+
+def idea_id_of(parent_type, parent_id):
+    """Идея, на странице которой видны комментарии родителя"""
+    if parent_type == 'idea':
+        return parent_id
+    implementation = db.session.get(Implementation, parent_id)
+    return implementation.idea_source_id if implementation is not None else None
+
+
+def comment_added(comment):
+    """Новый комментарий или ответ (id уже заполнен)"""
+    idea_id = idea_id_of(comment.parent_type, comment.parent_id)
+    if idea_id is not None:
+        publish_on_commit(
+            Session.object_session(comment), idea_id, type='comment', id=comment.id,
+            parent_type=comment.parent_type, parent_id=comment.parent_id, reply_to_id=comment.reply_to_id
+        )
+
+
+def comments_removed(comment):
+    """Удалена ветка комментариев начиная с comment"""
+    idea_id = idea_id_of(comment.parent_type, comment.parent_id)
+    if idea_id is not None:
+        publish_on_commit(
+            Session.object_session(comment), idea_id, type='comment_deleted', id=comment.id,
+            parent_type=comment.parent_type, parent_id=comment.parent_id
+        )
+
+
+def implementation_added(implementation):
+    """Новая реализация (id уже заполнен)"""
+    publish_on_commit(
+        Session.object_session(implementation), implementation.idea_source_id,
+        type='implementation', id=implementation.id, status=implementation.status
+    )
+
+
+def implementations_status_changed(rows, status):
+    """Реализации получили статус status; rows - строки с id и idea_source_id"""
+    for row in rows:
+        publish_on_commit(db.session, row.idea_source_id, type='status', id=row.id, status=status)
@@ -0,0 +1,209 @@
+"""
+Инструментирование запросов (включается METRICS_ENABLED=1).
+
+Для каждого HTTP-запроса собирается:
+  * общее время обработки - гистограмма по view, методу и статусу;
+  * число SQL-запросов и время каждого (события движка SQLAlchemy);
+  * время рендеринга шаблонов (сигналы Flask before_render_template/template_rendered).
+Запросы дольше SLOW_QUERY_MS пишутся в лог вместе с view, который их выполнил.
+
+Метрики отдаются на /metrics в текстовом формате Prometheus вместе с глубиной
+очередей модерации и фоновых задач, а разбивка времени текущего запроса - в
+заголовке Server-Timing. Значения хранятся в памяти процесса: при нескольких воркерах
+gunicorn каждый отдаёт свои.
+Для потоковых ответов учитывается время до начала отправки тела.
+"""
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from flask import Response, before_render_template, g, has_request_context, request, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин в секундах (как у клиентских библиотек Prometheus по умолчанию)
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    """Гистограмма Prometheus с метками"""
+
+    def __init__(self, name, description, labels, buckets=DURATION_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets = buckets
+        self._series = defaultdict(lambda: [[0] * len(buckets), 0, 0.0])  # корзины, count, sum
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series[label_values]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += 1
+            series[2] += value
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = {key: (list(buckets), count, total) for key, (buckets, count, total) in self._series.items()}
+        for label_values, (buckets, count, total) in sorted(series.items()):
+            labels = ','.join(f'{name}="{value}"' for name, value in zip(self.labels, label_values))
+            for bound, value in zip(self.buckets, buckets):
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {value}')
+            lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f'{self.name}_count{{{labels}}} {count}')
+            lines.append(f'{self.name}_sum{{{labels}}} {total:.6f}')
+        return lines
+
+
+class Metrics:
+    def __init__(self):
+        self.enabled = False
+        self.slow_query_seconds = 0.2
+        self.request_duration = Histogram(
+            'reqimple_request_duration_seconds', 'Время обработки HTTP-запроса',
+            ('endpoint', 'method', 'status'))
+        self.sql_duration = Histogram(
+            'reqimple_sql_duration_seconds', 'Время выполнения одного SQL-запроса', ('endpoint',))
+        self.sql_statements = Histogram(
+            'reqimple_sql_statements_per_request', 'Число SQL-запросов на HTTP-запрос', ('endpoint',),
+            buckets=COUNT_BUCKETS)
+        self.render_duration = Histogram(
+            'reqimple_template_render_seconds', 'Время рендеринга шаблонов за HTTP-запрос', ('endpoint',))
+
+    def init_app(self, app):
+        self.enabled = app.config['METRICS_ENABLED']
+        self.slow_query_seconds = app.config['SLOW_QUERY_MS'] / 1000
+        if not self.enabled:
+            return
+
+        app.before_request(_start_request)
+        app.after_request(_finish_request)
+        before_render_template.connect(_start_render, app)
+        template_rendered.connect(_finish_render, app)
+        app.add_url_rule('/metrics', 'metrics', metrics_view)
+
+    def expose(self):
+        from app.cache import response_cache
+        from app.jobs import queue_stats
+        from app.live import broker
+        from app.moderation import queue_depth
+
+        lines = []
+        for histogram in (self.request_duration, self.sql_duration, self.sql_statements, self.render_duration):
+            lines.extend(histogram.expose())
+        for name, value in response_cache.stats().items():
+            lines.append(f'# TYPE reqimple_response_cache_{name}_total counter')
+            lines.append(f'reqimple_response_cache_{name}_total {value}')
+
+        depth, oldest = queue_depth()
+        age = (datetime.utcnow() - oldest).total_seconds() if oldest else 0
+        lines += [
+            '# HELP reqimple_moderation_queue_depth Реализаций в очереди модерации',
+            '# TYPE reqimple_moderation_queue_depth gauge',
+            f'reqimple_moderation_queue_depth {depth}',
+            '# HELP reqimple_moderation_oldest_age_seconds Возраст самой старой реализации в очереди',
+            '# TYPE reqimple_moderation_oldest_age_seconds gauge',
+            f'reqimple_moderation_oldest_age_seconds {age:.0f}',
+        ]
+
+        counts, oldest = queue_stats()
+        lines += ['# HELP reqimple_jobs Фоновых задач в очереди, в работе и упавших', '# TYPE reqimple_jobs gauge']
+        lines += [f'reqimple_jobs{{name="{name}",status="{status}"}} {count}'
+                  for (name, status), count in sorted(counts.items())]
+        age = (datetime.utcnow() - oldest).total_seconds() if oldest else 0
+        lines += [
+            '# HELP reqimple_jobs_oldest_age_seconds Сколько ждёт самая старая готовая к выполнению задача',
+            '# TYPE reqimple_jobs_oldest_age_seconds gauge',
+            f'reqimple_jobs_oldest_age_seconds {age:.0f}',
+            '# HELP reqimple_live_connections Открытых потоков живых обновлений в этом процессе',
+            '# TYPE reqimple_live_connections gauge',
+            f'reqimple_live_connections {broker.connections}',
+        ]
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+def metrics_view():
+    return Response(metrics.expose(), mimetype='text/plain; version=0.0.4')
+
+
+# ============ HTTP-ЗАПРОСЫ И ШАБЛОНЫ ============
+
+def _start_request():
+    g.metrics_started_at = time.perf_counter()
+    g.sql_seconds = 0.0
+    g.render_seconds = 0.0
+
+
+def _finish_request(response):
+    if 'metrics_started_at' not in g:
+        return response
+    total = time.perf_counter() - g.metrics_started_at
+    endpoint = request.endpoint or 'unknown'
+    statements = g.get('sql_statements', 0)
+
+    metrics.request_duration.observe(total, endpoint, request.method, str(response.status_code))
+    metrics.sql_statements.observe(statements, endpoint)
+    if g.render_seconds:
+        metrics.render_duration.observe(g.render_seconds, endpoint)
+
+    response.headers.add('Server-Timing', ', '.join([
+        f'sql;dur={g.sql_seconds * 1000:.2f};desc="{statements} queries"',
+        f'render;dur={g.render_seconds * 1000:.2f}',
+        f'total;dur={total * 1000:.2f}',
+    ]))
+    return response
+
+
+def _start_render(sender, template, context, **extra):
+    g.render_started_at = time.perf_counter()
+
+
+def _finish_render(sender, template, context, **extra):
+    started_at = g.pop('render_started_at', None)
+    if started_at is not None and 'render_seconds' in g:
+        g.render_seconds += time.perf_counter() - started_at
+
+
+# ============ SQL ============
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_statement(conn, cursor, statement, parameters, context, executemany):
+    if metrics.enabled:
+        conn.info.setdefault('metrics_started_at', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _finish_statement(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('metrics_started_at')
+    if not metrics.enabled or not started:
+        return
+    duration = time.perf_counter() - started.pop()
+
+    view = request.endpoint if has_request_context() else None
+    if has_request_context() and 'sql_seconds' in g:
+        g.sql_seconds += duration
+        metrics.sql_duration.observe(duration, view or 'unknown')
+
+    if duration >= metrics.slow_query_seconds:
+        logger.warning('Медленный SQL-запрос (%.1f мс) во view %s: %s',
+                       duration * 1000, view or '-', ' '.join(statement.split())[:500])
+
+
+@event.listens_for(Engine, 'handle_error')
+def _discard_statement(context):
+    # after_cursor_execute для упавшего запроса не вызывается
+    started = context.connection.info.get('metrics_started_at') if context.connection is not None else None
+    if started:
+        started.pop()
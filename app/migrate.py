@@ -0,0 +1,53 @@
+"""
+Применение миграций Alembic из кода приложения.
+
+Базы, созданные раньше через db.create_all(), не имеют таблицы alembic_version;
+их сначала помечаем исходной ревизией, а затем обновляем до последней.
+"""
+import os
+from functools import lru_cache
+
+from alembic import command
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import inspect
+
+from app.extensions import db
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Ревизия, соответствующая схеме db.create_all() до перехода на Alembic
+BASELINE_REVISION = '0001'
+
+
+def alembic_config(connection=None):
+    """Конфиг Alembic с абсолютными путями (не зависит от текущего каталога)"""
+    config = Config(os.path.join(BASE_DIR, 'alembic.ini'))
+    config.set_main_option('script_location', os.path.join(BASE_DIR, 'migrations'))
+    config.attributes['configure_logger'] = False
+    if connection is not None:
+        config.attributes['connection'] = connection
+    return config
+
+
+def upgrade_database(app, revision='head'):
+    """Обновляет схему базы приложения до указанной ревизии"""
+    with app.app_context():
+        with db.engine.begin() as connection:
+            tables = inspect(connection).get_table_names()
+            config = alembic_config(connection)
+            if 'user' in tables and 'alembic_version' not in tables:
+                command.stamp(config, BASELINE_REVISION)
+            command.upgrade(config, revision)
+
+
+@lru_cache(maxsize=None)
+def head_revision():
+    """Последняя ревизия в каталоге migrations (читается с диска один раз)"""
+    return ScriptDirectory.from_config(alembic_config()).get_current_head()
+
+
+def current_revision(connection):
+    """Ревизия, до которой обновлена база (None для пустой базы)"""
+    return MigrationContext.configure(connection).get_current_revision()
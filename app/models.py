@@ -1,6 +1,8 @@
 from .extensions import db
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import event
+from sqlalchemy.orm.attributes import set_committed_value
+from .passwords import password_hasher
 from datetime import datetime
 
 
@@ -9,13 +11,18 @@ class User(db.Model, UserMixin):
     email = db.Column(db.String(120), unique=True, nullable=False)
     username = db.Column(db.String(80), unique=True, nullable=False)
     display_name = db.Column(db.String(100), nullable=False)
-    password_hash = db.Column(db.String(128))
+    password_hash = db.Column(db.String(256))
 
     bio = db.Column(db.Text)
 
     is_admin = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    # Денормализованные счётчики (поддерживаются app.counters)
+    idea_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # активные идеи
+    comment_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    verified_implementation_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
     # Relationships
     ideas = db.relationship('Idea', back_populates='author', lazy=True, cascade='all, delete-orphan')
     implementations = db.relationship('Implementation', back_populates='author', lazy=True,
@@ -23,16 +30,29 @@ class User(db.Model, UserMixin):
     comments = db.relationship('Comment', back_populates='author', lazy=True, cascade='all, delete-orphan')
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        # У импортированных пользователей и пользователей бота пароля нет, войти под ними нельзя
+        if not self.password_hash:
+            return False
+        return password_hasher.verify(self.password_hash, password)
+
+    def password_needs_rehash(self):
+        return bool(self.password_hash) and password_hasher.needs_rehash(self.password_hash)
 
     def __repr__(self):
         return f'<User {self.username}>'
 
 
 class Idea(db.Model):
+    __table_args__ = (
+        # Лента: status='active' ORDER BY created_at DESC, id DESC
+        db.Index('ix_idea_status_created_at', 'status', 'created_at', 'id'),
+        # Профиль: author_id=? AND status='active' ORDER BY created_at DESC
+        db.Index('ix_idea_author_status_created_at', 'author_id', 'status', 'created_at'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text, nullable=False)
@@ -41,58 +61,201 @@ class Idea(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    # Денормализованные счётчики (поддерживаются app.counters)
+    comment_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    implementation_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
     # Relationships
     author = db.relationship('User', back_populates='ideas')
     implementations = db.relationship('Implementation', back_populates='idea', lazy=True, cascade='all, delete-orphan')
-    comments = db.relationship('Comment', back_populates='idea', lazy=True, cascade='all, delete-orphan')
+    comments = db.relationship(
+        'Comment', lazy=True, viewonly=True,
+        primaryjoin="and_(Comment.parent_type == 'idea', foreign(Comment.parent_id) == Idea.id)"
+    )
+    ranking = db.relationship('IdeaRanking', uselist=False, viewonly=True)
+
+    @property
+    def ranking_score(self):
+        """Оценка популярности (для курсора ранжированной ленты)"""
+        return self.ranking.score if self.ranking is not None else None
 
     def __repr__(self):
         return f'<Idea {self.title}>'
 
 
+class IdeaRanking(db.Model):
+    """Предрассчитанные оценки активных идей для ранжированных лент (app/ranking.py)"""
+    __table_args__ = (
+        # Популярные: ORDER BY score DESC, idea_id DESC
+        db.Index('ix_idea_ranking_score', 'score', 'idea_id'),
+        # Ждут реализации: needs_implementation=true ORDER BY score DESC, idea_id DESC
+        db.Index('ix_idea_ranking_needs_implementation', 'needs_implementation', 'score', 'idea_id'),
+    )
+
+    idea_id = db.Column(db.Integer, db.ForeignKey('idea.id', ondelete='CASCADE'), primary_key=True)
+    score = db.Column(db.Float, nullable=False)
+    needs_implementation = db.Column(db.Boolean, nullable=False)  # нет ни одной верифицированной реализации
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+# Статусы реализаций, которые не показываются в поиске
+HIDDEN_IMPLEMENTATION_STATUSES = ('hidden', 'rejected')
+
+
 class Implementation(db.Model):
+    __table_args__ = (
+        # Модерация: status='pending' ORDER BY created_at, id
+        db.Index('ix_implementation_status_created_at', 'status', 'created_at', 'id'),
+        # Профиль: author_id=? AND status='verified' ORDER BY created_at DESC
+        db.Index('ix_implementation_author_status_created_at', 'author_id', 'status', 'created_at'),
+        # Реализации на странице идеи
+        db.Index('ix_implementation_idea_source_id', 'idea_source_id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text, nullable=False)
     external_url = db.Column(db.String(500), nullable=False)
     type = db.Column(db.String(50), default='other')  # github_repo, etc.
-    status = db.Column(db.String(20), default='pending')  # pending, verified, hidden
+    status = db.Column(db.String(20), default='pending')  # pending, verified, hidden, rejected
     idea_source_id = db.Column(db.Integer, db.ForeignKey('idea.id'), nullable=False)
     author_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Оптимистическая блокировка: UPDATE через ORM проверяет и увеличивает номер версии
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+
+    # Последняя проверка external_url (app/linkcheck.py): код ответа (NULL - ответа нет,
+    # причина в link_error) и заголовок страницы
+    link_status = db.Column(db.Integer)
+    link_title = db.Column(db.String(300))
+    link_error = db.Column(db.String(200))
+    link_checked_at = db.Column(db.DateTime)
+
+    __mapper_args__ = {'version_id_col': version}
 
     # Relationships
     idea = db.relationship('Idea', back_populates='implementations')
     author = db.relationship('User', back_populates='implementations')
-    comments = db.relationship('Comment', back_populates='implementation', lazy=True, cascade='all, delete-orphan')
+    comments = db.relationship(
+        'Comment', lazy=True, viewonly=True,
+        primaryjoin="and_(Comment.parent_type == 'implementation', foreign(Comment.parent_id) == Implementation.id)"
+    )
+
+    @property
+    def link_ok(self):
+        """Ссылка отвечает без ошибки; None - ещё не проверялась"""
+        if self.link_checked_at is None:
+            return None
+        return self.link_status is not None and self.link_status < 400
 
     def __repr__(self):
         return f'<Implementation {self.title}>'
 
 
+# Материализованный путь комментария: id всех предков и самого комментария,
+# дополненные нулями до COMMENT_PATH_DIGITS цифр и разделённые '/'.
+# Сортировка по path обходит ветку в глубину, а вся ветка - диапазон path.
+COMMENT_PATH_DIGITS = 10
+COMMENT_MAX_DEPTH = 8  # ответ на более глубокий комментарий становится ему соседом
+
+
 class Comment(db.Model):
+    __table_args__ = (
+        # Ветки комментариев: parent_type=? AND parent_id=? AND reply_to_id IS NULL ORDER BY created_at DESC, id DESC
+        db.Index('ix_comment_parent_thread', 'parent_type', 'parent_id', 'reply_to_id', 'created_at', 'id'),
+        # Ответы в ветке: path >= ? AND path < ?
+        db.Index('ix_comment_path', 'path', unique=True),
+        db.Index('ix_comment_author_id', 'author_id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     content = db.Column(db.Text, nullable=False)
 
-    # Для полиморфной связи с идеями или реализациями
+    # Родитель комментария - идея или реализация
     parent_type = db.Column(db.String(20), nullable=False)  # 'idea' or 'implementation'
     parent_id = db.Column(db.Integer, nullable=False)  # ID of parent (Idea or Implementation)
 
-    # Внешние ключи и отношения для конкретных типов
-    idea_id = db.Column(db.Integer, db.ForeignKey('idea.id', ondelete='CASCADE'), nullable=True)
-    implementation_id = db.Column(db.Integer, db.ForeignKey('implementation.id', ondelete='CASCADE'), nullable=True)
+    # Ответ на другой комментарий той же ветки (NULL - комментарий верхнего уровня)
+    reply_to_id = db.Column(db.Integer, db.ForeignKey('comment.id', ondelete='CASCADE'), nullable=True)
+    # Заполняется сразу после INSERT (нужен id), см. _fill_comment_path
+    path = db.Column(db.String(255), nullable=True)
 
     author_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     # Relationships
     author = db.relationship('User', back_populates='comments')
+    reply_to = db.relationship('Comment', remote_side=[id])
 
-    # Для идей
-    idea = db.relationship('Idea', back_populates='comments', foreign_keys=[idea_id])
+    @staticmethod
+    def path_segment(id):
+        return str(id).zfill(COMMENT_PATH_DIGITS)
 
-    # Для реализаций
-    implementation = db.relationship('Implementation', back_populates='comments', foreign_keys=[implementation_id])
+    @property
+    def depth(self):
+        """Уровень вложенности: 0 - комментарий верхнего уровня"""
+        return self.path.count('/') if self.path else 0
+
+    def subtree_filter(self):
+        """Условие на все ответы в ветке комментария (без него самого)"""
+        # Цифры в ASCII идут сразу после '/', поэтому ветка - полуинтервал [path/, path0)
+        return db.and_(Comment.path >= self.path + '/', Comment.path < self.path + '0')
 
     def __repr__(self):
         return f'<Comment {self.id} by {self.author.username}>'
+
+
+@event.listens_for(Comment, 'after_insert')
+def _fill_comment_path(mapper, connection, comment):
+    parent_path = None
+    if comment.reply_to_id is not None:
+        parent_path = connection.scalar(db.select(Comment.path).where(Comment.id == comment.reply_to_id))
+    segment = Comment.path_segment(comment.id)
+    path = f'{parent_path}/{segment}' if parent_path else segment
+    connection.execute(Comment.__table__.update().where(Comment.id == comment.id).values(path=path))
+    set_committed_value(comment, 'path', path)
+
+
+class Job(db.Model):
+    """Фоновая задача в очереди (app/jobs.py)"""
+    __table_args__ = (
+        # Выборка воркером: status='queued' AND run_at <= now ORDER BY run_at, id
+        db.Index('ix_job_status_run_at', 'status', 'run_at', 'id'),
+        # Лимит одновременных задач: name=? AND status='running'
+        db.Index('ix_job_name_status', 'name', 'status'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.JSON, nullable=False, default=dict)
+    # Повторная постановка с тем же ключом ничего не делает, пока задача не удалена из таблицы
+    idempotency_key = db.Column(db.String(255), unique=True, nullable=True)
+
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, done, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    max_attempts = db.Column(db.Integer, nullable=False)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # не раньше (повтор с отсрочкой)
+
+    locked_by = db.Column(db.String(100))  # воркер, выполняющий задачу
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'<Job {self.id} {self.name} {self.status}>'
+
+
+class Notification(db.Model):
+    """Событие для уведомления пользователя; удаляется, когда уходит в дайджест (app/notifications.py)"""
+    __table_args__ = (
+        # Дайджест: user_id=? ORDER BY id
+        db.Index('ix_notification_user_id', 'user_id', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
+    text = db.Column(db.String(500), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -0,0 +1,121 @@
+"""
+Пакетная модерация реализаций.
+
+Очередь - реализации со статусом pending от старых к новым, курсорная
+пагинация по индексу (status, created_at, id).
+
+Действие над выбранными реализациями выполняется одним UPDATE ... RETURNING.
+Оптимистическая блокировка: форма присылает пары id:version, и UPDATE
+затрагивает только строки, которые всё ещё pending и не менялись с момента
+показа страницы. Строки, которые успел обработать другой модератор,
+возвращаются как конфликты и не меняются повторно. Верификация одной
+реализации и её отмена (toggle_verified) идут тем же условным UPDATE.
+"""
+from collections import namedtuple
+
+from sqlalchemy import func, select, tuple_, update
+
+from app import counters, jobs, live, notifications, search
+from app.cache import invalidate_on_commit
+from app.extensions import db
+from app.models import HIDDEN_IMPLEMENTATION_STATUSES, Implementation, User
+
+# Действие -> новый статус
+ACTIONS = {'approve': 'verified', 'hide': 'hidden', 'reject': 'rejected'}
+
+ModerationResult = namedtuple('ModerationResult', ['processed', 'conflicts'])
+
+
+def parse_items(values):
+    """Пары (id, version) из значений вида '12:3'; некорректные значения пропускаются"""
+    keys = set()
+    for value in values:
+        try:
+            id, version = value.split(':', 1)
+            keys.add((int(id), int(version)))
+        except ValueError:
+            continue
+    return sorted(keys)
+
+
+def moderate(action, items):
+    """Меняет статус выбранных реализаций из очереди; items - значения 'id:version'"""
+    status = ACTIONS[action]
+    keys = parse_items(items)
+    if not keys:
+        return ModerationResult([], 0)
+
+    table = Implementation.__table__
+    rows = db.session.execute(
+        update(table)
+        .where(tuple_(table.c.id, table.c.version).in_(keys), table.c.status == 'pending')
+        .values(status=status, version=table.c.version + 1)
+        .returning(table.c.id, table.c.author_id, table.c.idea_source_id)
+    ).all()
+
+    if rows:
+        counters.implementations_moderated(rows, status)
+        if status in HIDDEN_IMPLEMENTATION_STATUSES:
+            search.remove_many('implementation', [row.id for row in rows])
+        elif status == 'verified':
+            notifications.implementations_verified([row.id for row in rows])
+        live.implementations_status_changed(rows, status)
+
+        invalidate_rows(rows)
+    db.session.commit()
+    return ModerationResult([row.id for row in rows], len(keys) - len(rows))
+
+
+def toggle_verified(id, version):
+    """
+    Верифицирует реализацию или снимает верификацию (verified -> pending).
+
+    Возвращает новый статус или None, если реализация изменилась после
+    показа страницы (version не совпал) - тогда ничего не меняется.
+    Скрытая или отклонённая реализация после верификации возвращается в поиск.
+    """
+    table = Implementation.__table__
+    old_status = db.session.scalar(select(table.c.status).where(table.c.id == id, table.c.version == version))
+    if old_status is None:
+        return None
+    status = 'pending' if old_status == 'verified' else 'verified'
+    # Прежний статус в условии: UPDATE сработает, только если строка всё ещё такая, какой её прочитали
+    row = db.session.execute(
+        update(table)
+        .where(table.c.id == id, table.c.version == version, table.c.status == old_status)
+        .values(status=status, version=table.c.version + 1)
+        .returning(table.c.id, table.c.author_id, table.c.idea_source_id, table.c.status)
+    ).one_or_none()
+    if row is None:
+        db.session.rollback()
+        return None
+
+    counters.implementation_status_changed(row, old_status)
+    if old_status in HIDDEN_IMPLEMENTATION_STATUSES:
+        jobs.enqueue('search.index', kind='implementation', id=row.id)
+    if row.status == 'verified':
+        notifications.implementations_verified([row.id])
+    live.implementations_status_changed([row], row.status)
+    invalidate_rows([row])
+    db.session.commit()
+    return row.status
+
+
+def invalidate_rows(rows):
+    """Сброс кэша после смены статуса реализаций: их страницы, страницы идей, профили и ленты"""
+    usernames = db.session.scalars(select(User.username).where(User.id.in_({row.author_id for row in rows})))
+    invalidate_on_commit(
+        db.session,
+        'feed',  # ранжированные ленты
+        *(f'implementation:{row.id}' for row in rows),
+        *(f'idea:{idea_id}' for idea_id in {row.idea_source_id for row in rows}),
+        *(f'user:{username}' for username in usernames)
+    )
+
+
+def queue_depth():
+    """(число реализаций в очереди, created_at самой старой из них)"""
+    return tuple(db.session.execute(
+        select(func.count(Implementation.id), func.min(Implementation.created_at))
+        .where(Implementation.status == 'pending')
+    ).one())
@@ -0,0 +1,305 @@
+"""
+Уведомления в Telegram для авторов, пишущих через бота.
+
+Пользователь бота - User с username bot_<telegram_id>; личный чат с ботом
+имеет тот же id, поэтому отдельная привязка чатов не нужна. Пользователи
+сайта уведомлений не получают.
+
+Всё происходит в фоновых задачах (app/jobs.py), маршруты только ставят их:
+  * notifications.fanout - по событию (новый комментарий или ответ,
+    верификация реализации) находит получателей и сохраняет для каждого
+    строку Notification;
+  * notifications.digest - одна на пользователя за окно NOTIFY_DIGEST_SECONDS
+    (ключ идемпотентности с номером окна): в конце окна все накопленные
+    события пользователя уходят одним сообщением.
+Сообщения отправляются через токен-бакет (NOTIFY_RATE_PER_SECOND на процесс
+воркера, общий для его потоков); ответ 429 останавливает отправку на
+retry_after секунд, а задача повторяется позже. Если пользователь
+заблокировал бота, его события отбрасываются.
+
+Бэкенды (NOTIFY_BACKEND):
+  * telegram - Bot API (TELEGRAM_BOT_TOKEN, адрес - TELEGRAM_API_URL);
+  * fake     - сообщения копятся в памяти процесса (тесты, разработка);
+  * none     - уведомления выключены.
+"""
+import itertools
+import logging
+import threading
+import time
+from datetime import datetime
+
+import httpx
+from sqlalchemy import delete, insert, select
+
+from app import jobs
+from app.extensions import db
+from app.models import Comment, Idea, Implementation, Job, Notification, User
+
+logger = logging.getLogger(__name__)
+
+BOT_USERNAME_PREFIX = 'bot_'
+MESSAGE_MAX_LENGTH = 4096  # ограничение Bot API
+NOTIFICATION_MAX_LENGTH = 500
+SNIPPET_LENGTH = 100
+
+
+class RateLimited(Exception):
+    """Bot API ответил 429: повторить не раньше чем через retry_after секунд"""
+
+    def __init__(self, retry_after):
+        super().__init__(f'retry after {retry_after}s')
+        self.retry_after = retry_after
+
+
+class ChatUnavailable(Exception):
+    """Сообщение в этот чат не доставить (бот заблокирован, чат не найден)"""
+
+
+# ============ ОТПРАВКА ============
+
+class TokenBucket:
+    """Не больше rate отправок в секунду в среднем и capacity подряд; потокобезопасен"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Забирает токен, при необходимости дожидаясь его"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now >= self.updated_at:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                    self.updated_at = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+                else:
+                    wait = self.updated_at - now  # пауза после 429
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Ни одной отправки ближайшие seconds секунд"""
+        with self._lock:
+            self.tokens = 0
+            self.updated_at = max(self.updated_at, time.monotonic() + seconds)
+
+
+class TelegramBotApi:
+    """sendMessage Bot API через общий пул соединений httpx"""
+
+    def __init__(self, token, base_url='https://api.telegram.org', timeout=10.0):
+        self.url = f"{base_url.rstrip('/')}/bot{token}/sendMessage"
+        self.client = httpx.Client(timeout=timeout)
+
+    def send_message(self, chat_id, text):
+        response = self.client.post(self.url, json={
+            'chat_id': chat_id,
+            'text': text,
+            'disable_web_page_preview': True,
+        })
+        if response.status_code == 429:
+            raise RateLimited(response.json().get('parameters', {}).get('retry_after', 1))
+        if response.status_code in (400, 403):
+            raise ChatUnavailable(response.json().get('description', response.status_code))
+        response.raise_for_status()
+
+
+class FakeBotApi:
+    """Подмена Bot API: сообщения копятся в sent, errors - исключения для следующих отправок"""
+
+    def __init__(self):
+        self.sent = []  # (chat_id, text)
+        self.errors = []
+        self._lock = threading.Lock()
+
+    def send_message(self, chat_id, text):
+        with self._lock:
+            if self.errors:
+                raise self.errors.pop(0)
+            self.sent.append((chat_id, text))
+
+
+class Notifier:
+    def __init__(self):
+        self.api = None
+        self.bucket = None
+        self.digest_seconds = 60
+        self.digest_max_events = 10
+
+    def init_app(self, app):
+        backend = app.config['NOTIFY_BACKEND']
+        self.digest_seconds = app.config['NOTIFY_DIGEST_SECONDS']
+        self.digest_max_events = app.config['NOTIFY_DIGEST_MAX_EVENTS']
+        rate = app.config['NOTIFY_RATE_PER_SECOND']
+        self.bucket = TokenBucket(rate, max(1.0, rate))
+        if backend == 'telegram':
+            self.api = TelegramBotApi(app.config['TELEGRAM_BOT_TOKEN'], app.config['TELEGRAM_API_URL'])
+        elif backend == 'fake':
+            self.api = FakeBotApi()
+        else:
+            self.api = None
+
+    @property
+    def enabled(self):
+        return self.api is not None
+
+    def send(self, chat_id, text):
+        self.bucket.acquire()
+        try:
+            self.api.send_message(chat_id, text)
+        except RateLimited as e:
+            self.bucket.pause(e.retry_after)
+            raise
+
+
+notifier = Notifier()
+
+
+def chat_id_for(username):
+    """id личного чата пользователя бота или None для пользователей сайта"""
+    if not username or not username.startswith(BOT_USERNAME_PREFIX):
+        return None
+    try:
+        return int(username[len(BOT_USERNAME_PREFIX):])
+    except ValueError:
+        return None
+
+
+# ============ СОБЫТИЯ (вызываются маршрутами в транзакции записи) ============
+
+def comment_added(comment):
+    """Новый комментарий или ответ (id уже заполнен)"""
+    jobs.enqueue('notifications.fanout', event='comment', ids=[comment.id])
+
+
+def implementations_verified(implementation_ids):
+    """Реализации получили статус verified"""
+    if implementation_ids:
+        jobs.enqueue('notifications.fanout', event='verified', ids=sorted(implementation_ids))
+
+
+# ============ ЗАДАЧИ ============
+
+def snippet(text):
+    text = ' '.join(text.split())
+    return text if len(text) <= SNIPPET_LENGTH else text[:SNIPPET_LENGTH - 1] + '…'
+
+
+def comment_recipients(comment_id):
+    """{user_id: (username, текст)} для нового комментария"""
+    comment = db.session.get(Comment, comment_id)
+    if comment is None:
+        return {}
+    actor = comment.author.display_name
+    if comment.parent_type == 'idea':
+        parent = db.session.get(Idea, comment.parent_id)
+        what = 'идею'
+    else:
+        parent = db.session.get(Implementation, comment.parent_id)
+        what = 'реализацию'
+    if parent is None:
+        return {}
+
+    recipients = {
+        parent.author_id: (parent.author.username,
+                           f'💬 {actor} прокомментировал(а) {what} «{parent.title}»: {snippet(comment.content)}')
+    }
+    if comment.reply_to is not None:
+        # Автору комментария важнее, что ответили именно ему
+        recipients[comment.reply_to.author_id] = (
+            comment.reply_to.author.username,
+            f'↩️ {actor} ответил(а) на ваш комментарий к «{parent.title}»: {snippet(comment.content)}'
+        )
+    recipients.pop(comment.author_id, None)
+    return recipients
+
+
+def verification_recipients(implementation_id):
+    implementation = db.session.get(Implementation, implementation_id)
+    if implementation is None or implementation.status != 'verified':
+        return {}
+    recipients = {
+        implementation.idea.author_id: (
+            implementation.idea.author.username,
+            f'🛠 К вашей идее «{implementation.idea.title}» верифицирована реализация «{implementation.title}»'
+        ),
+        implementation.author_id: (
+            implementation.author.username,
+            f'✅ Ваша реализация «{implementation.title}» верифицирована'
+        ),
+    }
+    return recipients
+
+
+def fanout(event, ids):
+    """Сохраняет уведомления получателям события и ставит их дайджесты"""
+    if not notifier.enabled:
+        return
+    recipients = comment_recipients if event == 'comment' else verification_recipients
+    notifications = []
+    for id in ids:
+        notifications += [
+            {'user_id': user_id, 'text': text[:NOTIFICATION_MAX_LENGTH], 'created_at': datetime.utcnow()}
+            for user_id, (username, text) in recipients(id).items()
+            if chat_id_for(username) is not None
+        ]
+    if not notifications:
+        return
+    db.session.execute(insert(Notification), notifications)
+    for user_id in {notification['user_id'] for notification in notifications}:
+        schedule_digest(user_id)
+
+
+def schedule_digest(user_id):
+    """Ставит дайджест пользователя на конец текущего окна (одна задача на окно)"""
+    now = time.time()
+    for window in itertools.count(int(now // notifier.digest_seconds)):
+        key = f'notifications.digest:{user_id}:{window}'
+        delay = max(0.0, (window + 1) * notifier.digest_seconds - now)
+        if jobs.enqueue('notifications.digest', key=key, delay=delay, user_id=user_id):
+            return
+        # Дайджест окна уже забран воркером и новых событий не увидит - нужен следующий
+        if db.session.scalar(select(Job.status).where(Job.idempotency_key == key)) == 'queued':
+            return
+
+
+def digest_text(texts):
+    """Одно событие - как есть, несколько - списком (не больше digest_max_events)"""
+    if len(texts) == 1:
+        return texts[0][:MESSAGE_MAX_LENGTH]
+    shown = texts[:notifier.digest_max_events]
+    text = f'🔔 Новых событий: {len(texts)}\n\n' + '\n\n'.join(shown)
+    if len(texts) > len(shown):
+        text += f'\n\n…и ещё {len(texts) - len(shown)}'
+    return text[:MESSAGE_MAX_LENGTH]
+
+
+def send_digest(user_id):
+    """Отправляет накопленные события пользователя одним сообщением"""
+    rows = db.session.execute(
+        select(Notification.id, Notification.text).where(Notification.user_id == user_id).order_by(Notification.id)
+    ).all()
+    if not rows:
+        return
+    # Удаление до отправки: если отправка не удалась, откат вернёт события для повтора задачи,
+    # а пересекающийся дайджест того же пользователя не найдёт уже забранных строк
+    removed = db.session.execute(
+        delete(Notification).where(Notification.id.in_([row.id for row in rows]))
+    ).rowcount
+    if removed != len(rows):
+        db.session.rollback()
+        return
+
+    chat_id = chat_id_for(db.session.scalar(select(User.username).where(User.id == user_id)))
+    if chat_id is None or not notifier.enabled:
+        return
+    try:
+        notifier.send(chat_id, digest_text([row.text for row in rows]))
+    except ChatUnavailable as e:
+        logger.info('Уведомления пользователю %s не доставлены и отброшены: %s', user_id, e)
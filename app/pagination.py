@@ -0,0 +1,90 @@
+"""
+Курсорная (keyset) пагинация по паре (created_at, id) или другому ключу сортировки.
+
+Страница выбирается условием по ключу последней/первой записи, а не OFFSET,
+поэтому стоимость запроса не зависит от того, насколько глубоко листает клиент.
+"""
+import base64
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+Page = namedtuple('Page', ['items', 'next_cursor', 'prev_cursor'])
+
+# Ключ сортировки: столбец, уникальный столбец для записей с равным значением,
+# имя атрибута со значением у строк результата и разбор значения из курсора
+SortKey = namedtuple('SortKey', ['column', 'id', 'attr', 'parse'])
+
+
+def created_at_key(model):
+    return SortKey(model.created_at, model.id, 'created_at', datetime.fromisoformat)
+
+
+def encode_cursor(value, id):
+    """Кодирует ключ записи в непрозрачную строку для URL"""
+    raw = f'{value.isoformat() if isinstance(value, datetime) else repr(value)}|{id}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, parse=datetime.fromisoformat):
+    """Разбирает курсор; возвращает (значение, id) или None, если курсор битый"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        value, id = base64.urlsafe_b64decode(padded).decode().split('|', 1)
+        return parse(value), int(id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def keyset_page(query, model, limit, after=None, before=None, oldest_first=False, key=None):
+    """
+    Возвращает страницу записей, отсортированных от новых к старым
+    (или от старых к новым при oldest_first=True).
+
+    after  - курсор, после которого начинается страница (листаем вперёд);
+    before - курсор, перед которым заканчивается страница (листаем назад);
+    key    - SortKey, если сортировать нужно не по created_at (по убыванию
+             значения, при oldest_first - по возрастанию).
+    """
+    key = key or created_at_key(model)
+    column, id = key.column, key.id
+    after_key = decode_cursor(after, key.parse)
+    before_key = decode_cursor(before, key.parse) if after_key is None else None
+
+    def greater(bound):
+        value, key_id = bound
+        return or_(column > value, and_(column == value, id > key_id))
+
+    def less(bound):
+        value, key_id = bound
+        return or_(column < value, and_(column == value, id < key_id))
+
+    ascending, descending = (column.asc(), id.asc()), (column.desc(), id.desc())
+    # «Вперёд по списку» - к более старым записям или, при oldest_first, к более новым
+    further, earlier = (greater, less) if oldest_first else (less, greater)
+    forward, backward = (ascending, descending) if oldest_first else (descending, ascending)
+
+    if before_key is not None:
+        query = query.filter(earlier(before_key)).order_by(*backward)
+    else:
+        if after_key is not None:
+            query = query.filter(further(after_key))
+        query = query.order_by(*forward)
+
+    # Берём на одну запись больше, чтобы узнать, есть ли следующая страница
+    rows = query.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    if before_key is not None:
+        rows.reverse()
+        has_next, has_prev = True, has_more
+    else:
+        has_next, has_prev = has_more, after_key is not None
+
+    next_cursor = encode_cursor(getattr(rows[-1], key.attr), rows[-1].id) if rows and has_next else None
+    prev_cursor = encode_cursor(getattr(rows[0], key.attr), rows[0].id) if rows and has_prev else None
+    return Page(rows, next_cursor, prev_cursor)
@@ -0,0 +1,95 @@
+"""
+Хэширование паролей вне потоков обработки запросов.
+
+PBKDF2/scrypt нагружают процессор и держат GIL, поэтому вход нескольких
+пользователей одновременно останавливал все потоки воркера. Хэши считаются в
+отдельном пуле процессов (PASSWORD_HASH_WORKERS, 0 - в текущем потоке), поток
+запроса только ждёт результат.
+
+Одновременно в пуле не больше PASSWORD_HASH_MAX_PENDING задач; если место не
+освободилось за PASSWORD_HASH_TIMEOUT секунд, выбрасывается PasswordHasherBusy
+(ответ 503) - очередь не растёт без ограничений.
+
+Алгоритм и его параметры задаются PASSWORD_HASH_METHOD в формате Werkzeug
+(pbkdf2:sha256:600000, scrypt:32768:8:1 ...). Хэши со старыми параметрами
+пересчитываются при следующем успешном входе.
+"""
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class PasswordHasherBusy(RuntimeError):
+    """Все места в очереди хэширования заняты"""
+
+
+class PasswordHasher:
+    def __init__(self):
+        self.method = 'pbkdf2'
+        self.workers = 0
+        self.max_pending = 1
+        self.timeout = 5
+        self._lock = threading.Lock()
+        self._executor = None
+        self._slots = None
+        self._pid = None
+        self._method_prefix = None
+
+    def init_app(self, app):
+        self.method = app.config['PASSWORD_HASH_METHOD']
+        self.workers = app.config['PASSWORD_HASH_WORKERS']
+        self.max_pending = app.config['PASSWORD_HASH_MAX_PENDING'] or max(1, self.workers) * 4
+        self.timeout = app.config['PASSWORD_HASH_TIMEOUT']
+        self._method_prefix = None
+
+    def _pool(self):
+        """Пул процессов текущего процесса (после fork пул родителя недоступен)"""
+        with self._lock:
+            if self._pid != os.getpid():
+                # spawn, а не fork: пул создаётся из потока запроса в процессе, где работают
+                # другие потоки (запросы, воркер очереди), и fork скопировал бы их занятые блокировки
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context('spawn')
+                )
+                self._slots = threading.BoundedSemaphore(self.max_pending)
+                self._pid = os.getpid()
+            return self._executor, self._slots
+
+    def _run(self, func, *args):
+        if not self.workers:
+            return func(*args)
+        executor, slots = self._pool()
+        if not slots.acquire(timeout=self.timeout):
+            raise PasswordHasherBusy('Очередь хэширования паролей переполнена')
+        try:
+            return executor.submit(func, *args).result()
+        finally:
+            slots.release()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """Хэш посчитан не текущим методом (или с другими параметрами)"""
+        if self._method_prefix is None:
+            # Werkzeug дополняет метод параметрами по умолчанию: pbkdf2 -> pbkdf2:sha256:600000
+            self._method_prefix = generate_password_hash('', self.method).split('$', 1)[0]
+        return password_hash.split('$', 1)[0] != self._method_prefix
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            self._pid = None
+
+
+password_hasher = PasswordHasher()
+atexit.register(password_hasher.shutdown)
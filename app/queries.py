@@ -0,0 +1,173 @@
+"""
+Именованные запросы для страниц с заранее подгруженными связями.
+
+Шаблоны обращаются к автору, идее и счётчикам у каждой строки списка; без
+eager-загрузки каждое такое обращение - отдельный SELECT (проблема N+1).
+"""
+from collections import defaultdict
+
+from flask import abort, current_app, g, has_request_context, request
+from sqlalchemy import event, or_
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import joinedload, selectinload
+
+from app import ranking
+from app.extensions import db
+from app.models import COMMENT_PATH_DIGITS, Idea, Implementation, Comment
+from app.pagination import keyset_page
+
+
+# ============ ЛЕНТА ============
+
+def feed_query(sort='new', query=None):
+    """
+    Активные идеи вместе с авторами (для ленты и API).
+
+    В ранжированных лентах (sort из ranking.SORTS) идеи берутся из idea_ranking,
+    где есть только активные: страница - проход по индексу оценок.
+    query - базовый запрос вместо загрузки идей с авторами.
+    """
+    if query is None:
+        query = Idea.query.options(joinedload(Idea.author))
+    if sort in ranking.SORTS:
+        return ranking.ranked(query, sort)
+    return query.filter(Idea.status == 'active')
+
+
+# ============ СТРАНИЦА ИДЕИ ============
+
+def idea_detail_or_404(id):
+    """Идея с автором и реализациями (вместе с их авторами)"""
+    idea = Idea.query.options(
+        joinedload(Idea.author),
+        selectinload(Idea.implementations).joinedload(Implementation.author)
+    ).filter_by(id=id).first()
+    if idea is None:
+        abort(404)
+    return idea
+
+
+# ============ СТРАНИЦА РЕАЛИЗАЦИИ ============
+
+def implementation_detail_or_404(id):
+    """Реализация с автором, идеей и автором идеи"""
+    implementation = Implementation.query.options(
+        joinedload(Implementation.author),
+        joinedload(Implementation.idea).joinedload(Idea.author)
+    ).filter_by(id=id).first()
+    if implementation is None:
+        abort(404)
+    return implementation
+
+
+# ============ КОММЕНТАРИИ ============
+
+def comment_threads(parent_type, parent_id, after=None, before=None):
+    """
+    Страница веток комментариев идеи или реализации с авторами.
+
+    Комментарии верхнего уровня листаются курсором от новых к старым, за каждым
+    в items идут его ответы в порядке обхода в глубину (глубина - comment.depth).
+    Ответы всех веток страницы загружаются одним запросом по диапазонам path.
+    """
+    page = keyset_page(
+        Comment.query.options(joinedload(Comment.author)).filter_by(
+            parent_type=parent_type,
+            parent_id=parent_id,
+            reply_to_id=None
+        ),
+        Comment,
+        limit=current_app.config['COMMENTS_PER_PAGE'],
+        after=after,
+        before=before
+    )
+    if not page.items:
+        return page
+
+    replies = defaultdict(list)
+    for reply in Comment.query.options(joinedload(Comment.author)).filter(
+        or_(*(root.subtree_filter() for root in page.items))
+    ).order_by(Comment.path):
+        replies[reply.path[:COMMENT_PATH_DIGITS]].append(reply)
+
+    items = []
+    for root in page.items:
+        items.append(root)
+        items.extend(replies[root.path])
+    return page._replace(items=items)
+
+
+# ============ ПРОФИЛЬ ============
+
+def profile_ideas(user_id):
+    """Активные идеи пользователя"""
+    return Idea.query.filter_by(
+        author_id=user_id,
+        status='active'
+    ).order_by(Idea.created_at.desc()).all()
+
+
+def profile_implementations(user_id):
+    """Верифицированные реализации пользователя вместе с идеями"""
+    return Implementation.query.options(joinedload(Implementation.idea)).filter_by(
+        author_id=user_id,
+        status='verified'
+    ).order_by(Implementation.created_at.desc()).all()
+
+
+# ============ МОДЕРАЦИЯ ============
+
+def moderation_queue():
+    """Запрос реализаций на модерации вместе с авторами и идеями (для keyset_page, от старых к новым)"""
+    return Implementation.query.options(
+        joinedload(Implementation.author),
+        joinedload(Implementation.idea)
+    ).filter_by(status='pending')
+
+
+# ============ ВЕРСИИ ДЛЯ ETAG ============
+
+def idea_version(id):
+    """(last_modified, части ETag) страницы идеи или None"""
+    row = db.session.query(Idea.updated_at).filter(Idea.id == id).first()
+    if row is None:
+        return None
+    return row.updated_at, (id, row.updated_at)
+
+
+def implementation_version(id):
+    """(last_modified, части ETag) страницы реализации или None (на ней видна и идея)"""
+    row = db.session.query(Implementation.updated_at, Idea.updated_at.label('idea_updated_at')).join(
+        Implementation.idea
+    ).filter(Implementation.id == id).first()
+    if row is None:
+        return None
+    last_modified = max(filter(None, (row.updated_at, row.idea_updated_at)), default=None)
+    return last_modified, (id, row.updated_at, row.idea_updated_at)
+
+
+# ============ КОНТРОЛЬ КОЛИЧЕСТВА ЗАПРОСОВ ============
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g.sql_statements = g.get('sql_statements', 0) + 1
+
+
+def install_query_guard(app):
+    """
+    Ограничивает число SQL-запросов на один HTTP-запрос (MAX_QUERIES_PER_REQUEST).
+
+    Предназначено для тестов и отладки: превышение лимита приводит к ошибке,
+    поэтому регрессия с N+1 сразу видна.
+    """
+    @app.after_request
+    def check_query_count(response):
+        limit = current_app.config.get('MAX_QUERIES_PER_REQUEST')
+        count = g.get('sql_statements', 0)
+        if limit and count > limit:
+            raise RuntimeError(
+                f'{request.endpoint} выполнил {count} SQL-запросов (лимит {limit})'
+            )
+        return response
+
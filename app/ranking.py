@@ -0,0 +1,125 @@
+"""
+Ранжированные ленты идей: «популярные» (trending) и «ждут реализации».
+
+Популярность - активность вокруг идеи с экспоненциальным затуханием: каждое
+событие (публикация идеи, комментарий к ней или к её реализации, новая
+реализация) даёт вклад WEIGHTS[вид] * 2^(-возраст / RANKING_HALF_LIFE_HOURS).
+Хранится не сама убывающая сумма, а эквивалентная ей для сортировки величина
+
+    score = ln Σ weight * e^((t - EPOCH) / τ),    τ = half_life / ln 2,
+
+которая со временем не меняется: порядок идей по score в любой момент совпадает
+с порядком по затухшим суммам. Поэтому периодический пересчёт не нужен -
+оценка меняется только вместе с событиями идеи.
+
+Оценки лежат в таблице idea_ranking (строка на каждую активную идею) с
+индексами под обе ленты: страница ленты - один проход по индексу без
+агрегации. Новые идеи, комментарии и реализации, их удаление и модерация
+ставят фоновую задачу ranking.refresh (app/tasks.py), которая пересчитывает
+оценки затронутых идей заново; flask rank-ideas пересчитывает все - после
+смены RANKING_HALF_LIFE_HOURS.
+"""
+import math
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import contains_eager
+
+from app.extensions import db
+from app.models import HIDDEN_IMPLEMENTATION_STATUSES, Comment, Idea, IdeaRanking, Implementation
+from app.pagination import SortKey
+
+EPOCH = datetime(2024, 1, 1)
+WEIGHTS = {'idea': 1.0, 'comment': 1.0, 'implementation': 3.0}
+
+SORTS = ('trending', 'needs_implementation')
+SCORE_KEY = SortKey(IdeaRanking.score, IdeaRanking.idea_id, 'ranking_score', float)
+
+
+def event_score(kind, at):
+    """Вклад одного события в score"""
+    tau = current_app.config['RANKING_HALF_LIFE_HOURS'] * 3600 / math.log(2)
+    return math.log(WEIGHTS[kind]) + (at - EPOCH).total_seconds() / tau
+
+
+def logaddexp(a, b):
+    """ln(e^a + e^b) без переполнения"""
+    if a < b:
+        a, b = b, a
+    return a + math.log1p(math.exp(b - a))
+
+
+# ============ ЛЕНТЫ ============
+
+def ranked(query, sort):
+    """Запрос ленты идей, упорядочиваемый по SCORE_KEY (для keyset_page)"""
+    query = query.join(Idea.ranking).options(contains_eager(Idea.ranking))
+    if sort == 'needs_implementation':
+        query = query.filter(IdeaRanking.needs_implementation.is_(True))
+    return query
+
+
+# ============ ОБНОВЛЕНИЕ ============
+
+def idea_events(idea_ids=None):
+    """(idea_id, вид, created_at) всех событий активных идей (или только указанных)"""
+    def only(column):
+        return [column.in_(idea_ids)] if idea_ids is not None else []
+
+    yield from ((row.id, 'idea', row.created_at) for row in db.session.execute(
+        select(Idea.id, Idea.created_at).where(Idea.status == 'active', *only(Idea.id))))
+    yield from ((row.parent_id, 'comment', row.created_at) for row in db.session.execute(
+        select(Comment.parent_id, Comment.created_at).where(Comment.parent_type == 'idea', *only(Comment.parent_id))))
+    yield from ((row.idea_source_id, 'comment', row.created_at) for row in db.session.execute(
+        select(Implementation.idea_source_id, Comment.created_at).join(
+            Comment, (Comment.parent_type == 'implementation') & (Comment.parent_id == Implementation.id)
+        ).where(*only(Implementation.idea_source_id))))
+    yield from ((row.idea_source_id, 'implementation', row.created_at) for row in db.session.execute(
+        select(Implementation.idea_source_id, Implementation.created_at).where(
+            Implementation.status.not_in(HIDDEN_IMPLEMENTATION_STATUSES), *only(Implementation.idea_source_id))))
+
+
+def refresh(idea_ids=None):
+    """
+    Пересчитывает оценки указанных идей (без аргументов - всех) по всем событиям.
+
+    Строки неактивных идей удаляются. Возвращает число активных идей.
+    """
+    if idea_ids is not None:
+        idea_ids = set(idea_ids)
+        if not idea_ids:
+            return 0
+
+    scores = {}
+    # Первыми идут сами идеи: события неактивных идей отбрасываются
+    for idea_id, kind, at in idea_events(idea_ids):
+        if kind == 'idea':
+            scores[idea_id] = event_score(kind, at or EPOCH)
+        elif idea_id in scores and at is not None:
+            scores[idea_id] = logaddexp(scores[idea_id], event_score(kind, at))
+
+    verified = select(Implementation.idea_source_id).where(Implementation.status == 'verified')
+    if idea_ids is not None:
+        verified = verified.where(Implementation.idea_source_id.in_(idea_ids))
+    implemented = set(db.session.scalars(verified.group_by(Implementation.idea_source_id)))
+
+    statement = delete(IdeaRanking)
+    if idea_ids is not None:
+        statement = statement.where(IdeaRanking.idea_id.in_(idea_ids))
+    db.session.execute(statement)
+    if scores:
+        now = datetime.utcnow()
+        db.session.execute(insert(IdeaRanking), [
+            {'idea_id': idea_id, 'score': score, 'needs_implementation': idea_id not in implemented, 'updated_at': now}
+            for idea_id, score in scores.items()
+        ])
+    return len(scores)
+
+
+def rebuild():
+    """Пересчитывает все оценки"""
+    count = refresh()
+    db.session.commit()
+    return count
+
@@ -0,0 +1,95 @@
+"""
+Настройки пула соединений и чтение с реплики.
+
+Параметры движка (pool_size, max_overflow, pool_timeout, pool_recycle,
+pool_pre_ping) берутся из переменных окружения DB_*. Параметры очереди
+соединений передаются только не-SQLite базам: у StaticPool/NullPool их нет.
+
+Если задан DATABASE_REPLICA_URL, реплика подключается как bind 'replica'.
+Маршруты чтения, помеченные @read_replica, выполняют все запросы на реплике;
+запись и остальные маршруты работают с основной базой. Пользователь, который
+только что что-то записал, ещё REPLICA_READ_YOUR_WRITES секунд читает с
+основной базы - иначе из-за задержки репликации он не увидел бы свою запись.
+Время последней записи хранится в сессии Flask (подписанная cookie).
+"""
+import os
+import time
+from functools import wraps
+
+from flask import current_app, g, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+REPLICA = 'replica'
+
+
+def engine_options(url):
+    """SQLALCHEMY_ENGINE_OPTIONS для базы url из переменных окружения"""
+    options = {
+        'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', '1') == '1',
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),
+    }
+    if url and make_url(url).get_backend_name() != 'sqlite':
+        options.update(
+            pool_size=int(os.getenv('DB_POOL_SIZE', 5)),
+            max_overflow=int(os.getenv('DB_MAX_OVERFLOW', 10)),
+            pool_timeout=int(os.getenv('DB_POOL_TIMEOUT', 30)),
+        )
+    return options
+
+
+def replica_enabled():
+    return REPLICA in current_app.config['SQLALCHEMY_BINDS']
+
+
+class RoutingSession(Session):
+    """Сессия, отправляющая запросы на реплику, пока включён g.use_replica"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and g.get('use_replica') and not self._flushing:
+            engine = self._db.engines.get(REPLICA)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def wrote_recently():
+    window = current_app.config['REPLICA_READ_YOUR_WRITES']
+    return time.time() - session.get('last_write_at', 0) < window
+
+
+def read_replica(view):
+    """GET-запросы view читают с реплики (кроме пользователя, только что выполнившего запись)"""
+    @wraps(view)
+    def wrapper(**kwargs):
+        if request.method == 'GET' and replica_enabled():
+            g.use_replica = not wrote_recently()
+        return view(**kwargs)
+    return wrapper
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _mark_write(db_session, flush_context):
+    db_session.info['wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _remember_write(db_session):
+    if db_session.info.pop('wrote', False) and has_request_context():
+        g.last_write_at = time.time()
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _forget_write(db_session):
+    db_session.info.pop('wrote', None)
+
+
+def install_read_your_writes(app):
+    """Запоминает время записи в сессии Flask, чтобы следующие чтения шли на основную базу"""
+
+    @app.after_request
+    def remember_last_write(response):
+        if 'last_write_at' in g and replica_enabled():
+            session['last_write_at'] = g.last_write_at
+        return response
@@ -1,37 +1,148 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
+from flask import (Blueprint, render_template, redirect, url_for, flash, request, jsonify, current_app,
+                   Response, stream_with_context, g)
 from flask_login import login_user, logout_user, login_required, current_user
 from app.extensions import db
 from app.models import User, Idea, Implementation, Comment
 from app.forms import RegistrationForm, LoginForm, IdeaForm, CommentForm, ImplementationForm, ProfileForm, EditIdeaForm
-import jwt
-import os
-from datetime import datetime, timedelta
+from app.pagination import keyset_page
+from app import queries, counters, search, export, moderation, comments, ranking, jobs, notifications, live
+from app.cache import cached, invalidate_idea, invalidate_implementation, invalidate_comment, invalidate_user
+from app.conditional import conditional
+from app.identity import is_admin
+from app.migrate import current_revision, head_revision
+from app.passwords import PasswordHasherBusy
+from app.replica import read_replica
+from app.tokens import generate_token, generate_refresh_token, token_required, token_verifier
+from datetime import datetime
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import load_only
 
 bp = Blueprint('main', __name__)
 
-# JWT секрет
-JWT_SECRET = os.getenv('SECRET_KEY')
 
+def authenticate(email, password):
+    """Пользователь с таким email и паролем или None; устаревший хэш пароля пересчитывается"""
+    user = User.query.filter_by(email=email).first()
+    if user is None or not user.check_password(password):
+        return None
+    if user.password_needs_rehash():
+        user.set_password(password)
+        db.session.commit()
+    return user
+
+
+@bp.app_errorhandler(PasswordHasherBusy)
+def password_hasher_busy(error):
+    """Очередь хэширования паролей переполнена - клиенту стоит повторить позже"""
+    if request.path.startswith('/api/'):
+        response = jsonify({'error': 'Service busy, retry later'})
+    else:
+        response = Response('Сервис перегружен, повторите попытку позже', mimetype='text/plain')
+    response.status_code = 503
+    response.headers['Retry-After'] = '1'
+    return response
+
+
+def page_size():
+    """Размер страницы из ?limit=, ограниченный настройками приложения"""
+    default = current_app.config['IDEAS_PER_PAGE']
+    limit = request.args.get('limit', default, type=int)
+    return max(1, min(limit, current_app.config['API_MAX_PAGE_SIZE']))
+
+
+def feed_sort():
+    """Режим ленты из ?sort=: new (по умолчанию), trending или needs_implementation"""
+    sort = request.args.get('sort', 'new')
+    return sort if sort in ranking.SORTS else 'new'
+
+
+def ideas_feed_page(query=None):
+    """Текущая страница ленты активных идей по курсорам ?after= / ?before= в режиме ?sort="""
+    sort = feed_sort()
+    return keyset_page(
+        queries.feed_query(sort, query),
+        Idea,
+        limit=page_size(),
+        after=request.args.get('after'),
+        before=request.args.get('before'),
+        key=ranking.SCORE_KEY if sort in ranking.SORTS else None
+    )
+
+
+def feed_version():
+    """Версия текущей страницы ленты: id идей, max(updated_at) и число строк"""
+    page = ideas_feed_page(Idea.query.options(load_only(Idea.id, Idea.created_at, Idea.updated_at)))
+    max_updated_at = max((row.updated_at for row in page.items if row.updated_at), default=None)
+    return None, ([row.id for row in page.items], max_updated_at, len(page.items), page.next_cursor)
+
+
+# Проверки для балансировщика и оркестратора
+@bp.route('/healthz')
+def healthz():
+    """Процесс жив и обрабатывает запросы (база не проверяется)"""
+    return jsonify({'status': 'ok'})
+
+
+@bp.route('/readyz')
+def readyz():
+    """Воркер готов принимать трафик: база доступна и схема обновлена до последней миграции"""
+    try:
+        with db.engine.connect() as connection:
+            revision = current_revision(connection)
+    except SQLAlchemyError as e:
+        return jsonify({'status': 'unavailable', 'error': type(e).__name__}), 503
 
-# Вспомогательная функция для JWT
-def generate_token(user_id):
-    return jwt.encode({'user_id': user_id, 'exp': datetime.utcnow() + timedelta(hours=1)}, JWT_SECRET,
-                      algorithm='HS256')
+    if revision != head_revision():
+        return jsonify({'status': 'migrating', 'revision': revision, 'head': head_revision()}), 503
+    return jsonify({'status': 'ok', 'revision': revision})
 
 
 # Публичные маршруты
 @bp.route('/')
+@read_replica
+@conditional(version=feed_version)
+@cached(tags=lambda: ['feed'])
 def index():
-    ideas = Idea.query.filter_by(status='active').all()
-    return render_template('index.html', ideas=ideas)
+    page = ideas_feed_page()
+    return render_template('index.html', ideas=page.items, page=page, sort=feed_sort())
 
 
 @bp.route('/ideas/<int:id>')
+@read_replica
+@conditional(version=queries.idea_version)
+@cached(tags=lambda id: [f'idea:{id}'])
 def idea_detail(id):
-    idea = Idea.query.get_or_404(id)
-    comments = Comment.query.filter_by(parent_type='idea', parent_id=id).all()
+    idea = queries.idea_detail_or_404(id)
+    threads = queries.comment_threads('idea', id, after=request.args.get('after'), before=request.args.get('before'))
     form = CommentForm()
-    return render_template('idea_detail.html', idea=idea, comments=comments, form=form)
+    return render_template('idea_detail.html', idea=idea, comments=threads.items, comments_page=threads, form=form)
+
+
+@bp.route('/ideas/<int:id>/events')
+def idea_events(id):
+    """Поток событий идеи (Server-Sent Events) для живого обновления её страниц и страниц реализаций"""
+    Idea.query.get_or_404(id)
+    try:
+        subscription = live.broker.subscribe(f'idea:{id}', live.client_key())
+    except live.TooManyConnections:
+        response = Response('Слишком много открытых потоков обновлений', mimetype='text/plain')
+        response.status_code = 503
+        response.headers['Retry-After'] = str(live.RETRY_MS // 1000)
+        return response
+
+    # Без stream_with_context: соединение с БД возвращается в пул до начала потока
+    response = Response(live.stream(subscription), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # nginx не должен копить события в буфере
+    response.call_on_close(subscription.close)
+    return response
+
+
+@bp.route('/search')
+def search_page():
+    query = request.args.get('q', '').strip()
+    results = search.search(query, limit=page_size()) if query else []
+    return render_template('search.html', query=query, results=results)
 
 
 @bp.route('/register', methods=['GET', 'POST'])
@@ -51,8 +162,8 @@ def register():
 def login():
     form = LoginForm()
     if form.validate_on_submit():
-        user = User.query.filter_by(email=form.email.data).first()
-        if user and user.check_password(form.password.data):
+        user = authenticate(form.email.data, form.password.data)
+        if user:
             login_user(user)
             return redirect(url_for('main.index'))
         flash('Invalid credentials')
@@ -75,9 +186,12 @@ def create_idea():
         idea = Idea(
             title=form.title.data,
             description=form.description.data,
-            author=current_user,
+            author_id=current_user.id,
             status='active')
         db.session.add(idea)
+        counters.idea_added(idea)
+        jobs.enqueue('search.index', kind='idea', id=idea.id)
+        invalidate_idea(idea)
         db.session.commit()
         flash('Идея успешно создана!', 'success')
         return redirect(url_for('main.index'))
@@ -91,18 +205,22 @@ def edit_idea(id):
     idea = Idea.query.get_or_404(id)
 
     # Проверяем, что пользователь редактирует свою идею
-    if idea.author != current_user and not current_user.is_admin:
+    if idea.author_id != current_user.id and not is_admin(current_user):
         flash('Вы можете редактировать только свои идеи', 'danger')
         return redirect(url_for('main.idea_detail', id=id))
 
     form = EditIdeaForm(obj=idea)
 
     if form.validate_on_submit():
+        old_status = idea.status
         idea.title = form.title.data
         idea.description = form.description.data
         idea.status = form.status.data
         idea.updated_at = datetime.utcnow()
 
+        counters.idea_status_changed(idea, old_status)
+        jobs.enqueue('search.index', kind='idea', id=idea.id)
+        invalidate_idea(idea)
         db.session.commit()
         flash('Идея успешно обновлена!', 'success')
         return redirect(url_for('main.idea_detail', id=id))
@@ -130,6 +248,11 @@ def create_implementation(id):
             )
 
             db.session.add(implementation)
+            counters.implementation_added(implementation)
+            jobs.enqueue('search.index', kind='implementation', id=implementation.id)
+            jobs.enqueue('links.check', implementation_ids=[implementation.id])
+            live.implementation_added(implementation)
+            invalidate_implementation(implementation)
             db.session.commit()
 
             flash('Реализация успешно создана и отправлена на модерацию!', 'success')
@@ -147,15 +270,26 @@ def create_implementation(id):
 def add_comment(id):
     form = CommentForm()
     if form.validate_on_submit():
+        reply_to_id = None
+        if form.reply_to.data:
+            reply_to_id = comments.reply_target_id('idea', id, form.reply_to.data)
+            if reply_to_id is None:
+                flash('Комментарий, на который вы отвечаете, удалён', 'warning')
+                return redirect(url_for('main.idea_detail', id=id))
+
         # Создаем комментарий для идеи
         comment = Comment(
             content=form.content.data,
             parent_type='idea',
             parent_id=id,
-            author=current_user,
-            idea_id=id  # Устанавливаем явно связь с идеей
+            reply_to_id=reply_to_id,
+            author_id=current_user.id
         )
         db.session.add(comment)
+        counters.comment_added(comment)
+        notifications.comment_added(comment)
+        live.comment_added(comment)
+        invalidate_comment(comment)
         db.session.commit()
         flash('Комментарий добавлен', 'success')
     return redirect(url_for('main.idea_detail', id=id))
@@ -172,7 +306,7 @@ def delete_comment(comment_id):
         return redirect(url_for('main.idea_detail', id=comment.parent_id))
 
     idea_id = comment.parent_id
-    db.session.delete(comment)
+    comments.remove_thread(comment)
     db.session.commit()
 
     flash('Комментарий удален', 'success')
@@ -182,20 +316,24 @@ def delete_comment(comment_id):
 # ============ МАРШРУТЫ ДЛЯ РЕАЛИЗАЦИЙ ============
 
 @bp.route('/implementation/<int:id>')
+@conditional(version=queries.implementation_version)
+@cached(tags=lambda id: [f'implementation:{id}'])
 def implementation_detail(id):
     """Страница детализации реализации"""
-    implementation = Implementation.query.get_or_404(id)
+    implementation = queries.implementation_detail_or_404(id)
 
-    # Получаем комментарии для этой реализации
-    comments = Comment.query.filter_by(
-        parent_type='implementation',
-        parent_id=id
-    ).order_by(Comment.created_at.desc()).all()
+    # Получаем ветки комментариев для этой реализации
+    threads = queries.comment_threads(
+        'implementation', id,
+        after=request.args.get('after'),
+        before=request.args.get('before')
+    )
 
     return render_template(
         'implementation_detail.html',
         implementation=implementation,
-        comments=comments
+        comments=threads.items,
+        comments_page=threads
     )
 
 
@@ -207,14 +345,25 @@ def add_implementation_comment(id):
     form = CommentForm()
 
     if form.validate_on_submit():
+        reply_to_id = None
+        if form.reply_to.data:
+            reply_to_id = comments.reply_target_id('implementation', id, form.reply_to.data)
+            if reply_to_id is None:
+                flash('Комментарий, на который вы отвечаете, удалён', 'warning')
+                return redirect(url_for('main.implementation_detail', id=id))
+
         comment = Comment(
             content=form.content.data,
             parent_type='implementation',
             parent_id=id,
-            author=current_user,
-            implementation_id=id  # Устанавливаем явно связь с реализацией
+            reply_to_id=reply_to_id,
+            author_id=current_user.id
         )
         db.session.add(comment)
+        counters.comment_added(comment)
+        notifications.comment_added(comment)
+        live.comment_added(comment)
+        invalidate_comment(comment)
         db.session.commit()
         flash('Комментарий добавлен', 'success')
 
@@ -231,12 +380,12 @@ def delete_implementation_comment(comment_id):
         flash('Некорректный комментарий', 'danger')
         return redirect(url_for('main.index'))
 
-    if comment.author_id != current_user.id and not current_user.is_admin:
+    if comment.author_id != current_user.id and not is_admin(current_user):
         flash('Вы можете удалять только свои комментарии', 'danger')
         return redirect(url_for('main.implementation_detail', id=comment.parent_id))
 
     implementation_id = comment.parent_id
-    db.session.delete(comment)
+    comments.remove_thread(comment)
     db.session.commit()
 
     flash('Комментарий удален', 'success')
@@ -245,64 +394,72 @@ def delete_implementation_comment(comment_id):
 
 # ============ АДМИН МАРШРУТЫ ============
 
-@bp.route('/admin/moderation')
+@bp.route('/admin/moderation', methods=['GET', 'POST'])
 @login_required
 def admin_moderation():
-    if not current_user.is_admin:
+    if not is_admin(current_user):
         return redirect(url_for('main.index'))
 
-    # Получаем реализации на модерации
-    pending_implementations = Implementation.query.filter_by(status='pending').all()
-
-    # Создаем простой шаблон на лету, если файла нет
-    if pending_implementations:
-        return render_template('admin_moderation.html', pending=pending_implementations)
-    else:
-        return "<h1>Админ панель модерации</h1><p>Реализаций на модерации нет.</p>"
+    # Пакетное действие над отмеченными реализациями
+    if request.method == 'POST':
+        action = request.form.get('action')
+        if action not in moderation.ACTIONS:
+            flash('Неизвестное действие', 'danger')
+        else:
+            result = moderation.moderate(action, request.form.getlist('items'))
+            flash(f'Обработано реализаций: {len(result.processed)}', 'success')
+            if result.conflicts:
+                flash(f'Пропущено: {result.conflicts} (их уже обработал другой модератор)', 'warning')
+        return redirect(url_for('main.admin_moderation', after=request.args.get('after')))
+
+    # Очередь на модерации, от старых к новым
+    page = keyset_page(
+        queries.moderation_queue(),
+        Implementation,
+        limit=page_size(),
+        after=request.args.get('after'),
+        before=request.args.get('before'),
+        oldest_first=True
+    )
+    depth, oldest = moderation.queue_depth()
+    return render_template('admin_moderation.html', pending=page.items, page=page, depth=depth, oldest=oldest)
 
 
 @bp.route('/admin/verify/<int:id>')
 @login_required
 def verify_implementation(id):
-    if not current_user.is_admin:
+    if not is_admin(current_user):
         return redirect(url_for('main.index'))
 
     implementation = Implementation.query.get_or_404(id)
 
-    # Переключаем статус
-    if implementation.status == 'verified':
-        implementation.status = 'pending'
-        message = 'Верификация отменена'
+    # Переключаем статус, если реализацию не изменили после показа страницы (?version=)
+    status = moderation.toggle_verified(id, request.args.get('version', implementation.version, type=int))
+    if status is None:
+        flash('Реализацию уже изменил другой модератор - обновите страницу', 'warning')
+    elif status == 'verified':
+        flash('Реализация верифицирована', 'success')
     else:
-        implementation.status = 'verified'
-        message = 'Реализация верифицирована'
-
-    db.session.commit()
-    flash(message, 'success')
+        flash('Верификация отменена', 'success')
     return redirect(url_for('main.admin_moderation'))
 
 
 # ============ ПРОФИЛЬ И API ============
 
 @bp.route('/@<username>')
+@read_replica
+@cached(tags=lambda username: [f'user:{username}'])
 def profile(username):
     """Страница профиля пользователя"""
     user = User.query.filter_by(username=username).first_or_404()
 
-    ideas = Idea.query.filter_by(
-        author_id=user.id,
-        status='active'
-    ).order_by(Idea.created_at.desc()).all()
-
-    implementations = Implementation.query.filter_by(
-        author_id=user.id,
-        status='verified'
-    ).order_by(Implementation.created_at.desc()).all()
+    ideas = queries.profile_ideas(user.id)
+    implementations = queries.profile_implementations(user.id)
 
     stats = {
-        'ideas_count': len(ideas),
-        'implementations_count': len(implementations),
-        'comments_count': len(user.comments) if user.comments else 0,
+        'ideas_count': user.idea_count,
+        'implementations_count': user.verified_implementation_count,
+        'comments_count': user.comment_count,
         'member_since': user.created_at.strftime('%B %Y')
     }
 
@@ -318,14 +475,17 @@ def profile(username):
 @bp.route('/profile/edit', methods=['GET', 'POST'])
 @login_required
 def edit_profile():
-    form = ProfileForm(obj=current_user)
+    # current_user - неизменяемый снимок из кэша, редактируем строку из базы
+    user = db.session.get(User, current_user.id)
+    form = ProfileForm(obj=user)
 
     if form.validate_on_submit():
-        current_user.display_name = form.display_name.data
-        current_user.bio = form.bio.data
-        current_user.website_url = form.website_url.data
-        current_user.github_username = form.github_username.data
+        user.display_name = form.display_name.data
+        user.bio = form.bio.data
+        user.website_url = form.website_url.data
+        user.github_username = form.github_username.data
 
+        invalidate_user(user)
         db.session.commit()
         flash('Профиль обновлен', 'success')
         return redirect(url_for('main.profile', username=current_user.username))
@@ -335,16 +495,175 @@ def edit_profile():
 
 # API маршруты
 @bp.route('/api/v1/ideas', methods=['GET'])
+@read_replica
+@conditional(version=feed_version)
+@cached(tags=lambda: ['feed'])
 def api_ideas():
-    ideas = Idea.query.filter_by(status='active').all()
-    return jsonify([{'id': i.id, 'title': i.title, 'author': i.author.username} for i in ideas])
+    page = ideas_feed_page()
+    return jsonify({
+        'items': [{'id': i.id, 'title': i.title, 'author': i.author.username} for i in page.items],
+        'next': page.next_cursor,
+        'prev': page.prev_cursor
+    })
+
+
+@bp.route('/api/v1/ideas/<int:id>/comments', methods=['GET'])
+@read_replica
+@conditional(version=queries.idea_version)
+@cached(tags=lambda id: [f'idea:{id}'])
+def api_idea_comments(id):
+    """Ветки комментариев идеи по курсорам ?after= / ?before="""
+    if db.session.get(Idea, id) is None:
+        return jsonify({'error': 'Idea not found'}), 404
+    page = queries.comment_threads('idea', id, after=request.args.get('after'), before=request.args.get('before'))
+    return jsonify({
+        'items': [{
+            'id': c.id,
+            'reply_to': c.reply_to_id,
+            'depth': c.depth,
+            'author': c.author.username,
+            'content': c.content,
+            'created_at': c.created_at.isoformat()
+        } for c in page.items],
+        'next': page.next_cursor,
+        'prev': page.prev_cursor
+    })
+
+
+@bp.route('/api/v1/search', methods=['GET'])
+def api_search():
+    results = search.search(request.args.get('q', ''), limit=page_size())
+    return jsonify([{
+        'type': r.kind,
+        'id': r.item.id,
+        'title': r.item.title,
+        'author': r.item.author.username,
+        'score': r.score
+    } for r in results])
+
+
+@bp.route('/api/v1/export', methods=['GET'])
+@token_required
+def api_export():
+    """
+    Потоковая выгрузка каталога в NDJSON (?types=users,ideas,implementations,comments).
+
+    Только для администраторов: выгрузка полная (с черновиками и скрытыми
+    реализациями - для переноса через flask import-data) и читает таблицы целиком.
+    """
+    if not is_admin(g.api_user):
+        return jsonify({'error': 'Admin required'}), 403
+
+    kinds = request.args.get('types', ','.join(export.EXPORTS)).split(',')
+    unknown = [kind for kind in kinds if kind not in export.EXPORTS]
+    if unknown:
+        return jsonify({'error': f'Unknown types: {", ".join(unknown)}'}), 400
+
+    lines = export.export_lines(kinds, batch_size=current_app.config['EXPORT_BATCH_SIZE'])
+    return Response(stream_with_context(lines), mimetype='application/x-ndjson')
 
 
 @bp.route('/api/v1/auth/login', methods=['POST'])
 def api_login():
     data = request.get_json()
-    user = User.query.filter_by(email=data['email']).first()
-    if user and user.check_password(data['password']):
-        token = generate_token(user.id)
-        return jsonify({'token': token})
+    user = authenticate(data['email'], data['password'])
+    if user:
+        return jsonify({
+            'token': generate_token(user.id),
+            'refresh_token': generate_refresh_token(user.id),
+            'expires_in': current_app.config['JWT_ACCESS_TOKEN_TTL']
+        })
     return jsonify({'error': 'Invalid credentials'}), 401
+
+
+@bp.route('/api/v1/auth/refresh', methods=['POST'])
+def api_refresh():
+    """Новый access-токен по refresh-токену, без проверки пароля"""
+    data = request.get_json(silent=True) or {}
+    user = token_verifier.verify(data.get('refresh_token', ''), token_type='refresh')
+    if user is None:
+        return jsonify({'error': 'Invalid refresh token'}), 401
+    return jsonify({
+        'token': generate_token(user.id),
+        'expires_in': current_app.config['JWT_ACCESS_TOKEN_TTL']
+    })
+
+
+# API записи (Authorization: Bearer <access-токен>)
+@bp.route('/api/v1/ideas', methods=['POST'])
+@token_required
+def api_create_idea():
+    form = IdeaForm()
+    if not form.validate_on_submit():
+        return jsonify({'errors': form.errors}), 400
+
+    idea = Idea(
+        title=form.title.data,
+        description=form.description.data,
+        author_id=g.api_user.id,
+        status='active')
+    db.session.add(idea)
+    counters.idea_added(idea)
+    jobs.enqueue('search.index', kind='idea', id=idea.id)
+    invalidate_idea(idea)
+    db.session.commit()
+    return jsonify({'id': idea.id, 'title': idea.title, 'status': idea.status}), 201
+
+
+@bp.route('/api/v1/ideas/<int:id>/comments', methods=['POST'])
+@token_required
+def api_add_comment(id):
+    if db.session.get(Idea, id) is None:
+        return jsonify({'error': 'Idea not found'}), 404
+    form = CommentForm()
+    if not form.validate_on_submit():
+        return jsonify({'errors': form.errors}), 400
+
+    reply_to_id = None
+    if form.reply_to.data:
+        reply_to_id = comments.reply_target_id('idea', id, form.reply_to.data)
+        if reply_to_id is None:
+            return jsonify({'error': 'Comment not found'}), 404
+
+    comment = Comment(
+        content=form.content.data,
+        parent_type='idea',
+        parent_id=id,
+        reply_to_id=reply_to_id,
+        author_id=g.api_user.id
+    )
+    db.session.add(comment)
+    counters.comment_added(comment)
+    notifications.comment_added(comment)
+    live.comment_added(comment)
+    invalidate_comment(comment)
+    db.session.commit()
+    return jsonify({'id': comment.id, 'idea_id': id, 'reply_to': comment.reply_to_id}), 201
+
+
+@bp.route('/api/v1/ideas/<int:id>/implementations', methods=['POST'])
+@token_required
+def api_create_implementation(id):
+    if db.session.get(Idea, id) is None:
+        return jsonify({'error': 'Idea not found'}), 404
+    form = ImplementationForm()
+    if not form.validate_on_submit():
+        return jsonify({'errors': form.errors}), 400
+
+    implementation = Implementation(
+        title=form.title.data,
+        description=form.description.data,
+        external_url=form.external_url.data,
+        type=form.type.data,
+        idea_source_id=id,
+        author_id=g.api_user.id,
+        status='pending'
+    )
+    db.session.add(implementation)
+    counters.implementation_added(implementation)
+    jobs.enqueue('search.index', kind='implementation', id=implementation.id)
+    jobs.enqueue('links.check', implementation_ids=[implementation.id])
+    live.implementation_added(implementation)
+    invalidate_implementation(implementation)
+    db.session.commit()
+    return jsonify({'id': implementation.id, 'idea_id': id, 'status': implementation.status}), 201
@@ -0,0 +1,154 @@
+"""
+Полнотекстовый поиск по идеям и реализациям.
+
+Индекс - отдельная таблица вне моделей (создаётся миграцией 0003):
+  * SQLite     - виртуальная таблица FTS5 search_index, ранжирование bm25();
+  * PostgreSQL - таблица search_document с генерируемым tsvector и GIN-индексом,
+                 ранжирование ts_rank_cd().
+Документ адресуется одним числом doc_id (id записи * 2 + тип), поэтому
+обновление и удаление документа - поиск по первичному ключу.
+
+В индексе лежат только видимые записи: активные идеи и нескрытые (не отклонённые) реализации.
+"""
+import re
+from collections import namedtuple
+
+from sqlalchemy import select, text
+from sqlalchemy.orm import joinedload
+
+from app.extensions import db
+from app.models import HIDDEN_IMPLEMENTATION_STATUSES, Idea, Implementation
+
+KINDS = {'idea': 0, 'implementation': 1}
+
+SearchResult = namedtuple('SearchResult', ['kind', 'item', 'score'])
+
+
+def doc_id(kind, ref_id):
+    return ref_id * 2 + KINDS[kind]
+
+
+def dialect():
+    return db.session.get_bind().dialect.name
+
+
+# ============ ИНДЕКСАЦИЯ ============
+
+def remove_many(kind, ref_ids):
+    """Убирает из индекса пачку документов одним executemany"""
+    if dialect() not in ('sqlite', 'postgresql') or not ref_ids:
+        return
+    table = 'search_index' if dialect() == 'sqlite' else 'search_document'
+    column = 'rowid' if dialect() == 'sqlite' else 'doc_id'
+    db.session.execute(text(f'DELETE FROM {table} WHERE {column} = :doc_id'),
+                       [{'doc_id': doc_id(kind, ref_id)} for ref_id in ref_ids])
+
+
+def index_many(kind, documents):
+    """Добавляет в индекс пачку новых документов [(ref_id, title, body), ...] одним executemany"""
+    if dialect() not in ('sqlite', 'postgresql') or not documents:
+        return
+    params = [
+        {'doc_id': doc_id(kind, ref_id), 'kind': kind, 'ref_id': ref_id, 'title': title, 'body': body}
+        for ref_id, title, body in documents
+    ]
+    if dialect() == 'sqlite':
+        db.session.execute(text(
+            'INSERT INTO search_index (rowid, kind, ref_id, title, body) '
+            'VALUES (:doc_id, :kind, :ref_id, :title, :body)'
+        ), params)
+    else:
+        db.session.execute(text(
+            'INSERT INTO search_document (doc_id, kind, ref_id, title, body) '
+            'VALUES (:doc_id, :kind, :ref_id, :title, :body)'
+        ), params)
+
+
+def index_document(kind, ref_id, title, body, visible=True):
+    """Добавляет, обновляет или убирает документ из индекса (в текущей транзакции)"""
+    if dialect() not in ('sqlite', 'postgresql'):
+        return
+    remove_many(kind, [ref_id])
+    if visible:
+        index_many(kind, [(ref_id, title, body)])
+
+
+def index_idea(idea):
+    db.session.flush()
+    index_document('idea', idea.id, idea.title, idea.description, visible=idea.status == 'active')
+
+
+def index_implementation(implementation):
+    db.session.flush()
+    index_document('implementation', implementation.id, implementation.title, implementation.description,
+                   visible=implementation.status not in HIDDEN_IMPLEMENTATION_STATUSES)
+
+
+def rebuild(batch_size=1000):
+    """Полностью пересобирает индекс по текущим данным"""
+    table = 'search_index' if dialect() == 'sqlite' else 'search_document'
+    db.session.execute(text(f'DELETE FROM {table}'))
+    sources = {
+        'idea': select(Idea.id, Idea.title, Idea.description).where(Idea.status == 'active'),
+        'implementation': select(
+            Implementation.id, Implementation.title, Implementation.description
+        ).where(Implementation.status.not_in(HIDDEN_IMPLEMENTATION_STATUSES)),
+    }
+    for kind, statement in sources.items():
+        result = db.session.execute(statement.execution_options(yield_per=batch_size))
+        for partition in result.partitions():
+            index_many(kind, [tuple(row) for row in partition])
+    db.session.commit()
+
+
+# ============ ПОИСК ============
+
+def tokenize(query):
+    """Слова запроса в нижнем регистре (кириллица и латиница)"""
+    return re.findall(r'\w+', query.lower())[:10]
+
+
+def _match(tokens, limit):
+    """(kind, ref_id, score) лучших документов; каждое слово ищется как префикс"""
+    if dialect() == 'sqlite':
+        # Заголовок весит больше описания; у bm25() чем меньше, тем лучше
+        rows = db.session.execute(text(
+            'SELECT kind, ref_id, bm25(search_index, 0.0, 0.0, 10.0, 1.0) AS score '
+            'FROM search_index WHERE search_index MATCH :query ORDER BY score LIMIT :limit'
+        ), {'query': ' '.join(f'"{token}"*' for token in tokens), 'limit': limit})
+        return [(kind, ref_id, -score) for kind, ref_id, score in rows]
+
+    rows = db.session.execute(text(
+        "SELECT kind, ref_id, ts_rank_cd(tsv, query) AS score "
+        "FROM search_document, to_tsquery('simple', :query) AS query "
+        "WHERE tsv @@ query ORDER BY score DESC LIMIT :limit"
+    ), {'query': ' & '.join(f'{token}:*' for token in tokens), 'limit': limit})
+    return list(rows)
+
+
+def search(query, limit=20):
+    """Список SearchResult, отсортированный по релевантности"""
+    tokens = tokenize(query or '')
+    if not tokens or dialect() not in ('sqlite', 'postgresql'):
+        return []
+
+    matches = _match(tokens, limit)
+
+    idea_ids = [ref_id for kind, ref_id, _ in matches if kind == 'idea']
+    implementation_ids = [ref_id for kind, ref_id, _ in matches if kind == 'implementation']
+    items = {}
+    if idea_ids:
+        for idea in Idea.query.options(joinedload(Idea.author)).filter(Idea.id.in_(idea_ids)):
+            items['idea', idea.id] = idea
+    if implementation_ids:
+        for implementation in Implementation.query.options(
+            joinedload(Implementation.author),
+            joinedload(Implementation.idea)
+        ).filter(Implementation.id.in_(implementation_ids)):
+            items['implementation', implementation.id] = implementation
+
+    return [
+        SearchResult(kind, items[kind, ref_id], score)
+        for kind, ref_id, score in matches
+        if (kind, ref_id) in items
+    ]
@@ -0,0 +1,54 @@
+"""
+Обработчики фоновых задач (app/jobs.py).
+
+Обработчик получает payload задачи именованными аргументами и работает в
+сессии воркера; commit не делает - изменения фиксирует воркер вместе с
+отметкой о выполнении.
+"""
+from app import linkcheck, notifications, ranking, search
+from app.cache import invalidate_on_commit
+from app.extensions import db
+from app.jobs import task
+from app.models import Idea, Implementation
+
+
+@task('search.index')
+def index_document(kind, id):
+    """Обновляет документ идеи или реализации в поисковом индексе"""
+    if kind == 'idea':
+        idea = db.session.get(Idea, id)
+        if idea is not None:
+            search.index_idea(idea)
+    else:
+        implementation = db.session.get(Implementation, id)
+        if implementation is not None:
+            search.index_implementation(implementation)
+
+
+# Каждая задача сама проверяет ссылки параллельно, ограничение - на число таких пачек
+@task('links.check', concurrency=2)
+def check_links(implementation_ids):
+    """Проверяет внешние ссылки реализаций"""
+    linkcheck.check_implementations(implementation_ids)
+
+
+@task('notifications.fanout')
+def notify(event, ids):
+    """Сохраняет уведомления получателям события"""
+    notifications.fanout(event, ids)
+
+
+# Отправку ограничивает токен-бакет процесса; без лимита все потоки воркера ждали бы его
+@task('notifications.digest', concurrency=4)
+def send_digest(user_id):
+    """Отправляет пользователю накопленные уведомления"""
+    notifications.send_digest(user_id)
+
+
+# Пересчёт одной идеи заменяет строку idea_ranking целиком: параллельные
+# пересчёты той же идеи мешали бы друг другу
+@task('ranking.refresh', concurrency=1)
+def refresh_ranking(idea_ids):
+    """Пересчитывает оценки идей в ранжированных лентах"""
+    ranking.refresh(idea_ids)
+    invalidate_on_commit(db.session, 'feed')
@@ -1,44 +1,175 @@
 import os
+import asyncio
+import hashlib
 import logging
-from telegram import Update
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from sqlalchemy.exc import IntegrityError
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
+from telegram.error import BadRequest
+from telegram.ext import Application, CallbackQueryHandler, CommandHandler, MessageHandler, filters, ContextTypes
+
+from app.cache import MemoryBackend
 
 logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 flask_app = None
+db_executor = None
+
+# telegram_id писавших в последние REPLICA_READ_YOUR_WRITES секунд: они читают с основной базы,
+# а не с реплики; записи истекают сами, и словарь не растёт с числом пользователей бота
+recent_writers = MemoryBackend(10000)
+
+# Готовое сообщение: текст и кнопки
+BotPage = namedtuple('BotPage', ['text', 'markup'])
+
+CALLBACK_DATA_MAX_BYTES = 64  # ограничение Bot API
+IDEA_DESCRIPTION_MAX_LENGTH = 3000
+SEARCH_QUERY_TTL = 24 * 3600
+
+# Идей на странице, сколько результатов поиска можно пролистать,
+# сколько секунд готовое сообщение отдаётся из кэша всем чатам (настраиваются в run_bot_with_app)
+page_size = 5
+search_max_results = 50
+cache_ttl = 30
+message_cache = MemoryBackend(1000)  # ключ (команда и курсор) -> BotPage
+search_queries = MemoryBackend(10000)  # короткий ключ из кнопок -> текст запроса
+rendering = {}  # ключ -> отрисовка, которую сейчас ждут
 
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Простой старт бота"""
-    await update.message.reply_text("🤖 Бот ReqImple\n/ideas - идеи\nОтправь: название|описание")
+    await update.message.reply_text(
+        "🤖 Бот ReqImple\n"
+        "/ideas [страница] - идеи\n"
+        "/search <запрос> - поиск\n"
+        "/idea <номер> - идея\n"
+        "Отправь: название|описание"
+    )
 
 
 async def ideas(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Показать последние идеи"""
-    if not flask_app:
-        await update.message.reply_text("❌ Нет подключения")
+    """Страница ленты идей: /ideas [номер страницы]"""
+    number = int(context.args[0]) if context.args and context.args[0].isdigit() else 1
+    await reply_page(update, f'ideas:{max(1, number)}::', render_ideas_page, max(1, number), None, None)
+
+
+async def search_ideas(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Поиск по идеям и реализациям: /search <запрос>"""
+    query = ' '.join(context.args).strip()
+    if not query:
+        await update.message.reply_text("Используй: /search запрос")
+        return
+    digest = remember_query(query)
+    await reply_page(update, f'search:{digest}:1', render_search_page, query, digest, 1)
+
+
+async def idea_detail(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Карточка идеи: /idea <номер>"""
+    if not context.args or not context.args[0].isdigit():
+        await update.message.reply_text("Используй: /idea номер")
         return
+    idea_id = int(context.args[0])
+    await reply_page(update, f'idea:{idea_id}', render_idea, idea_id)
+
+
+async def on_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Кнопки под сообщениями: листание страниц (правит сообщение) и открытие идеи (новое сообщение)"""
+    query = update.callback_query
+    kind, _, rest = (query.data or '').partition(':')
+    if kind == 'search':
+        digest, number = rest.split(':')
+        text = search_queries.get(digest)
+        if text is None:
+            await query.answer("Результаты устарели, повтори поиск", show_alert=True)
+            return
+    await query.answer()
 
     try:
-        with flask_app.app_context():
-            from app.models import Idea
-            ideas_list = Idea.query.filter_by(status='active').limit(5).all()
+        if kind == 'idea':
+            page = await cached_page(query.from_user.id, query.data, render_idea, int(rest))
+            await query.message.reply_text(page.text, reply_markup=page.markup)
+            return
+        if kind == 'ideas':
+            number, direction, cursor = rest.split(':', 2)
+            after, before = (cursor, None) if direction == 'a' else (None, cursor or None)
+            page = await cached_page(query.from_user.id, query.data, render_ideas_page, int(number), after, before)
+        elif kind == 'search':
+            page = await cached_page(query.from_user.id, query.data, render_search_page, text, digest, int(number))
+        else:
+            return
+        await query.edit_message_text(page.text, reply_markup=page.markup)
+    except BadRequest as e:
+        # Повторное нажатие той же кнопки: сообщение уже такое
+        if 'not modified' not in str(e):
+            logger.error(f"Ошибка: {e}")
+    except Exception as e:
+        logger.error(f"Ошибка: {e}")
+        await query.message.reply_text("❌ Ошибка")
 
-            if not ideas_list:
-                await update.message.reply_text("📭 Идей нет")
-                return
 
-            text = "🔥 Идеи:\n"
-            for idea in ideas_list:
-                text += f"\n• {idea.title}\n👤 {idea.author.username}\n"
+async def reply_page(update, key, render, *args):
+    """Отвечает на команду готовым сообщением из кэша или отрисованным заново"""
+    if not flask_app:
+        await update.message.reply_text("❌ Нет подключения")
+        return
 
-            await update.message.reply_text(text)
+    try:
+        page = await cached_page(update.message.from_user.id, key, render, *args)
+        await update.message.reply_text(page.text, reply_markup=page.markup)
     except Exception as e:
         logger.error(f"Ошибка: {e}")
         await update.message.reply_text("❌ Ошибка")
 
 
+# ============ КЭШ СООБЩЕНИЙ ============
+
+async def cached_page(telegram_id, key, render, *args):
+    """
+    Готовое сообщение по ключу - общее для всех чатов на BOT_CACHE_TTL секунд.
+
+    Одновременные запросы одного ключа ждут одной отрисовки. Недавно писавшие
+    пользователи читают с основной базы мимо кэша, чтобы сразу увидеть свою идею.
+    """
+    if recent_writers.get(telegram_id) is not None:
+        return await run_db(render, False, *args)
+
+    page = message_cache.get(key)
+    if page is not None:
+        return page
+
+    pending = rendering.get(key)
+    if pending is None:
+        pending = rendering[key] = asyncio.ensure_future(run_db(render, True, *args))
+        pending.add_done_callback(lambda future: rendering.pop(key, None))
+        page = await pending
+        message_cache.set(key, page, cache_ttl)
+        return page
+    return await asyncio.shield(pending)
+
+
+def remember_query(query):
+    """Короткий ключ поискового запроса для кнопок (в callback_data не больше 64 байт)"""
+    digest = hashlib.sha1(query.lower().encode()).hexdigest()[:12]
+    search_queries.set(digest, query, SEARCH_QUERY_TTL)
+    return digest
+
+
+def button(label, *parts):
+    data = ':'.join(str(part) for part in parts)
+    if len(data.encode()) > CALLBACK_DATA_MAX_BYTES:
+        return None
+    return InlineKeyboardButton(label, callback_data=data)
+
+
+def keyboard(*rows):
+    rows = [[b for b in row if b is not None] for row in rows]
+    rows = [row for row in rows if row]
+    return InlineKeyboardMarkup(rows) if rows else None
+
+
 async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик создания идеи"""
     text = update.message.text
@@ -55,44 +186,182 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await update.message.reply_text("❌ Нет подключения")
             return
 
-        with flask_app.app_context():
-            from app.models import User, Idea, db
-
-            user_id = update.message.from_user.id
-            username = f"bot_{user_id}"
-
-            user = User.query.filter_by(username=username).first()
-            if not user:
-                user = User(
-                    email=f"{username}@telegram",
-                    username=username,
-                    display_name=update.message.from_user.first_name or "User",
-                    is_admin=False
-                )
-                user.set_password("telegram")
-                db.session.add(user)
-                db.session.commit()
-
-            idea = Idea(
-                title=title,
-                description=description,
-                author=user,
-                status='active'
-            )
-            db.session.add(idea)
-            db.session.commit()
+        from_user = update.message.from_user
+        await run_db(create_idea, from_user.id, from_user.first_name, title, description)
+        if flask_app.config['REPLICA_READ_YOUR_WRITES']:
+            recent_writers.set(from_user.id, True, flask_app.config['REPLICA_READ_YOUR_WRITES'])
 
-            await update.message.reply_text(f"✅ Идея: {title}")
+        await update.message.reply_text(f"✅ Идея: {title}")
 
     except Exception as e:
         logger.error(f"Ошибка: {e}")
         await update.message.reply_text("❌ Ошибка")
 
 
+# ============ РАБОТА С БД (выполняется в пуле потоков) ============
+
+async def run_db(func, *args):
+    """
+    Выполняет синхронную работу с БД в отдельном потоке, не блокируя event loop.
+
+    Пул ограничен BOT_DB_WORKERS потоками; в обработчик возвращаются простые
+    значения, а не ORM-объекты, привязанные к сессии другого потока.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(db_executor, partial(_in_app_context, func, *args))
+
+
+def _in_app_context(func, *args):
+    with flask_app.app_context():
+        return func(*args)
+
+
+def use_replica(flag):
+    from flask import g
+    g.use_replica = flag
+
+
+def render_ideas_page(replica, number, after, before):
+    """
+    Страница number ленты новых идей: одна выборка идей вместе с авторами.
+
+    Кнопки листают курсорами (after / before); переход сразу на страницу
+    number ищет её начало одним запросом по индексу ленты.
+    """
+    from sqlalchemy import select
+    from app import queries
+    from app.models import Idea, db
+    from app.pagination import encode_cursor, keyset_page
+    use_replica(replica)
+
+    if number > 1 and not after and not before:
+        anchor = db.session.execute(
+            select(Idea.created_at, Idea.id).where(Idea.status == 'active')
+            .order_by(Idea.created_at.desc(), Idea.id.desc()).offset((number - 1) * page_size - 1).limit(1)
+        ).first()
+        if anchor is None:
+            return BotPage(f"📭 Страницы {number} нет", None)
+        after = encode_cursor(anchor.created_at, anchor.id)
+
+    page = keyset_page(queries.feed_query('new'), Idea, limit=page_size, after=after, before=before)
+    if not page.items:
+        return BotPage("📭 Идей нет", None)
+
+    text = f"🔥 Идеи (страница {number}):\n"
+    for n, idea in enumerate(page.items, 1):
+        text += (f"\n{n}. {idea.title}\n"
+                 f"👤 {idea.author.display_name} · 🛠 {idea.implementation_count} · 💬 {idea.comment_count}\n")
+    return BotPage(text, keyboard(
+        [button(str(n), 'idea', idea.id) for n, idea in enumerate(page.items, 1)],
+        [
+            button("◀️", 'ideas', number - 1, 'b', page.prev_cursor) if page.prev_cursor else None,
+            button("▶️", 'ideas', number + 1, 'a', page.next_cursor) if page.next_cursor else None,
+        ]
+    ))
+
+
+def render_search_page(replica, query, digest, number):
+    """
+    Страница number результатов поиска.
+
+    Результаты упорядочены по релевантности, у которой нет устойчивого ключа
+    для курсора, поэтому страница - срез первых number * page_size совпадений;
+    глубину ограничивает BOT_SEARCH_MAX_RESULTS, а повторные нажатия берутся из кэша.
+    """
+    from app import search
+    use_replica(replica)
+
+    limit = min(number * page_size, search_max_results)
+    results = search.search(query, limit=limit + 1)
+    shown = results[(number - 1) * page_size:limit]
+    if not shown:
+        return BotPage(f"🔍 По запросу «{query}» ничего не найдено", None)
+
+    text = f"🔍 «{query}» (страница {number}):\n"
+    buttons = []
+    for n, result in enumerate(shown, 1):
+        if result.kind == 'idea':
+            idea_id = result.item.id
+            text += f"\n{n}. 💡 {result.item.title}\n👤 {result.item.author.display_name}\n"
+        else:
+            idea_id = result.item.idea_source_id
+            text += (f"\n{n}. 🛠 {result.item.title}\n"
+                     f"к идее «{result.item.idea.title}» · 👤 {result.item.author.display_name}\n")
+        buttons.append(button(str(n), 'idea', idea_id))
+    return BotPage(text, keyboard(
+        buttons,
+        [
+            button("◀️", 'search', digest, number - 1) if number > 1 else None,
+            button("▶️", 'search', digest, number + 1) if len(results) > limit else None,
+        ]
+    ))
+
+
+def render_idea(replica, idea_id):
+    """Карточка активной идеи с автором (один запрос)"""
+    from sqlalchemy.orm import joinedload
+    from app.models import Idea
+    use_replica(replica)
+
+    idea = Idea.query.options(joinedload(Idea.author)).filter_by(id=idea_id, status='active').first()
+    if idea is None:
+        return BotPage("❌ Идея не найдена", None)
+
+    description = idea.description
+    if len(description) > IDEA_DESCRIPTION_MAX_LENGTH:
+        description = description[:IDEA_DESCRIPTION_MAX_LENGTH - 1] + '…'
+    text = (f"💡 {idea.title}\n"
+            f"👤 {idea.author.display_name} · {idea.created_at:%d.%m.%Y}\n\n"
+            f"{description}\n\n"
+            f"🛠 Реализаций: {idea.implementation_count} · 💬 Комментариев: {idea.comment_count}")
+    return BotPage(text, None)
+
+
+def create_idea(telegram_id, first_name, title, description):
+    """Создаёт идею от имени пользователя бота (и самого пользователя при первом сообщении)"""
+    from app.models import User, Idea, db
+    from app import counters, jobs
+    from app.cache import invalidate_idea
+
+    username = f"bot_{telegram_id}"
+
+    user = User.query.filter_by(username=username).first()
+    if not user:
+        user = User(
+            email=f"{username}@telegram",
+            username=username,
+            display_name=first_name or "User",
+            is_admin=False
+        )  # Без пароля: пользователь бота не входит на сайт
+        db.session.add(user)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Первое сообщение пользователя обрабатывается параллельно в другом потоке
+            db.session.rollback()
+            user = User.query.filter_by(username=username).one()
+
+    idea = Idea(
+        title=title,
+        description=description,
+        author=user,
+        status='active'
+    )
+    db.session.add(idea)
+    counters.idea_added(idea)
+    jobs.enqueue('search.index', kind='idea', id=idea.id)
+    invalidate_idea(idea)
+    db.session.commit()
+    return idea.id
+
+
 def run_bot_with_app(app_instance):
     """Запуск бота с Flask"""
-    global flask_app
+    global flask_app, db_executor, page_size, search_max_results, cache_ttl
     flask_app = app_instance
+    page_size = int(os.getenv('BOT_PAGE_SIZE', page_size))
+    search_max_results = int(os.getenv('BOT_SEARCH_MAX_RESULTS', search_max_results))
+    cache_ttl = int(os.getenv('BOT_CACHE_TTL', cache_ttl))
 
     token = os.getenv('TELEGRAM_BOT_TOKEN')
     if not token:
@@ -100,18 +369,26 @@ def run_bot_with_app(app_instance):
         return
 
     try:
-        # Создаем и настраиваем бота
-        application = Application.builder().token(token).build()
+        # Создаем и настраиваем бота: обновления обрабатываются параллельно,
+        # а работа с БД уходит в ограниченный пул потоков
+        db_executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv('BOT_DB_WORKERS', 8)),
+            thread_name_prefix='bot-db'
+        )
+        application = Application.builder().token(token).concurrent_updates(
+            int(os.getenv('BOT_CONCURRENT_UPDATES', 64))
+        ).build()
 
         application.add_handler(CommandHandler("start", start))
         application.add_handler(CommandHandler("ideas", ideas))
+        application.add_handler(CommandHandler("search", search_ideas))
+        application.add_handler(CommandHandler("idea", idea_detail))
+        application.add_handler(CallbackQueryHandler(on_button))
         application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text))
 
         print("🤖 Telegram бот запущен")
 
         # Запускаем бота с правильным event loop
-        import asyncio
-
         # Для Python 3.13+ нужно явно создать event loop
         if hasattr(asyncio, 'WindowsSelectorEventLoopPolicy'):
             asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
@@ -125,6 +402,7 @@ def run_bot_with_app(app_instance):
             print("\n🛑 Бот остановлен")
         finally:
             loop.close()
+            db_executor.shutdown(wait=False)
 
     except Exception as e:
         print(f"❌ Ошибка запуска бота: {e}")
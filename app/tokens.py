@@ -0,0 +1,108 @@
+"""
+JWT-аутентификация API.
+
+/api/v1/auth/login проверяет пароль один раз и выдаёт пару токенов:
+  * access  - короткоживущий (JWT_ACCESS_TOKEN_TTL), передаётся в каждом
+              запросе заголовком "Authorization: Bearer <token>";
+  * refresh - долгоживущий (JWT_REFRESH_TOKEN_TTL), обменивается на новый
+              access в /api/v1/auth/refresh без повторной проверки пароля.
+Токены различаются claim'ом type; старые токены без него считаются access.
+
+Проверенные токены кэшируются в LRU по подписи до истечения exp, поэтому
+повторный запрос с тем же токеном не декодирует JWT и не считает HMAC заново.
+Пользователь берётся из кэша снимков (identity_cache) - без запроса к БД.
+"""
+import time
+from datetime import datetime, timedelta
+from functools import wraps
+
+import jwt
+from flask import current_app, g, jsonify, request
+
+from app.cache import MemoryBackend
+from app.identity import identity_cache
+
+ALGORITHM = 'HS256'
+
+
+def issue_token(user_id, token_type='access'):
+    ttl = current_app.config['JWT_ACCESS_TOKEN_TTL' if token_type == 'access' else 'JWT_REFRESH_TOKEN_TTL']
+    payload = {
+        'user_id': user_id,
+        'type': token_type,
+        'exp': datetime.utcnow() + timedelta(seconds=ttl)
+    }
+    return jwt.encode(payload, current_app.config['SECRET_KEY'], algorithm=ALGORITHM)
+
+
+def generate_token(user_id):
+    return issue_token(user_id, 'access')
+
+
+def generate_refresh_token(user_id):
+    return issue_token(user_id, 'refresh')
+
+
+class TokenVerifier:
+    """Проверка JWT с LRU-кэшем уже проверенных токенов"""
+
+    def __init__(self):
+        self.backend = MemoryBackend()
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        self.backend = MemoryBackend(app.config['TOKEN_CACHE_MAX_ENTRIES'])
+
+    def decode(self, token):
+        """Payload токена; jwt.InvalidTokenError, если подпись неверна или срок истёк"""
+        signature = token.rpartition('.')[2]
+        entry = self.backend.get(signature) if self.backend.max_entries else None
+        if entry is not None and entry[0] == token:
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        payload = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=[ALGORITHM])
+        ttl = payload['exp'] - time.time()
+        if self.backend.max_entries and ttl > 0:
+            self.backend.set(signature, (token, payload), ttl)
+        return payload
+
+    def verify(self, token, token_type='access'):
+        """Снимок пользователя токена нужного типа или None"""
+        try:
+            payload = self.decode(token)
+        except (jwt.InvalidTokenError, KeyError):
+            return None
+        if payload.get('type', 'access') != token_type:
+            return None
+        return identity_cache.get(int(payload['user_id']))
+
+
+token_verifier = TokenVerifier()
+
+
+def bearer_token():
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    return token.strip() if scheme.lower() == 'bearer' else None
+
+
+def token_required(view):
+    """
+    Доступ к view только по access-токену; пользователь - в g.api_user.
+
+    Сессионная cookie намеренно не учитывается: CSRF-защита отключена, и
+    запись через API не должна выполняться от имени браузера.
+    """
+    @wraps(view)
+    def wrapper(**kwargs):
+        token = bearer_token()
+        if not token:
+            return jsonify({'error': 'Token required'}), 401
+        user = token_verifier.verify(token)
+        if user is None:
+            return jsonify({'error': 'Invalid token'}), 401
+        g.api_user = user
+        return view(**kwargs)
+    return wrapper
@@ -0,0 +1,83 @@
+"""
+Настройки gunicorn (gunicorn -c gunicorn.conf.py wsgi:app).
+
+Воркеры - процессы с пулом потоков (gthread); их число по умолчанию
+считается от доступных процессу ядер. Миграции применяются один раз в
+мастер-процессе до запуска воркеров. Плавный перезапуск воркеров без
+потери запросов - сигнал HUP мастер-процессу. Фоновые задачи выполняет
+отдельный python run_worker.py; JOBS_IN_PROCESS_THREADS > 0 запускает
+воркер очереди ещё и в каждом веб-воркере.
+"""
+import os
+
+from dotenv import load_dotenv
+
+# .env нужен уже здесь: от него зависят значения по умолчанию ниже
+load_dotenv()
+
+
+def available_cores():
+    """Ядра, доступные процессу (учитывает ограничения cgroup/taskset, в отличие от cpu_count)"""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+bind = os.getenv('BIND', f"0.0.0.0:{os.getenv('PORT', '5000')}")
+workers = int(os.getenv('WEB_WORKERS', available_cores() * 2 + 1))
+worker_class = 'gthread'
+
+# Поток живых обновлений (/ideas/<id>/events) занимает поток воркера на всё соединение,
+# а его открывает каждая страница идеи и реализации. Поэтому потоки для них добавляются
+# к WEB_THREADS, а не отнимаются у страниц: воркер держит LIVE_MAX_CONNECTIONS зрителей
+# и при этом WEB_THREADS потоков обслуживают запросы. Поток, ждущий событий, почти ничего
+# не стоит. LIVE_MAX_CONNECTIONS=0 выключает живые обновления
+live_connections = int(os.getenv('LIVE_MAX_CONNECTIONS', 32))
+os.environ['LIVE_MAX_CONNECTIONS'] = str(live_connections)
+threads = int(os.getenv('WEB_THREADS', 4)) + live_connections
+
+timeout = int(os.getenv('WEB_TIMEOUT', 30))
+graceful_timeout = int(os.getenv('WEB_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+
+# Периодический перезапуск воркеров ограничивает рост памяти
+max_requests = int(os.getenv('WEB_MAX_REQUESTS', 1000))
+max_requests_jitter = max_requests // 10
+
+accesslog = '-'
+errorlog = '-'
+
+# Кэш ответов в памяти сбрасывается только в воркере, который выполнил запись: с несколькими
+# воркерами нужен общий redis (RESPONSE_CACHE_URL), а без него кэш выключается
+if workers > 1 and not os.getenv('RESPONSE_CACHE_URL'):
+    os.environ.setdefault('RESPONSE_CACHE_BACKEND', 'none')
+
+# У каждого воркера свой пул хэширования паролей; по умолчанию один процесс на воркер,
+# иначе воркеров * ядер процессов конкурировали бы за те же ядра
+os.environ.setdefault('PASSWORD_HASH_WORKERS', '1')
+
+
+def on_starting(server):
+    """Применяет миграции до запуска воркеров (один раз, а не в каждом воркере)"""
+    from app import create_app
+    from app.extensions import db
+    from app.migrate import upgrade_database
+
+    app = create_app()
+    if workers > 1 and app.config['RESPONSE_CACHE_BACKEND'] == 'memory':
+        server.log.warning(
+            'RESPONSE_CACHE_BACKEND=memory при %s воркерах: запись в одном воркере не сбрасывает кэш '
+            'остальных, страницы могут устаревать на RESPONSE_CACHE_TTL секунд. Задайте RESPONSE_CACHE_URL',
+            workers
+        )
+    upgrade_database(app)
+    with app.app_context():
+        db.engine.dispose()
+    server.log.info('Схема базы данных обновлена')
+
+
+def post_worker_init(worker):
+    """Потоки воркера очереди задач внутри веб-воркера (если заданы JOBS_IN_PROCESS_THREADS)"""
+    from app.jobs import start_in_process
+
+    start_in_process(worker.wsgi)
@@ -0,0 +1,74 @@
+"""
+Окружение Alembic.
+
+Схема и URL базы берутся из Flask-приложения. Если миграции запускаются из
+кода (app.migrate.upgrade_database), соединение передаётся через
+config.attributes['connection'], чтобы не создавать приложение повторно.
+"""
+from logging.config import fileConfig
+
+from alembic import context
+
+config = context.config
+
+if config.config_file_name is not None and config.attributes.get('configure_logger', True):
+    fileConfig(config.config_file_name)
+
+
+def get_metadata():
+    from app.extensions import db
+    import app.models  # noqa: F401 - регистрирует модели в metadata
+    return db.metadata
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    """Таблицы поискового индекса живут вне моделей (app/search.py)"""
+    if type_ == 'table' and name.startswith(('search_index', 'search_document')):
+        return False
+    return True
+
+
+def run_migrations(connection):
+    context.configure(
+        connection=connection,
+        target_metadata=get_metadata(),
+        include_object=include_object,
+        render_as_batch=connection.dialect.name == 'sqlite'
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_offline():
+    """Генерация SQL без подключения к базе (alembic upgrade --sql)"""
+    from app import create_app
+    app = create_app()
+    context.configure(
+        url=app.config['SQLALCHEMY_DATABASE_URI'],
+        target_metadata=get_metadata(),
+        include_object=include_object,
+        literal_binds=True,
+        dialect_opts={'paramstyle': 'named'}
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    connection = config.attributes.get('connection')
+    if connection is not None:
+        run_migrations(connection)
+        return
+
+    from app import create_app
+    from app.extensions import db
+    app = create_app()
+    with app.app_context():
+        with db.engine.connect() as connection:
+            run_migrations(connection)
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
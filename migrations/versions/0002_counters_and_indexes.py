@@ -0,0 +1,87 @@
+"""counter columns and query indexes
+
+Денормализованные счётчики (app.counters) и составные индексы под запросы
+ленты, профиля, модерации и веток комментариев.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 12:30:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def counter(name):
+    return sa.Column(name, sa.Integer(), nullable=False, server_default='0')
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('user') as batch_op:
+        batch_op.add_column(counter('idea_count'))
+        batch_op.add_column(counter('comment_count'))
+        batch_op.add_column(counter('verified_implementation_count'))
+
+    with op.batch_alter_table('idea') as batch_op:
+        batch_op.add_column(counter('comment_count'))
+        batch_op.add_column(counter('implementation_count'))
+
+    op.create_index('ix_idea_status_created_at', 'idea', ['status', 'created_at', 'id'])
+    op.create_index('ix_idea_author_status_created_at', 'idea', ['author_id', 'status', 'created_at'])
+
+    op.create_index('ix_implementation_status_created_at', 'implementation', ['status', 'created_at'])
+    op.create_index('ix_implementation_author_status_created_at', 'implementation',
+                    ['author_id', 'status', 'created_at'])
+    op.create_index('ix_implementation_idea_source_id', 'implementation', ['idea_source_id'])
+
+    op.create_index('ix_comment_parent_created_at', 'comment', ['parent_type', 'parent_id', 'created_at'])
+    op.create_index('ix_comment_author_id', 'comment', ['author_id'])
+    op.create_index('ix_comment_idea_id', 'comment', ['idea_id'])
+    op.create_index('ix_comment_implementation_id', 'comment', ['implementation_id'])
+
+    # Заполняем счётчики для уже существующих данных
+    op.execute("""
+        UPDATE idea SET
+            comment_count = (SELECT count(*) FROM comment WHERE comment.idea_id = idea.id),
+            implementation_count = (SELECT count(*) FROM implementation
+                                    WHERE implementation.idea_source_id = idea.id)
+    """)
+    op.execute("""
+        UPDATE "user" SET
+            idea_count = (SELECT count(*) FROM idea
+                          WHERE idea.author_id = "user".id AND idea.status = 'active'),
+            comment_count = (SELECT count(*) FROM comment WHERE comment.author_id = "user".id),
+            verified_implementation_count = (SELECT count(*) FROM implementation
+                                             WHERE implementation.author_id = "user".id
+                                             AND implementation.status = 'verified')
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_comment_implementation_id', table_name='comment')
+    op.drop_index('ix_comment_idea_id', table_name='comment')
+    op.drop_index('ix_comment_author_id', table_name='comment')
+    op.drop_index('ix_comment_parent_created_at', table_name='comment')
+    op.drop_index('ix_implementation_idea_source_id', table_name='implementation')
+    op.drop_index('ix_implementation_author_status_created_at', table_name='implementation')
+    op.drop_index('ix_implementation_status_created_at', table_name='implementation')
+    op.drop_index('ix_idea_author_status_created_at', table_name='idea')
+    op.drop_index('ix_idea_status_created_at', table_name='idea')
+
+    with op.batch_alter_table('idea') as batch_op:
+        batch_op.drop_column('implementation_count')
+        batch_op.drop_column('comment_count')
+
+    with op.batch_alter_table('user') as batch_op:
+        batch_op.drop_column('verified_implementation_count')
+        batch_op.drop_column('comment_count')
+        batch_op.drop_column('idea_count')
@@ -0,0 +1,77 @@
+"""full-text search index
+
+Индекс полнотекстового поиска (см. app/search.py): FTS5 на SQLite,
+tsvector + GIN на PostgreSQL. На других СУБД поиск отключён.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 13:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+
+    if dialect == 'sqlite':
+        # rowid = id * 2 + тип документа; prefix-индексы ускоряют поиск по началу слова
+        op.execute("""
+            CREATE VIRTUAL TABLE search_index USING fts5(
+                kind UNINDEXED, ref_id UNINDEXED, title, body,
+                tokenize = 'unicode61 remove_diacritics 2',
+                prefix = '2 3 4'
+            )
+        """)
+        op.execute("""
+            INSERT INTO search_index (rowid, kind, ref_id, title, body)
+            SELECT id * 2, 'idea', id, title, description FROM idea WHERE status = 'active'
+        """)
+        op.execute("""
+            INSERT INTO search_index (rowid, kind, ref_id, title, body)
+            SELECT id * 2 + 1, 'implementation', id, title, description FROM implementation
+            WHERE status IS NULL OR status != 'hidden'
+        """)
+
+    elif dialect == 'postgresql':
+        op.execute("""
+            CREATE TABLE search_document (
+                doc_id BIGINT PRIMARY KEY,
+                kind VARCHAR(20) NOT NULL,
+                ref_id INTEGER NOT NULL,
+                title TEXT NOT NULL,
+                body TEXT NOT NULL,
+                tsv TSVECTOR GENERATED ALWAYS AS (
+                    setweight(to_tsvector('simple', title), 'A') ||
+                    setweight(to_tsvector('simple', body), 'B')
+                ) STORED
+            )
+        """)
+        op.execute('CREATE INDEX ix_search_document_tsv ON search_document USING GIN (tsv)')
+        op.execute("""
+            INSERT INTO search_document (doc_id, kind, ref_id, title, body)
+            SELECT id * 2, 'idea', id, title, description FROM idea WHERE status = 'active'
+        """)
+        op.execute("""
+            INSERT INTO search_document (doc_id, kind, ref_id, title, body)
+            SELECT id * 2 + 1, 'implementation', id, title, description FROM implementation
+            WHERE status IS NULL OR status != 'hidden'
+        """)
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute('DROP TABLE search_index')
+    elif dialect == 'postgresql':
+        op.execute('DROP TABLE search_document')
@@ -0,0 +1,31 @@
+"""implementation.updated_at
+
+Версия строки реализации для ETag / Last-Modified.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 14:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('implementation') as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+    op.execute('UPDATE implementation SET updated_at = created_at')
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('implementation') as batch_op:
+        batch_op.drop_column('updated_at')
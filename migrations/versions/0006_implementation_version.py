@@ -0,0 +1,37 @@
+"""implementation.version and moderation queue index
+
+Номер версии строки для оптимистической блокировки при модерации; индекс
+очереди модерации дополнен id для курсорной пагинации (status, created_at, id).
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 18:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('implementation') as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+
+    op.drop_index('ix_implementation_status_created_at', table_name='implementation')
+    op.create_index('ix_implementation_status_created_at', 'implementation', ['status', 'created_at', 'id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_implementation_status_created_at', table_name='implementation')
+    op.create_index('ix_implementation_status_created_at', 'implementation', ['status', 'created_at'])
+
+    with op.batch_alter_table('implementation') as batch_op:
+        batch_op.drop_column('version')
@@ -0,0 +1,94 @@
+"""comment parent key and threaded replies
+
+Родитель комментария хранился дважды: parent_type/parent_id и внешние ключи
+idea_id/implementation_id. Остаётся одна пара (parent_type, parent_id) -
+значения переносятся из внешних ключей там, где они заданы. Добавлены ответы
+(reply_to_id) и материализованный путь path; у существующих комментариев
+ответов нет, их путь - собственный id.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17 19:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PATH_DIGITS = 10
+BATCH_SIZE = 5000
+
+comment = sa.table(
+    'comment',
+    sa.column('id', sa.Integer),
+    sa.column('path', sa.String),
+)
+
+
+def upgrade() -> None:
+    op.execute("UPDATE comment SET parent_type = 'idea', parent_id = idea_id WHERE idea_id IS NOT NULL")
+    op.execute(
+        "UPDATE comment SET parent_type = 'implementation', parent_id = implementation_id "
+        "WHERE implementation_id IS NOT NULL"
+    )
+
+    op.drop_index('ix_comment_parent_created_at', table_name='comment')
+    op.drop_index('ix_comment_idea_id', table_name='comment')
+    op.drop_index('ix_comment_implementation_id', table_name='comment')
+
+    with op.batch_alter_table('comment') as batch_op:
+        batch_op.drop_column('idea_id')
+        batch_op.drop_column('implementation_id')
+        batch_op.add_column(sa.Column('reply_to_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('path', sa.String(length=255), nullable=True))
+        batch_op.create_foreign_key('fk_comment_reply_to_id', 'comment', ['reply_to_id'], ['id'], ondelete='CASCADE')
+
+    # Путь вычисляется в Python: форматирование чисел с ведущими нулями у СУБД разное
+    connection = op.get_bind()
+    last_id = 0
+    while True:
+        ids = connection.execute(
+            sa.select(comment.c.id).where(comment.c.id > last_id).order_by(comment.c.id).limit(BATCH_SIZE)
+        ).scalars().all()
+        if not ids:
+            break
+        connection.execute(
+            comment.update().where(comment.c.id == sa.bindparam('comment_id')),
+            [{'comment_id': id, 'path': str(id).zfill(PATH_DIGITS)} for id in ids]
+        )
+        last_id = ids[-1]
+
+    op.create_index('ix_comment_parent_thread', 'comment',
+                    ['parent_type', 'parent_id', 'reply_to_id', 'created_at', 'id'])
+    op.create_index('ix_comment_path', 'comment', ['path'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_comment_path', table_name='comment')
+    op.drop_index('ix_comment_parent_thread', table_name='comment')
+
+    with op.batch_alter_table('comment') as batch_op:
+        batch_op.drop_constraint('fk_comment_reply_to_id', type_='foreignkey')
+        batch_op.drop_column('path')
+        batch_op.drop_column('reply_to_id')
+        batch_op.add_column(sa.Column('idea_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('implementation_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_comment_idea_id', 'idea', ['idea_id'], ['id'], ondelete='CASCADE')
+        batch_op.create_foreign_key('fk_comment_implementation_id', 'implementation', ['implementation_id'], ['id'],
+                                    ondelete='CASCADE')
+
+    # Ответы становятся комментариями верхнего уровня
+    op.execute("UPDATE comment SET idea_id = parent_id WHERE parent_type = 'idea'")
+    op.execute("UPDATE comment SET implementation_id = parent_id WHERE parent_type = 'implementation'")
+
+    op.create_index('ix_comment_parent_created_at', 'comment', ['parent_type', 'parent_id', 'created_at'])
+    op.create_index('ix_comment_idea_id', 'comment', ['idea_id'])
+    op.create_index('ix_comment_implementation_id', 'comment', ['implementation_id'])
@@ -0,0 +1,93 @@
+"""idea_ranking
+
+Предрассчитанные оценки активных идей для лент «популярные» и «ждут
+реализации» (app/ranking.py). Таблица заполняется по уже существующим
+данным; формула здесь зафиксирована на момент миграции.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17 20:00:00
+
+"""
+import math
+import os
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0008'
+down_revision: Union[str, None] = '0007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+EPOCH = datetime(2024, 1, 1)
+WEIGHTS = {'idea': 1.0, 'comment': 1.0, 'implementation': 3.0}
+HIDDEN_IMPLEMENTATION_STATUSES = ('hidden', 'rejected')
+
+
+def upgrade() -> None:
+    ranking = op.create_table(
+        'idea_ranking',
+        sa.Column('idea_id', sa.Integer(), nullable=False),
+        sa.Column('score', sa.Float(), nullable=False),
+        sa.Column('needs_implementation', sa.Boolean(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['idea_id'], ['idea.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('idea_id')
+    )
+    op.create_index('ix_idea_ranking_score', 'idea_ranking', ['score', 'idea_id'])
+    op.create_index('ix_idea_ranking_needs_implementation', 'idea_ranking',
+                    ['needs_implementation', 'score', 'idea_id'])
+
+    tau = float(os.getenv('RANKING_HALF_LIFE_HOURS', 48)) * 3600 / math.log(2)
+
+    def event_score(kind, at):
+        return math.log(WEIGHTS[kind]) + (at - EPOCH).total_seconds() / tau
+
+    idea = sa.table('idea', sa.column('id', sa.Integer), sa.column('status', sa.String),
+                    sa.column('created_at', sa.DateTime))
+    implementation = sa.table('implementation', sa.column('id', sa.Integer), sa.column('idea_source_id', sa.Integer),
+                              sa.column('status', sa.String), sa.column('created_at', sa.DateTime))
+    comment = sa.table('comment', sa.column('parent_type', sa.String), sa.column('parent_id', sa.Integer),
+                       sa.column('created_at', sa.DateTime))
+
+    connection = op.get_bind()
+    scores = {
+        row.id: event_score('idea', row.created_at or EPOCH)
+        for row in connection.execute(sa.select(idea.c.id, idea.c.created_at).where(idea.c.status == 'active'))
+    }
+    events = [
+        ('comment', sa.select(comment.c.parent_id, comment.c.created_at).where(comment.c.parent_type == 'idea')),
+        ('comment', sa.select(implementation.c.idea_source_id, comment.c.created_at).select_from(comment.join(
+            implementation,
+            sa.and_(comment.c.parent_type == 'implementation', comment.c.parent_id == implementation.c.id)
+        ))),
+        ('implementation', sa.select(implementation.c.idea_source_id, implementation.c.created_at).where(
+            implementation.c.status.not_in(HIDDEN_IMPLEMENTATION_STATUSES))),
+    ]
+    for kind, statement in events:
+        for idea_id, created_at in connection.execute(statement):
+            if idea_id in scores and created_at is not None:
+                score, added = scores[idea_id], event_score(kind, created_at)
+                high, low = max(score, added), min(score, added)
+                scores[idea_id] = high + math.log1p(math.exp(low - high))
+
+    implemented = set(connection.execute(
+        sa.select(implementation.c.idea_source_id).where(implementation.c.status == 'verified').distinct()
+    ).scalars())
+    if scores:
+        now = datetime.utcnow()
+        op.bulk_insert(ranking, [
+            {'idea_id': idea_id, 'score': score, 'needs_implementation': idea_id not in implemented, 'updated_at': now}
+            for idea_id, score in scores.items()
+        ])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_idea_ranking_needs_implementation', table_name='idea_ranking')
+    op.drop_index('ix_idea_ranking_score', table_name='idea_ranking')
+    op.drop_table('idea_ranking')
@@ -0,0 +1,36 @@
+"""implementation link check
+
+Результат последней проверки external_url реализации (app/linkcheck.py).
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-17 22:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0010'
+down_revision: Union[str, None] = '0009'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('implementation') as batch_op:
+        batch_op.add_column(sa.Column('link_status', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('link_title', sa.String(length=300), nullable=True))
+        batch_op.add_column(sa.Column('link_error', sa.String(length=200), nullable=True))
+        batch_op.add_column(sa.Column('link_checked_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('implementation') as batch_op:
+        batch_op.drop_column('link_checked_at')
+        batch_op.drop_column('link_error')
+        batch_op.drop_column('link_title')
+        batch_op.drop_column('link_status')
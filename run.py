@@ -1,49 +1,44 @@
-from app import create_app, db
+from app import create_app
+from app.jobs import start_in_process
+from app.migrate import upgrade_database
 import os
-import threading
 from dotenv import load_dotenv
 
 # Загружаем переменные из файла .env
 load_dotenv()
 
-app = create_app()
+# Для разработки фоновые задачи выполняются в потоке того же процесса
+os.environ.setdefault('JOBS_IN_PROCESS_THREADS', '1')
 
-def run_telegram_bot():
-    """
-    Запускает Telegram бота в отдельном потоке.
-    """
-    # Импортируем здесь, чтобы избежать циклических импортов
-    from app.telegram_bot import run_bot_with_app
-    # Передаем Flask-приложение боту для доступа к контексту и БД
-    run_bot_with_app(app)
+app = create_app()
 
 def main():
     """
-    Основная функция для запуска веб-приложения и бота.
+    Запуск веб-приложения на встроенном сервере Flask - для локальной разработки.
+
+    В production используется gunicorn (gunicorn -c gunicorn.conf.py wsgi:app),
+    а Telegram бот и воркер фоновых задач работают отдельными процессами:
+    python run_bot.py, python run_worker.py
     """
-    with app.app_context():
-        # Создаем таблицы в базе данных, если их еще нет
-        db.create_all()
-        print("✅ Таблицы базы данных созданы")
-
-    # Проверяем наличие обязательного токена
-    telegram_token = os.getenv('TELEGRAM_BOT_TOKEN')
-    if not telegram_token:
-        print("⚠️  Предупреждение: TELEGRAM_BOT_TOKEN не найден в .env файле.")
-        print("   Telegram бот запущен не будет. Работает только веб-приложение.")
-        print("-" * 50)
-    else:
-        # Запускаем бота в фоновом потоке
-        bot_thread = threading.Thread(target=run_telegram_bot, daemon=True)
-        bot_thread.start()
-        print("🤖 Telegram бот запущен в фоновом режиме")
+    # Применяем миграции Alembic (создаёт таблицы в новой базе и обновляет существующую)
+    upgrade_database(app)
+    print("✅ Схема базы данных обновлена")
+
+    if os.getenv('TELEGRAM_BOT_TOKEN'):
+        print("🤖 Telegram бот запускается отдельно: python run_bot.py")
         print("-" * 50)
 
+    # В режиме отладки воркер запускается только в перезапускаемом процессе с приложением
+    debug = os.getenv('FLASK_DEBUG') == '1'
+    if not debug or os.getenv('WERKZEUG_RUN_MAIN') == 'true':
+        if start_in_process(app):
+            print("⚙️  Фоновые задачи выполняются в этом процессе")
+
     # Запускаем Flask приложение (блокирующий вызов)
     print(f"🌐 Запуск веб-приложения Flask...")
     print(f"   Доступно по адресу: http://localhost:5000")
     print("=" * 50)
-    app.run(host='0.0.0.0', port=5000, debug=True, use_reloader=False)
+    app.run(host='0.0.0.0', port=5000, debug=debug)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
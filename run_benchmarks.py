@@ -0,0 +1,78 @@
+"""
+Нагрузочные замеры на синтетических данных.
+
+    python run_benchmarks.py --ideas 5000 --output bench/HEAD.json
+    python run_benchmarks.py --compare bench/HEAD.json
+
+По умолчанию создаётся временная SQLite-база; --database-url позволяет
+замерить другую (пустую!) базу - в неё будут загружены данные.
+"""
+import json
+import os
+import sys
+import tempfile
+
+import click
+
+# Добавляем путь к проекту
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+@click.command()
+@click.option('--users', default=500, show_default=True)
+@click.option('--ideas', default=5000, show_default=True)
+@click.option('--implementations', default=2000, show_default=True)
+@click.option('--comments', default=20000, show_default=True)
+@click.option('--requests', default=200, show_default=True, help='Повторов каждого сценария')
+@click.option('--scenario', 'only', multiple=True, help='Выполнить только указанные сценарии')
+@click.option('--seed', default=1, show_default=True, help='Seed генератора данных и запросов')
+@click.option('--cache/--no-cache', default=False, show_default=True, help='Кэш ответов для анонимных GET и сообщений бота')
+@click.option('--database-url', help='Пустая база для замеров (по умолчанию - временная SQLite)')
+@click.option('--output', type=click.Path(dir_okay=False), help='Сохранить результаты в JSON')
+@click.option('--compare', type=click.File('r'), help='JSON предыдущего запуска для сравнения')
+def main(users, ideas, implementations, comments, requests, only, seed, cache, database_url, output, compare):
+    """Заполнить базу синтетическими данными и замерить маршруты и обработчики бота"""
+    workdir = tempfile.mkdtemp(prefix='reqimple-bench-')
+    os.environ['DATABASE_URL'] = database_url or f'sqlite:///{os.path.join(workdir, "bench.db")}'
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    os.environ['RESPONSE_CACHE_BACKEND'] = 'memory' if cache else 'none'
+    os.environ.pop('DATABASE_REPLICA_URL', None)
+
+    from app import create_app
+    from app import benchmark
+    from app.migrate import upgrade_database
+
+    app = create_app()
+    upgrade_database(app)
+    with app.app_context():
+        click.echo('⏳ Загрузка данных...')
+        counts = benchmark.seed_dataset(users, ideas, implementations, comments, seed)
+    click.echo('✅ Данные: ' + ', '.join(f'{kind} - {count}' for kind, count in counts.items()))
+
+    results = benchmark.run(app, requests=requests, only=set(only), seed_value=seed)
+    report = {
+        'environment': benchmark.environment(app),
+        'dataset': {'users': users, 'ideas': ideas, 'implementations': implementations,
+                    'comments': comments, 'seed': seed},
+        'results': results,
+    }
+
+    previous = json.load(compare)['results'] if compare else {}
+    click.echo(f"\n{'сценарий':<18} {'запр/с':>9} {'p50 мс':>9} {'p95 мс':>9} {'p99 мс':>9} {'ошибки':>7}")
+    for name, result in results.items():
+        line = (f"{name:<18} {result['throughput_rps']:>9.1f} {result['p50_ms']:>9.2f} "
+                f"{result['p95_ms']:>9.2f} {result['p99_ms']:>9.2f} {result['errors']:>7}")
+        if name in previous and previous[name]['p95_ms']:
+            change = (result['p95_ms'] / previous[name]['p95_ms'] - 1) * 100
+            line += f"   p95 {change:+.0f}%"
+        click.echo(line)
+
+    if output:
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        click.echo(f'\n💾 Результаты сохранены в {output}')
+
+
+if __name__ == '__main__':
+    main()
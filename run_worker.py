@@ -0,0 +1,70 @@
+"""
+Воркер очереди фоновых задач (app/jobs.py).
+
+    python run_worker.py --processes 2 --threads 4
+    python run_worker.py --only search.index
+
+Каждый процесс создаёт своё приложение и выполняет задачи в --threads
+потоках. SIGTERM (docker stop) завершает процессы после текущих задач.
+"""
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+
+import click
+from dotenv import load_dotenv
+
+# Загружаем переменные окружения
+load_dotenv()
+
+# Добавляем путь к проекту
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+# httpx пишет каждый запрос вместе с URL, а в URL Bot API - токен бота
+logging.getLogger('httpx').setLevel(logging.WARNING)
+
+
+def work(threads, names):
+    """Один процесс воркера"""
+    from app import create_app
+    from app.jobs import Worker
+
+    app = create_app()
+    Worker(app, threads=threads, names=names).run_forever()
+
+
+@click.command()
+@click.option('--processes', type=int, default=lambda: int(os.getenv('JOBS_WORKER_PROCESSES', 1)), show_default='1',
+              help='Процессов воркера')
+@click.option('--threads', type=int, default=lambda: int(os.getenv('JOBS_WORKER_THREADS', 4)), show_default='4',
+              help='Потоков в каждом процессе')
+@click.option('--only', 'names', multiple=True, help='Выполнять только задачи этих видов')
+def main(processes, threads, names):
+    """Выполнять фоновые задачи из очереди"""
+    print(f"🚀 Запуск воркера очереди задач: процессов - {processes}, потоков - {threads}")
+    if processes == 1:
+        work(threads, names)
+        return
+
+    context = multiprocessing.get_context('spawn')
+    children = [
+        context.Process(target=work, args=(threads, names), name=f'jobs-worker-{n}')
+        for n in range(processes)
+    ]
+    for child in children:
+        child.start()
+
+    # Ctrl+C получают все процессы группы, SIGTERM - только этот: передаём его дальше
+    signal.signal(signal.SIGTERM, lambda signum, frame: [child.terminate() for child in children])
+    for child in children:
+        try:
+            child.join()
+        except KeyboardInterrupt:
+            child.join()
+
+
+if __name__ == '__main__':
+    main()
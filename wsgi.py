@@ -0,0 +1,14 @@
+"""
+WSGI-точка входа для production-сервера:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Telegram-бот запускается отдельным процессом: python run_bot.py
+"""
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app import create_app  # noqa: E402
+
+app = create_app()